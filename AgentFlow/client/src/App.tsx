@@ -35,10 +35,16 @@ export default function App() {
           data: event.generate_query?.search_query?.join(", ") || "",
         };
       } else if (event.web_research) {
+        // Sources offloaded to the blob store arrive as one summary per search.
         const sources = event.web_research.sources_gathered || [];
-        const numSources = sources.length;
+        const numSources = sources.reduce(
+          (total: number, s: any) => total + (s.blob ? s.count : 1),
+          0,
+        );
         const uniqueLabels = [
-          ...new Set(sources.map((s: any) => s.label).filter(Boolean)),
+          ...new Set(
+            sources.flatMap((s: any) => (s.blob ? s.labels : [s.label])).filter(Boolean),
+          ),
         ];
         const exampleLabels = uniqueLabels.slice(0, 3).join(", ");
         processedEvent = {
@@ -0,0 +1,160 @@
+"""Benchmark of question batches: independent runs against a shared question batch.
+
+Researches a batch of questions about a few entities with fake clients,
+whose query writer phrases the same aspects of an entity differently from
+question to question, as Gemini does. Reports, per mode, the searches made,
+the wall time of the batch and the p95 latency of its runs:
+
+* independent runs without the search cache;
+* independent runs with the search cache, which only shares identical queries;
+* a question batch, which also shares paraphrased queries, without and with
+  the search cache.
+
+Usage:
+    python benchmarks/batch.py --questions 200 --entities 20 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import tempfile
+import time
+
+from langchain_core.messages import HumanMessage
+
+from agent.batch import run_batch
+from agent.clients import set_client_registry
+from agent.fakes import fake_client_registry, parse_latency
+from agent.loadtest import percentile
+from agent.tools_and_schemas import SearchQueryList
+
+ASPECTS = ("market size", "regulation", "pricing", "competitors", "outlook", "history")
+PHRASINGS = (
+    "{entity} {aspect}",
+    "{aspect} of {entity}",
+    "{entity} {aspect} 2026",
+    "latest {entity} {aspect}",
+)
+ANGLES = (
+    "What is the {aspect} of {entity}?",
+    "Summarize {entity}'s {aspect} and outlook.",
+    "How did {entity} change its {aspect} recently?",
+    "Compare {entity} to its competitors on {aspect}.",
+)
+_ENTITY = re.compile(r"Entity(\d+)")
+
+
+def make_questions(count: int, entities: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "id": index,
+            "question": rng.choice(ANGLES).format(
+                entity=f"Entity{rng.randrange(entities)}", aspect=rng.choice(ASPECTS)
+            ),
+        }
+        for index in range(count)
+    ]
+
+
+def topical_queries(prompt: str) -> SearchQueryList:
+    """Write queries on random aspects of the prompt's entity, each in a random phrasing."""
+    rng = random.Random(prompt)
+    entity = f"Entity{_ENTITY.search(prompt).group(1)}"
+    match = re.search(r"more than (\d+) queries", prompt)
+    aspects = rng.sample(ASPECTS, int(match.group(1)) if match else 3)
+    return SearchQueryList(
+        query=[
+            rng.choice(PHRASINGS).format(entity=entity, aspect=aspect)
+            for aspect in aspects
+        ],
+        rationale="Fake rationale.",
+    )
+
+
+async def independent_runs(
+    questions: list, concurrency: int, configurable: dict
+) -> list:
+    from agent.graph import graph
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_run(index: int, item: dict) -> float:
+        async with semaphore:
+            started = time.perf_counter()
+            await graph.ainvoke(
+                {"messages": [HumanMessage(item["question"])]},
+                {"configurable": {**configurable, "thread_id": f"independent-{index}"}},
+            )
+            return time.perf_counter() - started
+
+    return await asyncio.gather(
+        *(one_run(index, item) for index, item in enumerate(questions))
+    )
+
+
+async def batch_runs(questions: list, concurrency: int, configurable: dict) -> list:
+    latencies = []
+    async for result in run_batch(questions, concurrency, configurable):
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        latencies.append(result["elapsed_s"])
+    return latencies
+
+
+def measure(
+    name: str, runner, questions: list, args: argparse.Namespace, search_cache: bool
+) -> None:
+    registry = fake_client_registry(
+        search_latency=parse_latency(args.search_latency, 0),
+        llm_latency=parse_latency(args.llm_latency, 1),
+        structured_outputs={SearchQueryList: topical_queries},
+    )
+    previous = set_client_registry(registry)
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            configurable = {
+                "search_cache_ttl_seconds": 3600 if search_cache else 0,
+                "search_cache_path": f"{cache_dir}/search_cache.sqlite3",
+                "answer_cache_enabled": False,
+                "model_requests_per_minute": "gemini-2.0-flash=0,gemini-2.5-flash=0,gemini-2.5-pro=0",
+            }
+            started = time.perf_counter()
+            latencies = asyncio.run(runner(questions, args.concurrency, configurable))
+            elapsed = time.perf_counter() - started
+    finally:
+        set_client_registry(previous)
+    print(
+        f"{name:32s} searches {registry.genai_client.calls:5d}  "
+        f"wall {elapsed:6.2f} s  p95 {percentile(latencies, 95):5.2f} s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--search-latency", default="lognormal:1.0,0.5")
+    parser.add_argument("--llm-latency", default="lognormal:0.5,0.4")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    questions = make_questions(args.questions, args.entities, args.seed)
+    measure("independent runs", independent_runs, questions, args, search_cache=False)
+    measure(
+        "independent runs, search cache",
+        independent_runs,
+        questions,
+        args,
+        search_cache=True,
+    )
+    measure("question batch", batch_runs, questions, args, search_cache=False)
+    measure(
+        "question batch, search cache", batch_runs, questions, args, search_cache=True
+    )
+
+
+if __name__ == "__main__":
+    main()
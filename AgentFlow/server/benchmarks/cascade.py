@@ -0,0 +1,95 @@
+"""Benchmark of the reflection cascade.
+
+Runs the offline load test with the reflection model slower than the
+cascade model, as Gemini 2.5 Flash is slower than 2.0 Flash, once per
+cascade setting. Reports the run latency percentiles, the share of
+decisions each tier kept and the net reflection latency saved per run.
+The fake cascade model reports a confidence spread between 0.5 and 1, and
+fake search results do not mention the question, so the heuristic tier
+always escalates here.
+
+Usage:
+    python benchmarks/cascade.py --cascades "" model heuristic,model
+"""
+
+import argparse
+import asyncio
+import re
+from collections import Counter
+
+from agent.deadline import latency_estimates
+from agent.loadtest import LoadTestConfig, run_load_test
+from agent.metrics import metrics_registry
+
+_SAMPLE = re.compile(r"^(agentflow_reflection_cascade_\w+)\{(.*)\} (\S+)$")
+
+
+def cascade_counters() -> Counter:
+    counters: Counter = Counter()
+    for line in metrics_registry.render().splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            counters[(match.group(1), match.group(2))] = float(match.group(3))
+    return counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--cascades", nargs="+", default=["", "model", "heuristic,model"]
+    )
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--reflection-latency", default="lognormal:1.5,0.4")
+    parser.add_argument("--confidence", type=float, default=0.8)
+    args = parser.parse_args()
+
+    for cascade in args.cascades:
+        latency_estimates.reset()
+        before = cascade_counters()
+        report = asyncio.run(
+            run_load_test(
+                LoadTestConfig(
+                    runs=args.runs,
+                    concurrency=args.concurrency,
+                    search_latency="lognormal:1.0,0.5",
+                    llm_latency="lognormal:0.5,0.4",
+                    model_latency={"gemini-2.5-flash": args.reflection_latency},
+                    initial_queries=(3,),
+                    research_loops=(2, 3),
+                    configurable={
+                        "reflection_cascade": cascade,
+                        "reflection_cascade_confidence": args.confidence,
+                        "novelty_threshold": 0,
+                        "model_requests_per_minute": "gemini-2.0-flash=0,gemini-2.5-flash=0,gemini-2.5-pro=0",
+                    },
+                )
+            )
+        )
+        counts = cascade_counters()
+        counts.subtract(before)
+        decisions = {}
+        for (name, labels), value in counts.items():
+            if name.endswith("decisions_total"):
+                tier = re.search(r'tier="(\w+)"', labels).group(1)
+                accepted = 'outcome="accepted"' in labels
+                kept, total = decisions.get(tier, (0, 0))
+                decisions[tier] = (kept + value * accepted, total + value)
+        saved = sum(
+            value if 'kind="saved"' in labels else -value
+            for (name, labels), value in counts.items()
+            if name.endswith("seconds_total")
+        )
+        latency = report["latency_s"]
+        kept = "  ".join(
+            f"{tier} kept {kept / total:.0%} of {total:.0f}"
+            for tier, (kept, total) in sorted(decisions.items())
+        )
+        print(
+            f"cascade {cascade or 'off':16s} p50 {latency['p50']:.2f} s  p95 {latency['p95']:.2f} s  "
+            f"saved {saved / report['completed']:+.2f} s/run  {kept}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark of checkpoint size and write volume with and without the blob store.
+
+Runs the graph against fake Gemini clients with a checkpointer whose
+serializer counts the bytes and time of everything it writes, like the
+Postgres checkpointer of langgraph-api writes changed channels and pending
+writes at every step. Reports per run the checkpoint bytes written, the
+serialization time, the size of the final checkpoint and the bytes written
+to the blob store.
+
+Usage:
+    python benchmarks/checkpoints.py --runs 20 --queries 3 --loops 3 --num-sources 12
+"""
+
+import argparse
+import asyncio
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+import agent.graph  # noqa: F401
+from agent.clients import set_client_registry
+from agent.fakes import fake_client_registry
+
+
+class MeasuringSerializer(JsonPlusSerializer):
+    """Serializer counting the bytes and time of what the checkpointer writes."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def dumps_typed(self, obj: Any) -> tuple:
+        start = time.perf_counter()
+        result = super().dumps_typed(obj)
+        self.seconds += time.perf_counter() - start
+        self.bytes += len(result[1])
+        return result
+
+
+def blob_bytes(backend: str, location: str) -> int:
+    if backend == "sqlite":
+        with sqlite3.connect(location) as conn:
+            return conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+            ).fetchone()[0]
+    if backend == "filesystem":
+        return sum(
+            path.stat().st_size
+            for path in pathlib.Path(location).rglob("*")
+            if path.is_file()
+        )
+    return 0
+
+
+async def run(
+    backend: str, location: str, args: argparse.Namespace
+) -> Dict[str, float]:
+    serde = MeasuringSerializer()
+    saver = InMemorySaver(serde=serde)
+    graph = sys.modules["agent.graph"].builder.compile(checkpointer=saver)
+    final_sizes = []
+    for index in range(args.runs):
+        config = {
+            "configurable": {
+                "thread_id": f"{backend or 'inline'}-{index}",
+                "blob_store_backend": backend,
+                "blob_store_location": location,
+                "answer_cache_enabled": False,
+                "search_cache_ttl_seconds": 0,
+                "novelty_threshold": 0,
+                "model_requests_per_minute": "gemini-2.0-flash=0,gemini-2.5-flash=0,gemini-2.5-pro=0",
+            }
+        }
+        await graph.ainvoke(
+            {
+                "messages": [HumanMessage(f"Benchmark question {index}")],
+                "initial_search_query_count": args.queries,
+                "max_research_loops": args.loops,
+            },
+            config,
+        )
+        checkpoint = saver.get_tuple(config).checkpoint
+        final_sizes.append(
+            sum(
+                len(JsonPlusSerializer().dumps_typed(value)[1])
+                for value in checkpoint["channel_values"].values()
+            )
+        )
+    return {
+        "written_kib": serde.bytes / args.runs / 1024,
+        "serialize_ms": serde.seconds / args.runs * 1e3,
+        "final_kib": sum(final_sizes) / len(final_sizes) / 1024,
+        "blob_kib": blob_bytes(backend, location) / args.runs / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--loops", type=int, default=3)
+    parser.add_argument("--num-sources", type=int, default=12)
+    args = parser.parse_args()
+
+    set_client_registry(fake_client_registry(num_sources=args.num_sources))
+    print(
+        f"{args.runs} runs, {args.queries} queries, {args.loops} loops, {args.num_sources} sources per search"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend, location in (
+            ("", ""),
+            ("filesystem", f"{tmp}/blobs"),
+            ("sqlite", f"{tmp}/blobs.sqlite3"),
+        ):
+            result = asyncio.run(run(backend, location, args))
+            print(
+                f"{backend or 'inline':10s} "
+                f"checkpoint writes {result['written_kib']:8.1f} KiB/run  "
+                f"serialization {result['serialize_ms']:6.2f} ms/run  "
+                f"final checkpoint {result['final_kib']:7.1f} KiB  "
+                f"blob writes {result['blob_kib']:6.1f} KiB/run"
+            )
+
+
+if __name__ == "__main__":
+    main()
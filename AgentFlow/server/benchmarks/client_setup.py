@@ -0,0 +1,73 @@
+"""Micro-benchmark of per-node Gemini client setup overhead.
+
+Compares building a fresh `ChatGoogleGenerativeAI` plus `with_structured_output`
+wrapper on every node call (the previous behaviour) with looking the runnable
+up in the shared `ClientRegistry`. No requests are sent to the API.
+
+Usage:
+    python benchmarks/client_setup.py --iterations 200
+"""
+
+import argparse
+import os
+import time
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from agent.clients import ClientRegistry
+from agent.tools_and_schemas import Reflection, SearchQueryList
+
+MODELS = [
+    ("gemini-2.0-flash", SearchQueryList, 1.0),
+    ("gemini-2.5-flash", Reflection, 1.0),
+    ("gemini-2.5-pro", None, 0.0),
+]
+
+
+def per_call_setup(api_key: str) -> None:
+    for model, schema, temperature in MODELS:
+        llm = ChatGoogleGenerativeAI(
+            model=model, temperature=temperature, max_retries=2, api_key=api_key
+        )
+        if schema is not None:
+            llm.with_structured_output(schema)
+
+
+def registry_lookup(registry: ClientRegistry) -> None:
+    for model, schema, temperature in MODELS:
+        if schema is None:
+            registry.chat_model(model, temperature=temperature, max_retries=2)
+        else:
+            registry.structured_model(
+                model, schema, temperature=temperature, max_retries=2
+            )
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    # Clients are only constructed; no request is ever sent.
+    api_key = os.getenv("GOOGLE_API_KEY", "benchmark-key")
+    registry = ClientRegistry(api_key=api_key)
+
+    before = timed(lambda: per_call_setup(api_key), args.iterations)
+    registry_lookup(registry)  # warm the registry once, as the first run does
+    after = timed(lambda: registry_lookup(registry), args.iterations)
+
+    nodes = len(MODELS)
+    print(f"per-node setup, fresh clients : {before / nodes * 1e6:10.1f} us")
+    print(f"per-node setup, registry      : {after / nodes * 1e6:10.1f} us")
+    print(f"speedup                       : {before / after:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
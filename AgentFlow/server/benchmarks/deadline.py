@@ -0,0 +1,78 @@
+"""Benchmark of run latency and research depth under run deadlines.
+
+Runs the offline load test once per deadline, with the answer model slower
+than the other models as with Gemini 2.5 Pro, and reports the latency
+percentiles, the searches made, the share of runs meeting their deadline
+and the actions runs took to meet it.
+
+Usage:
+    python benchmarks/deadline.py --deadlines 0 6000 8000 10000
+"""
+
+import argparse
+import asyncio
+import re
+
+from agent.deadline import latency_estimates
+from agent.loadtest import LoadTestConfig, run_load_test
+from agent.metrics import metrics_registry
+
+_SAMPLE = re.compile(r'^(agentflow_deadline_\w+)\{\w+="(\w+)"\} (\S+)$')
+
+
+def deadline_counters() -> dict:
+    counters = {}
+    for line in metrics_registry.render().splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            counters[match.group(2)] = float(match.group(3))
+    return counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--deadlines", type=int, nargs="+", default=[0, 6000, 8000, 10000]
+    )
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--search-latency", default="lognormal:1.0,0.5")
+    parser.add_argument("--llm-latency", default="lognormal:0.5,0.4")
+    parser.add_argument("--answer-latency", default="lognormal:2.0,0.4")
+    args = parser.parse_args()
+
+    for deadline in args.deadlines:
+        latency_estimates.reset()
+        before = deadline_counters()
+        report = asyncio.run(
+            run_load_test(
+                LoadTestConfig(
+                    runs=args.runs,
+                    concurrency=args.concurrency,
+                    search_latency=args.search_latency,
+                    llm_latency=args.llm_latency,
+                    model_latency={"gemini-2.5-pro": args.answer_latency},
+                    initial_queries=(3, 5),
+                    research_loops=(2, 3),
+                    configurable={
+                        "deadline_ms": deadline,
+                        "model_requests_per_minute": "gemini-2.0-flash=0,gemini-2.5-flash=0,gemini-2.5-pro=0",
+                    },
+                )
+            )
+        )
+        after = deadline_counters()
+        counts = {name: after.get(name, 0) - before.get(name, 0) for name in after}
+        latency = report["latency_s"]
+        met = f"{counts.get('met', 0) / report['completed']:.1%}" if deadline else "-"
+        print(
+            f"deadline {deadline / 1000 if deadline else 'none':>5} s  "
+            f"p50 {latency['p50']:.2f} s  p95 {latency['p95']:.2f} s  p99 {latency['p99']:.2f} s  "
+            f"searches {report['search_calls'] / report['completed']:.1f}/run  met {met}  "
+            f"cut queries {counts.get('cut_queries', 0):.0f}  skipped loops {counts.get('skip_loop', 0):.0f}  "
+            f"fast answers {counts.get('fast_answer_model', 0):.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark of hedged grounded searches under long-tailed latencies.
+
+Sends the same stream of simulated searches, sampled from the fake-client
+latency distributions, through `agent.hedging.Hedger` at several hedging
+budgets and reports the latency percentiles against the extra requests sent.
+
+Usage:
+    python benchmarks/hedging.py --latency lognormal:1.5,0.6 --requests 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from agent.fakes import parse_latency
+from agent.hedging import Hedger
+from agent.loadtest import percentile
+
+
+async def run(
+    latency_spec: str, budget: float, requests: int, concurrency: int, seed: int
+):
+    latency = parse_latency(latency_spec, seed)
+    hedger = Hedger()
+    calls = 0
+    durations = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def search():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(latency())
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await hedger.call("gemini-2.0-flash", search, budget)
+            durations.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return durations, calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", default="lognormal:0.05,0.6")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--budgets", type=float, nargs="+", default=[0, 2, 5, 10, 20])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(
+        f"latency {args.latency}, {args.requests} searches, {args.concurrency} at once"
+    )
+    for budget in args.budgets:
+        durations, calls = asyncio.run(
+            run(args.latency, budget, args.requests, args.concurrency, args.seed)
+        )
+        print(
+            f"budget {budget:4.0f}%  "
+            f"p50 {percentile(durations, 50) * 1e3:7.1f} ms  "
+            f"p90 {percentile(durations, 90) * 1e3:7.1f} ms  "
+            f"p99 {percentile(durations, 99) * 1e3:7.1f} ms  "
+            f"p99.9 {percentile(durations, 99.9) * 1e3:7.1f} ms  "
+            f"extra requests {100 * (calls - args.requests) / args.requests:5.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
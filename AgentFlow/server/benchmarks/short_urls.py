@@ -0,0 +1,79 @@
+"""Benchmark of short-url expansion in finalize_answer.
+
+Compares the previous per-source `in` scan plus `str.replace` loop with the
+single-pass `agent.citations.expand_short_urls` on long synthetic answers
+citing hundreds of sources, with the duplicates several research loops leave
+in `sources_gathered`.
+
+Usage:
+    python benchmarks/short_urls.py --sources 100 500 1000
+"""
+
+import argparse
+import random
+import time
+
+from agent.citations import expand_short_urls
+
+PREFIX = "https://vertexaisearch.cloud.google.com/id/"
+
+
+def legacy_expand(content, sources_gathered):
+    unique_sources = []
+    for source in sources_gathered:
+        if source["short_url"] in content:
+            content = content.replace(source["short_url"], source["value"])
+            unique_sources.append(source)
+    return content, unique_sources
+
+
+def synthetic(num_sources: int, duplicates: int = 3, paragraphs: int = 400):
+    rng = random.Random(0)
+    sources = [
+        {
+            "label": f"site{i}",
+            "short_url": f"{PREFIX}{i // 10}-{i % 10}",
+            "value": f"https://vertexaisearch.cloud.google.com/grounding-api-redirect/{i:064d}",
+        }
+        for i in range(num_sources)
+    ]
+    gathered = [dict(source) for source in sources for _ in range(duplicates)]
+    rng.shuffle(gathered)
+    cited = rng.sample(sources, k=max(1, num_sources // 2))
+    answer = "\n\n".join(
+        f"Paragraph {i} states a finding [{s['label']}]({s['short_url']})."
+        for i, s in ((i, cited[i % len(cited)]) for i in range(paragraphs))
+    )
+    return answer, gathered
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    args = parser.parse_args()
+    for num_sources in args.sources:
+        answer, gathered = synthetic(num_sources, paragraphs=args.paragraphs)
+        expanded, used = expand_short_urls(answer, gathered)
+        assert PREFIX not in expanded
+        assert len(used) == len({s["short_url"] for s in used})
+        before = timed(lambda: legacy_expand(answer, gathered))
+        after = timed(lambda: expand_short_urls(answer, gathered))
+        print(
+            f"{num_sources:>5} sources x3, {len(answer) // 1024:>5} KiB answer  "
+            f"legacy {before * 1e3:9.2f} ms  single-pass {after * 1e3:8.2f} ms  "
+            f"speedup {before / after:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Benchmark of frontend asset serving: plain `StaticFiles` against `PrecompressedStaticFiles`.
+
+Serves a Vite build in process through httpx and reports, per server:
+
+* a first page load (index.html, the JS bundle and the CSS), as a browser
+  sends it with `Accept-Encoding: gzip, deflate, br`: requests, bytes
+  transferred and time;
+* a repeat load with a warm browser cache: assets served without a
+  validator or with `no-cache` are revalidated, `immutable` ones are not
+  requested at all;
+* the throughput of requests for the JS bundle.
+
+Without a build at --build-dir, a synthetic one of the client's size is
+generated.
+
+Usage:
+    python benchmarks/static_files.py --build-dir ../client/dist --requests 2000
+"""
+
+import argparse
+import asyncio
+import pathlib
+import random
+import tempfile
+import time
+
+import httpx
+from starlette.staticfiles import StaticFiles
+
+from agent.static_files import PrecompressedStaticFiles
+
+ACCEPT_ENCODING = "gzip, deflate, br"
+
+
+def synthetic_build(
+    root: pathlib.Path, js_bytes: int = 400_000, css_bytes: int = 30_000
+) -> None:
+    """Write a Vite-like build with minified-looking JS and CSS of the given sizes."""
+    rng = random.Random(0)
+    names = [
+        "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(1, 8)))
+        for _ in range(400)
+    ]
+    words = [
+        "function",
+        "return",
+        "const",
+        "let",
+        "if",
+        "else",
+        "=>",
+        "null",
+        "this",
+        "props",
+        "useState",
+    ]
+    js = []
+    while sum(map(len, js)) < js_bytes:
+        js.append(
+            f"function {rng.choice(names)}({rng.choice(names)},{rng.choice(names)})"
+            f"{{{rng.choice(words)} {rng.choice(names)}.{rng.choice(names)}({rng.randint(0, 999)})}};"
+        )
+    css = []
+    while sum(map(len, css)) < css_bytes:
+        css.append(
+            f".{rng.choice(names)}{{margin:{rng.randint(0, 64)}px;color:#{rng.randint(0, 0xFFFFFF):06x}}}"
+        )
+    (root / "assets").mkdir(parents=True)
+    (root / "assets/index-Bx3kQ9aZ.js").write_text("".join(js))
+    (root / "assets/index-C7pLm2Qe.css").write_text("".join(css))
+    (root / "index.html").write_text(
+        '<!doctype html><html lang="en"><head><meta charset="UTF-8" />'
+        '<link rel="icon" type="image/svg+xml" href="/app/vite.svg" />'
+        '<meta name="viewport" content="width=device-width, initial-scale=1.0" />'
+        "<title>AgentFlow</title>"
+        '<script type="module" crossorigin src="/app/assets/index-Bx3kQ9aZ.js"></script>'
+        '<link rel="stylesheet" crossorigin href="/app/assets/index-C7pLm2Qe.css"></head>'
+        '<body><div id="root"></div></body></html>'
+    )
+
+
+def page_assets(root: pathlib.Path) -> list:
+    paths = ["index.html"]
+    for suffix in ("*.js", "*.css"):
+        found = sorted(
+            (root / "assets").glob(suffix), key=lambda path: -path.stat().st_size
+        )
+        paths += [f"assets/{found[0].name}"] if found else []
+    return paths
+
+
+async def fetch(client: httpx.AsyncClient, path: str, headers: dict) -> tuple:
+    """GET a path and return the response with the bytes transferred, without decoding them."""
+    async with client.stream("GET", f"/{path}", headers=headers) as response:
+        transferred = sum([len(chunk) async for chunk in response.aiter_raw()])
+    return response, transferred
+
+
+async def page_load(client: httpx.AsyncClient, paths: list, cache: dict) -> tuple:
+    """Load the page like a browser with `cache` of path -> (etag, cache-control), updating it."""
+    requests = transferred = 0
+    started = time.perf_counter()
+    for path in paths:
+        headers = {"accept-encoding": ACCEPT_ENCODING}
+        etag, cache_control = cache.get(path, (None, ""))
+        if "immutable" in cache_control:
+            continue
+        if etag:
+            headers["if-none-match"] = etag
+        response, size = await fetch(client, path, headers)
+        requests += 1
+        transferred += size
+        cache[path] = (
+            response.headers.get("etag"),
+            response.headers.get("cache-control", ""),
+        )
+    return requests, transferred, time.perf_counter() - started
+
+
+async def measure(name: str, app, paths: list, requests: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        cache: dict = {}
+        first = await page_load(client, paths, cache)
+        repeat = await page_load(client, paths, cache)
+        bundle = paths[1] if len(paths) > 1 else paths[0]
+        started = time.perf_counter()
+        for _ in range(requests):
+            await fetch(client, bundle, {"accept-encoding": ACCEPT_ENCODING})
+        elapsed = time.perf_counter() - started
+    print(
+        f"{name:26s} first load {first[0]} req {first[1] / 1024:7.1f} KiB {first[2] * 1e3:6.1f} ms  "
+        f"repeat load {repeat[0]} req {repeat[1] / 1024:5.1f} KiB  "
+        f"bundle {requests / elapsed:7.0f} req/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--build-dir", default="../client/dist")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(args.build_dir)
+        if not (root / "index.html").is_file():
+            root = pathlib.Path(tmp)
+            synthetic_build(root)
+            print("No build found, using a synthetic one")
+        paths = page_assets(root)
+        for path in paths:
+            print(f"  {path}: {(root / path).stat().st_size / 1024:.1f} KiB")
+        started = time.perf_counter()
+        precompressed = PrecompressedStaticFiles(directory=root, html=True)
+        print(
+            f"  precompression at startup: {(time.perf_counter() - started) * 1e3:.0f} ms"
+        )
+        asyncio.run(
+            measure(
+                "StaticFiles",
+                StaticFiles(directory=root, html=True),
+                paths,
+                args.requests,
+            )
+        )
+        asyncio.run(
+            measure("PrecompressedStaticFiles", precompressed, paths, args.requests)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark of research topic building on long conversation threads.
+
+Compares, for threads of thousands of messages, the cost of one run's topic
+when the whole transcript is rendered again (`get_research_topic`) against
+the incremental builder carrying the rendered history in state, with and
+without a message window, and reports the resulting topic sizes.
+
+Usage:
+    python benchmarks/topic.py --messages 1000 5000 10000 --answer-chars 1500
+"""
+
+import argparse
+import time
+from typing import Callable, List
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.topic import build_research_topic
+from agent.utils import get_research_topic
+
+
+def make_thread(messages: int, answer_chars: int) -> list:
+    thread = []
+    for turn in range((messages + 1) // 2):
+        thread.append(
+            HumanMessage(f"Follow-up question {turn} about the topic?", id=f"h{turn}")
+        )
+        thread.append(AIMessage("x" * answer_chars, id=f"a{turn}"))
+    return thread[:messages]
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--answer-chars", type=int, default=1500)
+    parser.add_argument("--window", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for count in args.messages:
+        thread = make_thread(count, args.answer_chars)
+        # State left by the previous run, two messages earlier.
+        rows: List[tuple] = []
+        for label, window in (
+            ("incremental", 0),
+            (f"window {args.window}", args.window),
+        ):
+            _, previous = build_research_topic(thread[:-2], {}, window=window)
+            topic, _ = build_research_topic(thread, previous, window=window)
+            seconds = timed(
+                lambda: build_research_topic(thread, previous, window=window),
+                args.repeat,
+            )
+            rows.append((label, seconds, len(topic)))
+        full = get_research_topic(thread)
+        rows.insert(
+            0,
+            (
+                "full rebuild",
+                timed(lambda: get_research_topic(thread), args.repeat),
+                len(full),
+            ),
+        )
+
+        print(f"{count} messages")
+        for label, seconds, chars in rows:
+            print(
+                f"  {label:14s} {seconds * 1e3:9.3f} ms per run  topic {chars / 1e3:9.1f} k chars"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Semantic cache of final answers, so repeated research topics skip the research loop."""
+
+import functools
+import threading
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from agent.dedupe import load_embedding_model, shingles, topic_numbers
+from agent.metrics import metrics_registry
+from agent.search_cache import normalize_query
+
+HASHED_EMBEDDING_DIMENSIONS = 1024
+
+
+def normalize_topic(topic: str) -> str:
+    """Normalize a research topic so trivially different spellings share an entry."""
+    return normalize_query(topic)
+
+
+def hashed_embedding(
+    texts: List[str], dimensions: int = HASHED_EMBEDDING_DIMENSIONS
+) -> np.ndarray:
+    """Embed texts by feature hashing their query shingles.
+
+    The signed counts of each text's words and character 4-grams are hashed
+    into `dimensions` buckets and normalized, so the cosine similarity of two
+    vectors approximates the overlap of their shingle sets. Used when no
+    sentence-transformers model is configured.
+    """
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for shingle in shingles(text):
+            hashed = zlib.crc32(shingle.encode("utf-8"))
+            vectors[row, hashed % dimensions] += 1.0 if hashed & 0x80000000 else -1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+@functools.lru_cache(maxsize=4)
+def get_embedder(model_name: str) -> Callable[[List[str]], np.ndarray]:
+    """Return the embedding function of the answer cache.
+
+    Uses the local sentence-transformers model `model_name` when given and
+    installed, and the hashed shingle embedding otherwise.
+    """
+    model = load_embedding_model(model_name) if model_name else None
+    if model is None:
+        return hashed_embedding
+    return lambda texts: np.asarray(model(texts), dtype=np.float32)
+
+
+@functools.lru_cache(maxsize=64)
+def parse_run_date(run_date: str) -> date | None:
+    """Parse a run date as formatted by `get_current_date`, or return None."""
+    try:
+        return datetime.strptime(run_date, "%B %d, %Y").date()
+    except ValueError:
+        return None
+
+
+@dataclass
+class CachedAnswer:
+    """A final answer stored in the answer cache.
+
+    Attributes:
+        topic: The normalized research topic the answer was written for.
+        answer: The text of the final answer.
+        sources_gathered: The sources cited by the answer.
+        run_date: The date of the run that wrote the answer.
+        similarity: Cosine similarity of the topic to the looked up one, set on hits.
+    """
+
+    topic: str
+    answer: str
+    sources_gathered: List[Dict[str, Any]]
+    run_date: str
+    similarity: float = 1.0
+
+
+class AnswerCache:
+    """In-memory semantic cache of final answers, keyed by research topic embedding.
+
+    Topic vectors are kept in a flat NumPy matrix searched by brute-force
+    cosine similarity, which stays fast for the few thousand entries an
+    answer cache holds. A lookup returns the most similar fresh entry among
+    the `top_k` nearest topics. An entry is fresh while fewer than `ttl_days`
+    days separate its run date from the current run date, and similar topics
+    only match when they mention the same numbers. Once `max_entries`
+    answers are stored, the least recently used one is replaced.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], np.ndarray],
+        max_entries: int = 1000,
+        top_k: int = 5,
+    ):
+        """Create an empty cache of the answers embedded by `embed`."""
+        self.embed = embed
+        self.max_entries = max_entries
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._vectors: np.ndarray | None = None
+        self._entries: List[CachedAnswer | None] = []
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._rows_by_topic: Dict[str, int] = {}
+        self._clock = 0
+
+    def __len__(self) -> int:
+        """Return the number of cached topics."""
+        return len(self._rows_by_topic)
+
+    def _touch(self, row: int) -> None:
+        self._clock += 1
+        self._last_used[row] = self._clock
+
+    def _remove(self, row: int) -> None:
+        entry = self._entries[row]
+        if entry is not None:
+            del self._rows_by_topic[entry.topic]
+            self._entries[row] = None
+            self._vectors[row] = 0
+            self._last_used[row] = 0
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Return the rows and similarities of the `k` stored topics nearest to `vector`."""
+        if self._vectors is None or not self._rows_by_topic:
+            return []
+        scores = self._vectors[: len(self._entries)] @ vector
+        k = min(k, len(scores))
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[np.argsort(-scores[rows])]
+        return [
+            (int(row), float(scores[row]))
+            for row in rows
+            if self._entries[row] is not None
+        ]
+
+    def lookup(
+        self, topic: str, run_date: str, threshold: float, ttl_days: int
+    ) -> Tuple[CachedAnswer | None, str]:
+        """Look up the cached answer of a research topic.
+
+        Args:
+            topic: The research topic of the run.
+            run_date: The current run date, as formatted by `get_current_date`.
+            threshold: Minimum cosine similarity of a cached topic to match.
+            ttl_days: Days after its run date an answer stops being served.
+
+        Returns:
+            The matching answer or None, and the outcome of the lookup: "hit",
+            "miss", or "stale" when only expired answers matched.
+        """
+        normalized = normalize_topic(topic)
+        today = parse_run_date(run_date)
+        # Identical topics skip the embedding, which may be a model call.
+        vector = None
+        if normalized not in self._rows_by_topic:
+            vector = self.embed([normalized])[0]
+        with self._lock:
+            row = self._rows_by_topic.get(normalized)
+            if row is not None:
+                candidates = [(row, 1.0)]
+            elif vector is None:
+                candidates = []
+            else:
+                numbers = topic_numbers(normalized)
+                candidates = [
+                    (row, score)
+                    for row, score in self.search(vector, self.top_k)
+                    if score >= threshold
+                    and topic_numbers(self._entries[row].topic) == numbers
+                ]
+            outcome = "miss"
+            for row, score in candidates:
+                entry = self._entries[row]
+                written = parse_run_date(entry.run_date)
+                if (
+                    today is None
+                    or written is None
+                    or (today - written).days >= ttl_days
+                ):
+                    self._remove(row)
+                    outcome = "stale"
+                    continue
+                self._touch(row)
+                return (
+                    CachedAnswer(
+                        topic=entry.topic,
+                        answer=entry.answer,
+                        sources_gathered=list(entry.sources_gathered),
+                        run_date=entry.run_date,
+                        similarity=score,
+                    ),
+                    "hit",
+                )
+            return None, outcome
+
+    def put(
+        self,
+        topic: str,
+        answer: str,
+        sources_gathered: Sequence[Dict[str, Any]],
+        run_date: str,
+    ) -> None:
+        """Store the final answer of a research topic, replacing the least recently used one if full."""
+        normalized = normalize_topic(topic)
+        vector = self.embed([normalized])[0]
+        entry = CachedAnswer(
+            topic=normalized,
+            answer=answer,
+            sources_gathered=list(sources_gathered),
+            run_date=run_date,
+        )
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros(
+                    (self.max_entries, len(vector)), dtype=np.float32
+                )
+            row = self._rows_by_topic.get(normalized)
+            if row is None:
+                if len(self._entries) < self.max_entries:
+                    row = len(self._entries)
+                    self._entries.append(None)
+                else:
+                    row = int(np.argmin(self._last_used))
+                    self._remove(row)
+            self._entries[row] = entry
+            self._vectors[row] = vector
+            self._rows_by_topic[normalized] = row
+            self._touch(row)
+
+
+def record_answer_cache_lookup(outcome: str) -> None:
+    """Count an answer cache lookup by outcome."""
+    metrics_registry.inc(
+        "agentflow_answer_cache_requests_total",
+        "Whole-run answer cache lookups by outcome.",
+        result=outcome,
+    )
+
+
+_caches: Dict[Tuple[str, str, Tuple[int, ...]], AnswerCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(
+    embedding_model: str,
+    answer_model: str,
+    max_entries: int,
+    research_effort: Tuple[int, ...] = (),
+) -> AnswerCache:
+    """Return the process-wide answer cache of an embedding model, answer model and effort.
+
+    Answers written by different answer models or after different amounts
+    of research, e.g. the initial query count and research loop limit, and
+    topic vectors of different embedding models, are kept in separate caches.
+    """
+    key = (embedding_model, answer_model, tuple(research_effort))
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = AnswerCache(
+                get_embedder(embedding_model), max_entries
+            )
+        return cache
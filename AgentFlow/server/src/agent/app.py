@@ -1,11 +1,57 @@
 # mypy: disable - error - code = "no-untyped-def,misc"
 import pathlib
-from fastapi import FastAPI, Response
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from agent.batch import parse_questions, run_batch, to_ndjson
+from agent.metrics import metrics_registry, run_traces
+from agent.static_files import PrecompressedStaticFiles
 
 # Define the FastAPI app
 app = FastAPI()
 
+# Runs of one batch request researched at once, so a request cannot take
+# every scheduler slot.
+MAX_BATCH_CONCURRENCY = 32
+
+
+@app.get("/metrics")
+def metrics():
+    """Expose per-node latency, token, retry and cache metrics to Prometheus."""
+    return Response(
+        metrics_registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/metrics/runs")
+def run_summaries():
+    """Return the trace summaries of the most recently finished runs."""
+    return run_traces.summaries()
+
+
+@app.get("/metrics/runs/{run_id}")
+def run_summary(run_id: str):
+    """Return the trace summary of a finished or in-progress run."""
+    summary = run_traces.get(run_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Unknown run")
+    return summary
+
+
+@app.post("/batch")
+async def batch_research(
+    request: Request, concurrency: int = Query(8, ge=1, le=MAX_BATCH_CONCURRENCY)
+):
+    """Research a JSONL body of questions, streaming one NDJSON result per run as it finishes."""
+    body = await request.body()
+    try:
+        questions = parse_questions(body.decode("utf-8").splitlines())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return StreamingResponse(
+        to_ndjson(run_batch(questions, concurrency)), media_type="application/x-ndjson"
+    )
+
 
 def create_frontend_router(build_dir="../client/dist"):
     """Creates a router to serve the React frontend.
@@ -14,7 +60,7 @@ def create_frontend_router(build_dir="../client/dist"):
         build_dir: Path to the React build directory relative to this file.
 
     Returns:
-        A Starlette application serving the frontend.
+        A Starlette application serving the frontend, precompressed and with cache headers.
     """
     build_path = pathlib.Path(__file__).parent.parent.parent / build_dir
 
@@ -34,7 +80,7 @@ def create_frontend_router(build_dir="../client/dist"):
 
         return Route("/{path:path}", endpoint=dummy_frontend)
 
-    return StaticFiles(directory=build_path, html=True)
+    return PrecompressedStaticFiles(directory=build_path, html=True)
 
 
 # Mount the frontend under /app to not conflict with the LangGraph API routes
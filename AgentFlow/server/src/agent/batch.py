@@ -0,0 +1,356 @@
+"""Batch research of many questions with queries shared across the batch.
+
+Questions are read from JSONL, one per line, either as a JSON string or as an
+object with a "question" and optional "id", "initial_search_query_count" and
+"max_research_loops". They run through the compiled `graph` at most
+`concurrency` at once, in the scheduler's batch lane, and one NDJSON result
+is written per run as soon as it finishes, in completion order.
+
+All runs of a batch share a `QuestionBatch`: a search query paraphrasing one
+that another run of the batch generated first is replaced by that query
+before fan-out, so the batch searches it once.
+
+Usage:
+    python -m agent.batch questions.jsonl --concurrency 8 --output answers.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+)
+
+from google.genai import types
+from langchain_core.messages import HumanMessage
+
+from agent.dedupe import estimate_similarity, minhash_signature, topic_numbers
+from agent.metrics import metrics_registry
+from agent.search_cache import FetchAbandoned, abandon, normalize_query
+
+# Locality-sensitive hashing of the MinHash signatures: two queries land in
+# the same bucket of at least one band with probability 1 - (1 - s^4)^16,
+# above 98% at the default dedupe threshold s = 0.7.
+_BANDS = 16
+_ROWS = 4
+
+
+class QuestionBatch:
+    """Search queries and search responses shared by the runs of a question batch.
+
+    Every query is mapped to the first query of the batch it paraphrases, its
+    canonical query. Candidates are found through LSH buckets of the MinHash
+    signatures, so mapping a query costs a few comparisons instead of one per
+    query of the batch. With the search cache disabled, responses are also kept
+    for the lifetime of the batch and concurrent searches of a query share a
+    single call.
+    """
+
+    def __init__(self):
+        """Create an empty question batch."""
+        self._lock = threading.Lock()
+        self._canonical: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[str]] = {}
+        self._responses: Dict[str, asyncio.Future] = {}
+
+    def _canonical_query(self, query: str, threshold: float) -> str:
+        normalized = normalize_query(query)
+        canonical = self._canonical.get(normalized)
+        if canonical is not None:
+            return canonical
+        signature = minhash_signature(query)
+        bands = [
+            (band, signature[band * _ROWS : (band + 1) * _ROWS])
+            for band in range(_BANDS)
+        ]
+        best_score = 0.0
+        if threshold > 0:
+            numbers = topic_numbers(query)
+            candidates = dict.fromkeys(
+                other for band in bands for other in self._buckets.get(band, ())
+            )
+            for other in candidates:
+                # "iPhone 15 sales" and "iPhone 16 sales" are similar but not paraphrases.
+                if topic_numbers(other) != numbers:
+                    continue
+                score = estimate_similarity(query, other)
+                if score >= threshold and score > best_score:
+                    canonical, best_score = other, score
+        if canonical is None:
+            canonical = query
+            for band in bands:
+                self._buckets.setdefault(band, []).append(query)
+        self._canonical[normalized] = canonical
+        return canonical
+
+    def share(
+        self, queries: Sequence[str], researched: Sequence[str], threshold: float = 0.7
+    ) -> List[str]:
+        """Replace queries by the query of the batch they paraphrase.
+
+        Args:
+            queries: The queries a run is about to research.
+            researched: The queries the run already researched, left out of the result.
+            threshold: Minimum MinHash similarity for a query to be replaced. 0 only
+                shares queries that are identical up to case and whitespace. Queries
+                with different numbers, e.g. years or versions, are never replaced.
+
+        Returns:
+            The canonical queries, without duplicates.
+        """
+        shared = []
+        with self._lock:
+            for query in queries:
+                canonical = self._canonical_query(query, threshold)
+                metrics_registry.inc(
+                    "agentflow_batch_queries_total",
+                    "Search queries of question batches, by whether another run of the batch generated them first.",
+                    result="new" if canonical == query else "shared",
+                )
+                shared.append(canonical)
+        done = set(researched)
+        return [query for query in dict.fromkeys(shared) if query not in done]
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[types.GenerateContentResponse]],
+    ) -> types.GenerateContentResponse:
+        """Return the batch's response for `key`, calling `fetch` at most once at a time.
+
+        Failures are not kept and are raised to every waiting caller. If the
+        caller making the call is cancelled, a waiting caller takes it over.
+        """
+        while True:
+            pending = self._responses.get(key)
+            if pending is None:
+                return await self._fetch(key, fetch)
+            metrics_registry.inc(
+                "agentflow_batch_searches_total",
+                "Searches of question batches, by whether they were made or shared with another run of the batch.",
+                result="shared",
+            )
+            try:
+                return await asyncio.shield(pending)
+            except FetchAbandoned:
+                continue
+
+    async def _fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[types.GenerateContentResponse]],
+    ) -> types.GenerateContentResponse:
+        metrics_registry.inc(
+            "agentflow_batch_searches_total",
+            "Searches of question batches, by whether they were made or shared with another run of the batch.",
+            result="fetched",
+        )
+        future = asyncio.get_running_loop().create_future()
+        self._responses[key] = future
+        try:
+            response = await fetch()
+        except asyncio.CancelledError:
+            self._responses.pop(key, None)
+            abandon(future)
+            raise
+        except BaseException as exc:
+            self._responses.pop(key, None)
+            future.set_exception(exc)
+            # Mark the exception retrieved when nobody else was waiting.
+            future.exception()
+            raise
+        future.set_result(response)
+        return response
+
+
+_batches: Dict[str, QuestionBatch] = {}
+
+
+def get_question_batch(batch_id: str) -> QuestionBatch | None:
+    """Return the open question batch with the given id, or None."""
+    return _batches.get(batch_id) if batch_id else None
+
+
+@contextmanager
+def open_question_batch() -> Iterator[str]:
+    """Open a question batch for the duration of the block and yield its id."""
+    batch_id = uuid.uuid4().hex
+    _batches[batch_id] = QuestionBatch()
+    try:
+        yield batch_id
+    finally:
+        _batches.pop(batch_id, None)
+
+
+def parse_questions(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """Parse JSONL questions, skipping blank lines.
+
+    Questions without an "id" are numbered by their line.
+
+    Raises:
+        ValueError: If a line is not JSON or holds no question.
+    """
+    questions = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Line {number} is not valid JSON: {exc}") from exc
+        if isinstance(item, str):
+            item = {"question": item}
+        if not isinstance(item, dict) or not str(item.get("question") or "").strip():
+            raise ValueError(f"Line {number} has no question")
+        questions.append({"id": item.get("id", number), **item})
+    return questions
+
+
+def batch_result(
+    item: Dict[str, Any], state: Dict[str, Any], elapsed: float
+) -> Dict[str, Any]:
+    """Return the NDJSON record of a finished run."""
+    messages = state.get("messages") or []
+    answer = messages[-1].content if messages else ""
+    sources = {}
+    for source in state.get("sources_gathered") or []:
+        if (
+            isinstance(source, dict)
+            and source.get("value")
+            and source["value"] in answer
+        ):
+            sources.setdefault(source["value"], source.get("label", ""))
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        "answer": answer,
+        "sources": [{"label": label, "url": url} for url, label in sources.items()],
+        "search_queries": state.get("search_query") or [],
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+async def run_batch(
+    questions: Sequence[Dict[str, Any]],
+    concurrency: int = 8,
+    configurable: Dict[str, Any] | None = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Research questions through the compiled graph and yield their results as runs finish.
+
+    A failed run yields its question with an "error" instead of an answer.
+    Runs still going when the caller stops iterating are cancelled.
+
+    Args:
+        questions: Questions as returned by `parse_questions`.
+        concurrency: The number of questions researched at once.
+        configurable: Configuration shared by the runs of the batch.
+    """
+    from agent.graph import graph
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    with open_question_batch() as batch_id:
+
+        async def research(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            state: Dict[str, Any] = {"messages": [HumanMessage(item["question"])]}
+            for key in ("initial_search_query_count", "max_research_loops"):
+                if item.get(key) is not None:
+                    state[key] = item[key]
+            run_config = {
+                "configurable": {
+                    "scheduling_lane": "batch",
+                    **(configurable or {}),
+                    "question_batch_id": batch_id,
+                    "thread_id": f"batch-{batch_id}-{index}",
+                }
+            }
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await graph.ainvoke(state, run_config)
+                except Exception as exc:
+                    return {
+                        "id": item["id"],
+                        "question": item["question"],
+                        "error": f"{type(exc).__name__}: {exc}",
+                        "elapsed_s": round(time.perf_counter() - started, 3),
+                    }
+                return batch_result(item, result, time.perf_counter() - started)
+
+        tasks = [
+            asyncio.create_task(research(index, item))
+            for index, item in enumerate(questions)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def to_ndjson(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Encode results as NDJSON lines."""
+    async for result in results:
+        yield json.dumps(result, ensure_ascii=False) + "\n"
+
+
+async def _main(args: argparse.Namespace) -> None:
+    with (
+        open(args.questions, encoding="utf-8")
+        if args.questions != "-"
+        else sys.stdin as file
+    ):
+        questions = parse_questions(file)
+    output = (
+        open(args.output, "w", encoding="utf-8") if args.output != "-" else sys.stdout
+    )
+    started = time.perf_counter()
+    errors = 0
+    try:
+        async for result in run_batch(
+            questions, args.concurrency, json.loads(args.configurable)
+        ):
+            errors += "error" in result
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    sys.stderr.write(
+        f"{len(questions)} questions, {errors} errors, {time.perf_counter() - started:.1f} s\n"
+    )
+
+
+def main() -> None:
+    """Run the batch research command line."""
+    parser = argparse.ArgumentParser(description="Research a JSONL file of questions.")
+    parser.add_argument("questions", help="JSONL file of questions, - for stdin")
+    parser.add_argument(
+        "--output", default="-", help="NDJSON results file, - for stdout"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--configurable",
+        default="{}",
+        help="JSON object of configuration shared by the runs, e.g. model choices",
+    )
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Content-addressed storage of research payloads, kept out of checkpointed graph state."""
+
+import abc
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Sequence
+
+from agent.metrics import metrics_registry
+
+# Prefix of the string references that stand in for offloaded payloads in state.
+BLOB_REF_PREFIX = "blob:sha256:"
+
+
+def is_blob_ref(value: Any) -> bool:
+    """Return whether a state value is a reference to an offloaded payload."""
+    return isinstance(value, str) and value.startswith(BLOB_REF_PREFIX)
+
+
+def blob_ref(data: bytes) -> str:
+    """Return the content address of a payload."""
+    return BLOB_REF_PREFIX + hashlib.sha256(data).hexdigest()
+
+
+class BlobStore(abc.ABC):
+    """Content-addressed store of research payloads.
+
+    Payloads are keyed by the SHA-256 of their bytes, so a payload written by
+    several branches or runs is stored once and never rewritten. Recently
+    read or written payloads are kept in an in-process LRU of `cache_entries`,
+    since every research loop reads the results of the loops before it.
+    Subclasses implement `_read_many` and `_write_many`; a backend missing
+    either cannot be created.
+    """
+
+    def __init__(self, cache_entries: int = 4096):
+        """Create a store reading through an LRU cache of `cache_entries` payloads."""
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._cache_entries = cache_entries
+        self._cache_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _read_many(self, refs: List[str]) -> Dict[str, bytes]:
+        """Return the stored blobs among `refs`, by reference."""
+
+    @abc.abstractmethod
+    def _write_many(self, blobs: Dict[str, bytes]) -> int:
+        """Store the blobs not stored yet and return how many were new."""
+
+    def _remember(self, ref: str, data: bytes) -> None:
+        with self._cache_lock:
+            self._cache[ref] = data
+            self._cache.move_to_end(ref)
+            while len(self._cache) > self._cache_entries:
+                self._cache.popitem(last=False)
+
+    def put_many(self, payloads: Sequence[bytes]) -> List[str]:
+        """Store payloads and return their references."""
+        refs = [blob_ref(data) for data in payloads]
+        with self._cache_lock:
+            missing = {
+                ref: data for ref, data in zip(refs, payloads) if ref not in self._cache
+            }
+        if missing:
+            new = self._write_many(missing)
+            metrics_registry.inc(
+                "agentflow_blob_writes_total",
+                "Research payloads offloaded to the blob store, by whether they were new.",
+                new,
+                result="new",
+            )
+            metrics_registry.inc(
+                "agentflow_blob_writes_total",
+                "Research payloads offloaded to the blob store, by whether they were new.",
+                len(missing) - new,
+                result="existing",
+            )
+            metrics_registry.inc(
+                "agentflow_blob_bytes_written_total",
+                "Bytes of research payloads offloaded to the blob store.",
+                sum(len(data) for data in missing.values()),
+            )
+        for ref, data in zip(refs, payloads):
+            self._remember(ref, data)
+        return refs
+
+    def get_many(self, refs: Sequence[str]) -> List[bytes]:
+        """Return the payloads of references, raising KeyError for unknown ones."""
+        found: Dict[str, bytes] = {}
+        with self._cache_lock:
+            for ref in refs:
+                if ref in self._cache:
+                    found[ref] = self._cache[ref]
+                    self._cache.move_to_end(ref)
+        missing = [ref for ref in dict.fromkeys(refs) if ref not in found]
+        if missing:
+            loaded = self._read_many(missing)
+            for ref in missing:
+                if ref not in loaded:
+                    raise KeyError(f"Blob not found: {ref}")
+                self._remember(ref, loaded[ref])
+            found.update(loaded)
+        return [found[ref] for ref in refs]
+
+
+class FilesystemBlobStore(BlobStore):
+    """Blob store keeping each payload in a file named after its hash under `root`."""
+
+    def __init__(self, root: str, cache_entries: int = 4096):
+        """Create a store under `root`, creating the directory if needed."""
+        super().__init__(cache_entries)
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, ref: str) -> pathlib.Path:
+        digest = ref[len(BLOB_REF_PREFIX) :]
+        return self.root / digest[:2] / digest[2:]
+
+    def _read_many(self, refs: List[str]) -> Dict[str, bytes]:
+        blobs = {}
+        for ref in refs:
+            try:
+                blobs[ref] = self._path(ref).read_bytes()
+            except FileNotFoundError:
+                continue
+        return blobs
+
+    def _write_many(self, blobs: Dict[str, bytes]) -> int:
+        new = 0
+        for ref, data in blobs.items():
+            path = self._path(ref)
+            if path.exists():
+                continue
+            path.parent.mkdir(exist_ok=True)
+            # Write to a temporary file first so readers never see a partial blob.
+            fd, tmp = tempfile.mkstemp(dir=path.parent)
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp, path)
+            new += 1
+        return new
+
+
+class SQLiteBlobStore(BlobStore):
+    """Blob store keeping payloads in a table of the SQLite file at `path`."""
+
+    def __init__(self, path: str, cache_entries: int = 4096):
+        """Open the SQLite file at `path`, creating it and its table if needed."""
+        super().__init__(cache_entries)
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs (ref TEXT PRIMARY KEY, data BLOB NOT NULL)"
+            )
+
+    def _read_many(self, refs: List[str]) -> Dict[str, bytes]:
+        placeholders = ",".join("?" * len(refs))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT ref, data FROM blobs WHERE ref IN ({placeholders})", refs
+            ).fetchall()
+        return {ref: bytes(data) for ref, data in rows}
+
+    def _write_many(self, blobs: Dict[str, bytes]) -> int:
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO blobs VALUES (?, ?)", list(blobs.items())
+            )
+            return self._conn.total_changes - before
+
+
+class PostgresBlobStore(BlobStore):
+    """Blob store keeping payloads in a table of the Postgres database at `dsn`.
+
+    Requires the optional `psycopg` package.
+    """
+
+    def __init__(self, dsn: str, cache_entries: int = 4096):
+        """Connect to the Postgres database at `dsn`, creating the table if needed."""
+        super().__init__(cache_entries)
+        try:
+            import psycopg
+        except ImportError as exc:
+            raise ImportError(
+                "The postgres blob store requires psycopg: pip install 'psycopg[binary]'"
+            ) from exc
+        self._lock = threading.Lock()
+        self._conn = psycopg.connect(dsn, autocommit=True)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS agentflow_blobs "
+                "(ref TEXT PRIMARY KEY, data BYTEA NOT NULL)"
+            )
+
+    def _read_many(self, refs: List[str]) -> Dict[str, bytes]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ref, data FROM agentflow_blobs WHERE ref = ANY(%s)", (refs,)
+            ).fetchall()
+        return {ref: bytes(data) for ref, data in rows}
+
+    def _write_many(self, blobs: Dict[str, bytes]) -> int:
+        new = 0
+        with self._lock, self._conn.cursor() as cursor:
+            for ref, data in blobs.items():
+                cursor.execute(
+                    "INSERT INTO agentflow_blobs VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                    (ref, data),
+                )
+                new += cursor.rowcount
+        return new
+
+
+_stores: Dict[tuple, BlobStore] = {}
+_stores_lock = threading.Lock()
+
+_DEFAULT_LOCATIONS = {
+    "filesystem": ".cache/blobs",
+    "sqlite": ".cache/blobs.sqlite3",
+}
+
+
+def get_blob_store(backend: str, location: str = "") -> BlobStore | None:
+    """Return the process-wide blob store of a backend, or None to keep payloads inline.
+
+    Args:
+        backend: "" for no blob store, "filesystem", "sqlite" or "postgres".
+        location: The directory, SQLite file or Postgres DSN of the store. The
+            postgres backend defaults to the `POSTGRES_URI` of langgraph-api.
+    """
+    if not backend:
+        return None
+    if not location:
+        if backend == "postgres":
+            location = os.environ.get("POSTGRES_URI", "")
+        else:
+            location = _DEFAULT_LOCATIONS.get(backend, "")
+    key = (backend, location)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if backend == "filesystem":
+                store = FilesystemBlobStore(location)
+            elif backend == "sqlite":
+                store = SQLiteBlobStore(location)
+            elif backend == "postgres":
+                store = PostgresBlobStore(location)
+            else:
+                raise ValueError(f"Unknown blob store backend: {backend}")
+            _stores[key] = store
+        return store
+
+
+def offload_texts(store: BlobStore | None, texts: Sequence[str]) -> List[str]:
+    """Replace texts by references to them in `store`; no-op without a store."""
+    if store is None or not texts:
+        return list(texts)
+    return store.put_many([text.encode("utf-8") for text in texts])
+
+
+def load_texts(store: BlobStore | None, values: Iterable[str]) -> List[str]:
+    """Resolve the references among `values` to their texts, keeping inline texts."""
+    values = list(values)
+    refs = [value for value in values if is_blob_ref(value)]
+    if not refs:
+        return values
+    if store is None:
+        raise ValueError("State holds blob references but no blob store is configured")
+    texts = dict(zip(refs, (data.decode("utf-8") for data in store.get_many(refs))))
+    return [
+        texts.get(value, value) if is_blob_ref(value) else value for value in values
+    ]
+
+
+def offload_sources(
+    store: BlobStore | None, sources: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Replace the sources of a search by a single summary referencing them in `store`.
+
+    The summary keeps the number of sources and their labels, which is all
+    the activity timeline of the client reads.
+    """
+    if store is None or not sources:
+        return list(sources)
+    (ref,) = store.put_many([json.dumps(sources, sort_keys=True).encode("utf-8")])
+    labels = list(
+        dict.fromkeys(source.get("label") for source in sources if source.get("label"))
+    )
+    return [{"blob": ref, "count": len(sources), "labels": labels}]
+
+
+def load_sources(
+    store: BlobStore | None, items: Iterable[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Expand source summaries written by `offload_sources`, keeping inline sources."""
+    items = list(items)
+    refs = [item["blob"] for item in items if "blob" in item]
+    if not refs:
+        return items
+    if store is None:
+        raise ValueError("State holds blob references but no blob store is configured")
+    loaded = dict(zip(refs, (json.loads(data) for data in store.get_many(refs))))
+    sources: List[Dict[str, Any]] = []
+    for item in items:
+        if "blob" in item:
+            sources.extend(loaded[item["blob"]])
+        else:
+            sources.append(item)
+    return sources
@@ -0,0 +1,83 @@
+"""Reflection cascade: cheap sufficiency checks that escalate to stronger models when unsure."""
+
+from typing import List, Sequence, Tuple
+
+from agent.metrics import metrics_registry
+from agent.novelty import cited_sources
+from agent.source_index import stems
+from agent.tools_and_schemas import Reflection, TriageReflection
+
+CASCADE_TIERS = ("heuristic", "model")
+
+
+def parse_cascade_tiers(spec: str) -> List[str]:
+    """Parse the comma-separated tiers of `reflection_cascade`."""
+    tiers = [tier.strip() for tier in spec.split(",") if tier.strip()]
+    for tier in tiers:
+        if tier not in CASCADE_TIERS:
+            raise ValueError(f"Unknown reflection cascade tier: {tier}")
+    return tiers
+
+
+def heuristic_reflection(
+    research_topic: str, results: Sequence[str], min_sources: int = 3
+) -> Tuple[Reflection, float]:
+    """Judge locally whether research results obviously suffice for the research topic.
+
+    Only research covering the whole topic from many sites is judged
+    sufficient. Unless the results mention every content word of the topic
+    and cite at least `min_sources` different sites, the research is
+    insufficient with no confidence. The heuristic cannot write follow-up
+    queries, so that verdict always escalates. Otherwise the confidence is
+    the share of results mentioning all the topic's words on their own times
+    the fraction of `2 * min_sources` sites cited, so a topic only touched by
+    a few results, or backed by barely enough sites, still escalates.
+    """
+    wanted = stems(research_topic)
+    found = [stems(result) for result in results]
+    covered = frozenset().union(*found) if found else frozenset()
+    sites = (
+        len(frozenset().union(*(cited_sources(result) for result in results)))
+        if results
+        else 0
+    )
+    if not wanted or not wanted <= covered or sites < min_sources:
+        reflection = Reflection(
+            is_sufficient=False, knowledge_gap="", follow_up_queries=[]
+        )
+        return reflection, 0.0
+    covering = sum(1 for words in found if wanted <= words)
+    confidence = covering / len(found) * min(1.0, sites / (2 * min_sources))
+    reflection = Reflection(is_sufficient=True, knowledge_gap="", follow_up_queries=[])
+    return reflection, confidence
+
+
+def triage_confidence(result: TriageReflection) -> float:
+    """Return the confidence of a cascade model's reflection, 0 for inconsistent outputs.
+
+    A reflection finding research insufficient without follow-up queries
+    cannot continue the research, so it is escalated whatever its model claims.
+    """
+    if not result.is_sufficient and not result.follow_up_queries:
+        return 0.0
+    return max(0.0, min(1.0, result.confidence))
+
+
+def record_cascade_decision(tier: str, accepted: bool) -> None:
+    """Count a reflection cascade tier's decision as kept or escalated."""
+    metrics_registry.inc(
+        "agentflow_reflection_cascade_decisions_total",
+        "Reflection decisions of the cascade tiers, by whether they were kept or escalated.",
+        tier=tier,
+        outcome="accepted" if accepted else "escalated",
+    )
+
+
+def record_cascade_seconds(seconds_saved: float) -> None:
+    """Count the reflection latency the cascade saved, or spent on escalated tiers."""
+    metrics_registry.inc(
+        "agentflow_reflection_cascade_seconds_total",
+        "Reflection latency saved by the cascade against the estimate of the reflection model, and spent on tiers that escalated.",
+        abs(seconds_saved),
+        kind="saved" if seconds_saved >= 0 else "spent",
+    )
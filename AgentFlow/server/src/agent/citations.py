@@ -0,0 +1,220 @@
+"""Citation extraction, marker insertion and short url expansion for grounded responses."""
+
+import re
+from typing import Any, Dict, List, Tuple
+
+
+def _chunk_segment(chunk: Any, resolved_urls_map: Dict[str, str]) -> dict | None:
+    # The label is the title up to its first dot ("apnews.com" -> "apnews").
+    # Chunks without a usable title or uri are skipped, as before.
+    try:
+        uri = chunk.web.uri
+        title = chunk.web.title
+    except AttributeError:
+        return None
+    if not title or "." not in title:
+        return None
+    return {
+        "label": title.split(".", 1)[0],
+        "short_url": resolved_urls_map.get(uri),
+        "value": uri,
+    }
+
+
+def get_citations(response, resolved_urls_map: Dict[str, str]) -> List[dict]:
+    """Extract citation information from a Gemini model's response.
+
+    The label and short url of every grounding chunk are computed once per
+    response and shared by all supports citing that chunk.
+
+    Args:
+        response: The response object from the Gemini model, expected to have
+                  a structure including `candidates[0].grounding_metadata`.
+        resolved_urls_map: Map of the original chunk uris to their short urls.
+
+    Returns:
+        list: A list of dictionaries, one per grounding support, with keys:
+              - "start_index" (int): The starting UTF-8 byte offset of the cited
+                                     segment in the response text. Defaults to 0.
+              - "end_index" (int): The UTF-8 byte offset right after the cited
+                                   segment (exclusive).
+              - "segments" (list[dict]): The label, short url and original url
+                                         of each supporting web chunk.
+              Returns an empty list if no valid candidates or grounding supports
+              are found.
+    """
+    if not response or not response.candidates:
+        return []
+    metadata = getattr(response.candidates[0], "grounding_metadata", None)
+    supports = getattr(metadata, "grounding_supports", None) if metadata else None
+    if not supports:
+        return []
+
+    chunk_segments = [
+        _chunk_segment(chunk, resolved_urls_map)
+        for chunk in metadata.grounding_chunks or []
+    ]
+    num_chunks = len(chunk_segments)
+
+    citations = []
+    for support in supports:
+        segment = getattr(support, "segment", None)
+        if segment is None or segment.end_index is None:
+            continue
+        segments = []
+        for ind in getattr(support, "grounding_chunk_indices", None) or ():
+            if 0 <= ind < num_chunks and chunk_segments[ind] is not None:
+                segments.append(dict(chunk_segments[ind]))
+        citations.append(
+            {
+                "start_index": segment.start_index or 0,
+                "end_index": segment.end_index,
+                "segments": segments,
+            }
+        )
+    return citations
+
+
+def insert_citation_markers(text: str, citations_list: List[dict]) -> str:
+    """Insert citation markers into a text string in a single pass.
+
+    Insertion points are sorted once and the output is assembled from the
+    slices between them, so the cost is linear in the text length plus the
+    number of markers. Indices are UTF-8 byte offsets into the original text,
+    as returned by the Gemini API; an offset falling inside a multi-byte
+    character is moved to the end of that character.
+
+    Args:
+        text (str): The original text string.
+        citations_list (list): Citations as returned by `get_citations`.
+
+    Returns:
+        str: The text with citation markers inserted.
+    """
+    if not citations_list:
+        return text
+    data = text.encode("utf-8")
+    size = len(data)
+    # Markers sharing an end offset appear in ascending start order.
+    insertions = sorted(
+        citations_list, key=lambda c: (c["end_index"], c["start_index"])
+    )
+
+    parts: List[bytes] = []
+    position = 0
+    for citation in insertions:
+        end = min(max(citation["end_index"], position), size)
+        while end < size and (data[end] & 0xC0) == 0x80:
+            end += 1
+        parts.append(data[position:end])
+        parts.append(
+            "".join(
+                f" [{segment['label']}]({segment['short_url']})"
+                for segment in citation["segments"]
+            ).encode("utf-8")
+        )
+        position = end
+    parts.append(data[position:])
+    return b"".join(parts).decode("utf-8")
+
+
+def compile_short_url_pattern(short_urls) -> "re.Pattern[str]":
+    """Compile one alternation matching any of the given short urls.
+
+    Longer urls come first so ".../id/1-10" is never matched as ".../id/1-1".
+    The regex engine factors the shared url prefix out of the alternation, so
+    matching stays linear in the text length.
+    """
+    return re.compile(
+        "|".join(re.escape(url) for url in sorted(short_urls, key=len, reverse=True))
+    )
+
+
+class ShortUrlExpander:
+    """Expand short urls back to their original urls, in one pass or incrementally.
+
+    `expand` rewrites a complete text. `feed` and `flush` rewrite a text that
+    arrives in chunks: output is released only up to the last position that
+    cannot be the start of a short url, so a short url split across chunks is
+    never emitted half-rewritten.
+
+    Args:
+        sources: Source dictionaries with "short_url" and "value" keys. Duplicates
+                 are allowed; the first source for each short url wins.
+    """
+
+    def __init__(self, sources: List[dict]):
+        """Create an expander of the short urls of `sources`."""
+        self._by_short_url: Dict[str, dict] = {}
+        for source in sources:
+            if source.get("short_url"):
+                self._by_short_url.setdefault(source["short_url"], source)
+        self._used: Dict[str, dict] = {}
+        self._buffer = ""
+        self._pattern = (
+            compile_short_url_pattern(self._by_short_url)
+            if self._by_short_url
+            else None
+        )
+        self._prefixes: set | None = None
+        self._max_length = max(map(len, self._by_short_url), default=0)
+
+    @property
+    def used_sources(self) -> List[dict]:
+        """The sources expanded so far, in order of first appearance."""
+        return list(self._used.values())
+
+    def _replace(self, match: "re.Match[str]") -> str:
+        source = self._by_short_url[match.group(0)]
+        self._used.setdefault(match.group(0), source)
+        return source["value"]
+
+    def expand(self, text: str) -> str:
+        """Return `text` with every short url replaced by its original url."""
+        if self._pattern is None or not text:
+            return text
+        return self._pattern.sub(self._replace, text)
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of streamed text and return the part that is safe to emit."""
+        if self._pattern is None:
+            return chunk
+        if self._prefixes is None:
+            self._prefixes = {
+                url[:i] for url in self._by_short_url for i in range(1, len(url) + 1)
+            }
+        buffer = self._buffer + chunk
+        # Hold back the longest tail that could still grow into a short url,
+        # including a complete one that may be the prefix of a longer one.
+        hold = len(buffer)
+        for start in range(max(0, len(buffer) - self._max_length), len(buffer)):
+            if buffer[start:] in self._prefixes:
+                hold = start
+                break
+        for match in self._pattern.finditer(buffer):
+            if match.end() > hold:
+                hold = min(hold, match.start())
+                break
+        self._buffer = buffer[hold:]
+        return self.expand(buffer[:hold])
+
+    def flush(self) -> str:
+        """Return the rest of the streamed text once the stream has ended."""
+        buffer, self._buffer = self._buffer, ""
+        return self.expand(buffer)
+
+
+def expand_short_urls(content: str, sources: List[dict]) -> Tuple[str, List[dict]]:
+    """Replace every short url in `content` with its original url in a single pass.
+
+    Args:
+        content: Text containing short urls, e.g. the final answer.
+        sources: Source dictionaries with "short_url" and "value" keys. Duplicates
+                 are allowed; the first source for each short url wins.
+
+    Returns:
+        The expanded text, and the sources whose short url appears in it,
+        deduplicated and in order of first appearance.
+    """
+    expander = ShortUrlExpander(sources)
+    return expander.expand(content), expander.used_sources
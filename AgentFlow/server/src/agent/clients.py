@@ -0,0 +1,138 @@
+"""Shared Gemini clients, reused across graph nodes and runs."""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple, Type
+
+from google.genai import Client
+from langchain_core.runnables import Runnable
+from langchain_google_genai import ChatGoogleGenerativeAI
+from pydantic import BaseModel
+
+
+class ClientRegistry:
+    """Process-wide registry of shared Gemini clients.
+
+    Chat models and their structured-output wrappers are built once per
+    (model, temperature, max_retries, schema) key and reused by every node of
+    every run. Reusing the same objects keeps their underlying HTTP
+    connection pools warm and avoids re-converting the output schema on each
+    call. The returned runnables are stateless and safe to share across
+    threads and event loops.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        chat_model_factory: Callable[..., Any] = ChatGoogleGenerativeAI,
+        genai_client_factory: Callable[..., Any] = Client,
+    ):
+        """Create an empty registry building clients with the given factories."""
+        self._api_key = api_key
+        self._chat_model_factory = chat_model_factory
+        self._genai_client_factory = genai_client_factory
+        self._lock = threading.Lock()
+        self._chat_models: Dict[Tuple[str, float, int], Any] = {}
+        self._structured_models: Dict[Tuple[Hashable, ...], Runnable] = {}
+        self._genai_client: Any = None
+
+    @property
+    def api_key(self) -> str:
+        """The API key passed to new clients; raises if none is configured."""
+        api_key = self._api_key or os.getenv("GOOGLE_API_KEY")
+        if api_key is None:
+            raise ValueError("GOOGLE_API_KEY is not set")
+        return api_key
+
+    @property
+    def genai_client(self) -> Any:
+        """Return the shared google-genai client used for grounded search."""
+        if self._genai_client is None:
+            with self._lock:
+                if self._genai_client is None:
+                    self._genai_client = self._genai_client_factory(
+                        api_key=self.api_key
+                    )
+        return self._genai_client
+
+    def chat_model(
+        self, model: str, temperature: float = 0, max_retries: int = 2
+    ) -> Any:
+        """Return the shared chat model for the given settings.
+
+        Args:
+            model: The Gemini model name.
+            temperature: Sampling temperature.
+            max_retries: Number of retries on transient API errors.
+
+        Returns:
+            A `ChatGoogleGenerativeAI` instance shared by all callers using the same settings.
+        """
+        key = (model, float(temperature), int(max_retries))
+        llm = self._chat_models.get(key)
+        if llm is None:
+            with self._lock:
+                llm = self._chat_models.get(key)
+                if llm is None:
+                    llm = self._chat_model_factory(
+                        model=model,
+                        temperature=temperature,
+                        max_retries=max_retries,
+                        api_key=self.api_key,
+                    )
+                    self._chat_models[key] = llm
+        return llm
+
+    def structured_model(
+        self,
+        model: str,
+        schema: Type[BaseModel],
+        temperature: float = 0,
+        max_retries: int = 2,
+    ) -> Runnable:
+        """Return the shared structured-output runnable for the given settings.
+
+        Args:
+            model: The Gemini model name.
+            schema: The pydantic model the output is parsed into.
+            temperature: Sampling temperature.
+            max_retries: Number of retries on transient API errors.
+
+        Returns:
+            The result of `with_structured_output(schema)` on the shared chat model.
+        """
+        key = (model, float(temperature), int(max_retries), schema)
+        runnable = self._structured_models.get(key)
+        if runnable is None:
+            llm = self.chat_model(model, temperature, max_retries)
+            with self._lock:
+                runnable = self._structured_models.get(key)
+                if runnable is None:
+                    runnable = llm.with_structured_output(schema)
+                    self._structured_models[key] = runnable
+        return runnable
+
+    def clear(self) -> None:
+        """Drop every cached client so the next lookup builds fresh ones."""
+        with self._lock:
+            self._chat_models.clear()
+            self._structured_models.clear()
+            self._genai_client = None
+
+
+_registry = ClientRegistry()
+
+
+def get_client_registry() -> ClientRegistry:
+    """Return the process-wide client registry."""
+    return _registry
+
+
+def set_client_registry(registry: ClientRegistry) -> ClientRegistry:
+    """Replace the process-wide client registry and return the previous one.
+
+    Mostly useful for swapping in fake clients when benchmarking or testing.
+    """
+    global _registry
+    previous, _registry = _registry, registry
+    return previous
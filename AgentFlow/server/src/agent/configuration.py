@@ -1,6 +1,6 @@
 import os
 from pydantic import BaseModel, Field
-from typing import Any, Optional
+from typing import Any
 
 from langchain_core.runnables import RunnableConfig
 
@@ -39,9 +39,329 @@ class Configuration(BaseModel):
         metadata={"description": "The maximum number of research loops to perform."},
     )
 
+    deadline_ms: int = Field(
+        default=0,
+        metadata={
+            "description": "The latency budget of a run in milliseconds. Runs that would overrun it search fewer queries, skip further research loops or answer with deadline_answer_model, based on running per-model latency estimates. Answers of runs with a deadline are not written to the answer cache. 0 disables the deadline."
+        },
+    )
+
+    deadline_answer_model: str = Field(
+        default="gemini-2.5-flash",
+        metadata={
+            "description": "The faster model answering runs whose deadline leaves too little time for answer_model. Empty to always use answer_model."
+        },
+    )
+
+    max_concurrent_research: int = Field(
+        default=4,
+        metadata={
+            "description": "The maximum number of web research branches of a single run executing at once. Values below 1 disable the limit."
+        },
+    )
+
+    scheduling_lane: str = Field(
+        default="interactive",
+        metadata={
+            "description": "The priority lane of the run's Gemini calls: 'interactive', or 'batch' for offline runs that yield to interactive ones."
+        },
+    )
+
+    model_requests_per_minute: str = Field(
+        default="",
+        metadata={
+            "description": "Comma-separated 'model=requests per minute' overrides of the built-in per-model rate limits shared by all runs. A limit of 0 disables rate limiting for that model."
+        },
+    )
+
+    max_concurrent_model_calls: int = Field(
+        default=32,
+        metadata={
+            "description": "The upper bound of the adaptive number of concurrent calls per Gemini model across all runs."
+        },
+    )
+
+    research_join_mode: str = Field(
+        default="all",
+        metadata={
+            "description": "How a research loop's searches are joined before reflection: 'all' waits for every search, 'quorum' proceeds once research_quorum of them finished or the join deadline passed."
+        },
+    )
+
+    research_quorum: float = Field(
+        default=0.75,
+        metadata={
+            "description": "The fraction of a research loop's searches that must finish before reflection in quorum join mode."
+        },
+    )
+
+    research_join_deadline_seconds: float = Field(
+        default=0,
+        metadata={
+            "description": "Seconds after which a research loop in quorum join mode proceeds with the searches finished so far. 0 waits for the quorum."
+        },
+    )
+
+    research_straggler_policy: str = Field(
+        default="park",
+        metadata={
+            "description": "What happens to searches still running when a quorum join proceeds: 'park' folds their results into the next research loop if they finish in time, 'cancel' cancels them."
+        },
+    )
+
+    hedge_budget_percent: float = Field(
+        default=0,
+        metadata={
+            "description": "Grounded searches that may be duplicated per hundred searches when they run past the hedging quantile latency of their model, measured including the wait for the scheduler. Hedges go through the scheduler like any call, so they count against model_requests_per_minute and the concurrency limit. 0 disables request hedging."
+        },
+    )
+
+    hedge_quantile: float = Field(
+        default=0.9,
+        metadata={
+            "description": "The latency quantile of a model after which a grounded search is hedged with a duplicate request."
+        },
+    )
+
+    search_cache_ttl_seconds: int = Field(
+        default=86400,
+        metadata={
+            "description": "How long grounded search results are reused for identical queries, in seconds. 0 disables the search cache."
+        },
+    )
+
+    search_cache_path: str = Field(
+        default=".cache/search_cache.sqlite3",
+        metadata={"description": "The SQLite file backing the search cache."},
+    )
+
+    search_cache_max_entries: int = Field(
+        default=10000,
+        metadata={
+            "description": "The maximum number of cached search results kept before the least recently used are evicted."
+        },
+    )
+
+    coordination_redis_url: str = Field(
+        default="",
+        metadata={
+            "description": "Redis URL through which server replicas share recent search results, run identical in-flight searches once, and apply the per-model rate limits cluster-wide. Empty disables cross-replica coordination."
+        },
+    )
+
+    coordination_cache_ttl_seconds: int = Field(
+        default=300,
+        metadata={
+            "description": "How long search results are shared between replicas through Redis, in seconds."
+        },
+    )
+
+    coordination_lock_seconds: float = Field(
+        default=30,
+        metadata={
+            "description": "How long a replica may hold the lock of a search before others stop waiting for its result, in seconds."
+        },
+    )
+
+    answer_cache_enabled: bool = Field(
+        default=True,
+        metadata={
+            "description": "Whether runs whose research topic closely matches a recently answered one return the cached answer and sources instead of researching again."
+        },
+    )
+
+    answer_cache_similarity_threshold: float = Field(
+        default=0.9,
+        metadata={
+            "description": "The cosine similarity of research topic embeddings at which a cached answer is reused."
+        },
+    )
+
+    answer_cache_ttl_days: int = Field(
+        default=1,
+        metadata={
+            "description": "For how many days after the run that wrote it, counted in run dates, a cached answer is served. 1 reuses answers on the same day only."
+        },
+    )
+
+    answer_cache_max_entries: int = Field(
+        default=1000,
+        metadata={
+            "description": "The maximum number of cached answers kept before the least recently used are evicted."
+        },
+    )
+
+    answer_cache_embedding_model: str = Field(
+        default="",
+        metadata={
+            "description": "Optional local sentence-transformers model embedding research topics for the answer cache. Hashed word and character n-grams are used otherwise."
+        },
+    )
+
+    source_index_scope: str = Field(
+        default="thread",
+        metadata={
+            "description": "Which earlier research results are indexed and reused for new search queries: 'thread' for the results of the same thread, 'global' for those of every run of the server as well. Empty disables the source index."
+        },
+    )
+
+    source_index_coverage: float = Field(
+        default=0.8,
+        metadata={
+            "description": "The fraction of a search query's content words that indexed results must cover for the query to be answered from the index instead of searched."
+        },
+    )
+
+    source_index_ttl_days: int = Field(
+        default=1,
+        metadata={
+            "description": "For how many days after the run that researched them, counted in run dates, indexed results are reused."
+        },
+    )
+
+    source_index_max_chunks: int = Field(
+        default=5000,
+        metadata={
+            "description": "The maximum number of result chunks kept per source index before the oldest are dropped."
+        },
+    )
+
+    source_index_embedding_model: str = Field(
+        default="",
+        metadata={
+            "description": "Optional local sentence-transformers model embedding indexed result chunks and search queries. Hashed word and character n-grams are used otherwise."
+        },
+    )
+
+    blob_store_backend: str = Field(
+        default="",
+        metadata={
+            "description": "Where research results, digests and sources are offloaded so the graph state holds only content hashes: 'filesystem', 'sqlite' or 'postgres'. Empty keeps them inline in the state."
+        },
+    )
+
+    blob_store_location: str = Field(
+        default="",
+        metadata={
+            "description": "The directory, SQLite file or Postgres DSN of the blob store. Defaults to .cache/blobs, .cache/blobs.sqlite3 or POSTGRES_URI."
+        },
+    )
+
+    query_dedupe_threshold: float = Field(
+        default=0.7,
+        metadata={
+            "description": "The MinHash similarity at which a new search query counts as a paraphrase of an earlier one and is dropped. 0 disables query dedupe."
+        },
+    )
+
+    question_batch_id: str = Field(
+        default="",
+        metadata={
+            "description": "Set by the batch runner: runs of the same question batch share paraphrased search queries, and their responses when the search cache is disabled."
+        },
+    )
+
+    query_dedupe_embedding_model: str = Field(
+        default="",
+        metadata={
+            "description": "Optional local sentence-transformers model used in addition to MinHash to detect paraphrased search queries."
+        },
+    )
+
+    query_dedupe_embedding_threshold: float = Field(
+        default=0.9,
+        metadata={
+            "description": "The embedding cosine similarity at which a new search query counts as a paraphrase."
+        },
+    )
+
+    topic_window_messages: int = Field(
+        default=40,
+        metadata={
+            "description": "The number of most recent conversation messages included verbatim in the research topic. 0 includes the whole conversation."
+        },
+    )
+
+    topic_compaction: str = Field(
+        default="summary",
+        metadata={
+            "description": "How conversation messages older than the topic window are kept: 'summary' lists the user's earlier questions, 'drop' leaves them out."
+        },
+    )
+
+    topic_summary_max_chars: int = Field(
+        default=2000,
+        metadata={
+            "description": "The maximum length of the list of earlier questions kept for messages older than the topic window."
+        },
+    )
+
+    reflection_token_budget: int = Field(
+        default=32000,
+        metadata={
+            "description": "The maximum number of research digest tokens put in a reflection prompt. 0 disables the budget."
+        },
+    )
+
+    answer_token_budget: int = Field(
+        default=64000,
+        metadata={
+            "description": "The maximum number of research digest tokens put in the final answer prompt. 0 disables the budget."
+        },
+    )
+
+    novelty_threshold: float = Field(
+        default=0.1,
+        metadata={
+            "description": "The marginal novelty of a research loop's results, in new text and new sources, below which research stops without another reflection call. 0 disables novelty-based stopping."
+        },
+    )
+
+    reflection_cascade: str = Field(
+        default="",
+        metadata={
+            "description": "Comma-separated cheaper tiers that try to decide reflection before reflection_model, in order: 'heuristic' judges sufficiency locally from the research results, 'model' asks reflection_cascade_model. A tier's decision is kept when its confidence reaches reflection_cascade_confidence, else the next tier decides. Empty disables the cascade."
+        },
+    )
+
+    reflection_cascade_model: str = Field(
+        default="gemini-2.0-flash",
+        metadata={
+            "description": "The fast model of the 'model' tier of the reflection cascade."
+        },
+    )
+
+    reflection_cascade_confidence: float = Field(
+        default=0.8,
+        metadata={
+            "description": "The confidence from 0 to 1 a reflection cascade tier needs for its decision to be kept instead of escalating."
+        },
+    )
+
+    context_cache_ttl_seconds: int = Field(
+        default=0,
+        metadata={
+            "description": "How long the static prompt prefixes stay in an explicit context cache, in seconds. Prefixes too small for the model's cache are sent whole, see context_cache_min_tokens. 0 disables explicit context caching."
+        },
+    )
+
+    context_cache_backend: str = Field(
+        default="gemini",
+        metadata={
+            "description": "Where prompt prefixes are cached: 'gemini' for Gemini context caching, or 'local' for an in-process stand-in."
+        },
+    )
+
+    context_cache_min_tokens: int = Field(
+        default=1024,
+        metadata={
+            "description": "The smallest prompt prefix, in tokens, worth putting in the context cache. The 'gemini' backend also skips prefixes below Gemini's minimum for the model: 1024 tokens for gemini-2.5-flash, 4096 for gemini-2.0-flash and gemini-2.5-pro. The agent's own static prefixes have about 200 to 500 tokens, so with that backend only larger custom prompts are cached."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
-        cls, config: Optional[RunnableConfig] = None
+        cls, config: RunnableConfig | None = None
     ) -> "Configuration":
         """Create a Configuration instance from a RunnableConfig."""
         configurable = (
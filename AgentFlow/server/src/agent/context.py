@@ -0,0 +1,215 @@
+"""Per-run context: validated configuration and rendered prompts, computed once per run."""
+
+import functools
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+from agent.clients import ClientRegistry, get_client_registry
+from agent.configuration import Configuration
+from agent.context_cache import CachedPrompt, get_context_cache
+from agent.deadline import deadline_at
+from agent.prompts import get_current_date
+from agent.topic import build_research_topic
+from agent.utils import get_research_topic
+
+_FIELDS = tuple(Configuration.model_fields)
+_ENV_NAMES = tuple(name.upper() for name in _FIELDS)
+_SLOT = re.compile(r"\x00(\w+)\x00")
+
+
+@functools.lru_cache(maxsize=1)
+def _environment() -> Tuple[str | None, ...]:
+    return tuple(os.environ.get(name) for name in _ENV_NAMES)
+
+
+@functools.lru_cache(maxsize=128)
+def _configuration(
+    env_values: Tuple[str | None, ...], configurable_values: Tuple[Any, ...]
+) -> Configuration:
+    values = {
+        name: env if env is not None else value
+        for name, env, value in zip(_FIELDS, env_values, configurable_values)
+        if env is not None or value is not None
+    }
+    return Configuration(**values)
+
+
+def resolve_configuration(config: RunnableConfig | None = None) -> Configuration:
+    """Return the `Configuration` of a runnable config, validated once per distinct input.
+
+    Resolves values like `Configuration.from_runnable_config`, with
+    environment variables taking precedence over the configurable. The
+    environment is read on first use only and the validated model is reused
+    for identical configurables. The returned instance is shared and must not
+    be mutated.
+    """
+    configurable = (config.get("configurable") or {}) if config else {}
+    configurable_values = tuple(configurable.get(name) for name in _FIELDS)
+    try:
+        hash(configurable_values)
+    except TypeError:
+        return Configuration.from_runnable_config(config)
+    return _configuration(_environment(), configurable_values)
+
+
+def clear_configuration_cache() -> None:
+    """Re-read the environment and re-validate configurations on next use."""
+    _environment.cache_clear()
+    _configuration.cache_clear()
+
+
+@functools.lru_cache(maxsize=512)
+def _prompt_sections(
+    template: str,
+    static_values: Tuple[Tuple[str, str], ...],
+    dynamic_names: Tuple[str, ...],
+) -> Tuple[str, ...]:
+    slots = {name: f"\x00{name}\x00" for name in dynamic_names}
+    return tuple(_SLOT.split(template.format(**dict(static_values), **slots)))
+
+
+def render_prompt(
+    template: str, static_values: Mapping[str, str], dynamic_values: Mapping[str, Any]
+) -> str:
+    """Format a prompt template whose static values are rendered once and cached.
+
+    The template is formatted with `static_values` and split around the
+    placeholders of `dynamic_values` the first time a combination is seen.
+    Later calls only join the cached sections with the dynamic values, so
+    braces in dynamic values are never interpreted as placeholders.
+
+    Args:
+        template: A `str.format` template.
+        static_values: Values that stay the same for the whole run.
+        dynamic_values: Values that change from call to call.
+
+    Returns:
+        The formatted prompt.
+    """
+    sections = _prompt_sections(
+        template, tuple(sorted(static_values.items())), tuple(sorted(dynamic_values))
+    )
+    # Sections alternate between static text and dynamic value names.
+    return "".join(
+        section if i % 2 == 0 else str(dynamic_values[section])
+        for i, section in enumerate(sections)
+    )
+
+
+@dataclass(frozen=True)
+class RunContext:
+    """Everything about a run that nodes would otherwise recompute on every call.
+
+    The run date and research topic are computed by the first node of a run
+    and carried in `OverallState` as `run_date` and `research_topic`, so every
+    later node, branch and research loop of the run sees the same values.
+    """
+
+    configuration: Configuration
+    run_date: str
+    research_topic: str
+    clients: ClientRegistry
+
+    def render(self, template: str, **dynamic_values: Any) -> str:
+        """Format a prompt template with the run date, research topic and `dynamic_values`."""
+        static_values: Dict[str, str] = {
+            "current_date": self.run_date,
+            "research_topic": self.research_topic,
+        }
+        for name in dynamic_values:
+            static_values.pop(name, None)
+        return render_prompt(template, static_values, dynamic_values)
+
+    async def prompt(
+        self,
+        model: str,
+        prefix: str,
+        suffix: str,
+        tools: List[Any] | None = None,
+        **dynamic_values: Any,
+    ) -> CachedPrompt:
+        """Render a prompt split into a static prefix and a dynamic suffix template.
+
+        When explicit context caching is enabled, the prefix is served from
+        the cache of `model` and only the suffix is returned as text.
+
+        Args:
+            model: The model the prompt is sent to.
+            prefix: The static part of the prompt, shared by every run.
+            suffix: The template of the run and call specific part of the prompt.
+            tools: Tools of the call, cached along with the prefix.
+            **dynamic_values: Values of the suffix placeholders besides the run date and topic.
+        """
+        prefix_text = render_prompt(prefix, {}, {})
+        suffix_text = self.render(suffix, **dynamic_values)
+        configurable = self.configuration
+        if configurable.context_cache_ttl_seconds <= 0:
+            return CachedPrompt(text=prefix_text + suffix_text)
+        manager = get_context_cache(
+            configurable.context_cache_backend,
+            configurable.context_cache_ttl_seconds,
+            configurable.context_cache_min_tokens,
+        )
+        return await manager.prompt(model, prefix_text, suffix_text, tools)
+
+
+def start_run_context(
+    state: Mapping[str, Any], config: RunnableConfig
+) -> Tuple[RunContext, Dict[str, Any]]:
+    """Build the context of a new run from its messages.
+
+    Used by the entry node of the graph. The research topic is built
+    incrementally from the history rendered by the thread's earlier runs.
+
+    Returns:
+        The run context, and the state update the entry node returns so later
+        nodes and runs can reuse its `run_date`, `research_topic`, `deadline_at`
+        and rendered history, and the `run_key` of runs invoked without a run
+        or thread id.
+    """
+    configuration = resolve_configuration(config)
+    research_topic, topic_update = build_research_topic(
+        state["messages"],
+        state,
+        window=configuration.topic_window_messages,
+        compaction=configuration.topic_compaction,
+        summary_max_chars=configuration.topic_summary_max_chars,
+    )
+    context = RunContext(
+        configuration=configuration,
+        run_date=get_current_date(),
+        research_topic=research_topic,
+        clients=get_client_registry(),
+    )
+    return context, {
+        "run_date": context.run_date,
+        "research_topic": context.research_topic,
+        "deadline_at": deadline_at(configuration.deadline_ms),
+        "run_key": uuid.uuid4().hex,
+        **topic_update,
+    }
+
+
+def get_run_context(state: Mapping[str, Any], config: RunnableConfig) -> RunContext:
+    """Return the context of the current run from the values its entry node stored in state.
+
+    Falls back to computing the date and topic when the state carries none,
+    e.g. for a branch sent without them.
+    """
+    run_date = state.get("run_date") or get_current_date()
+    research_topic = state.get("research_topic")
+    if research_topic is None:
+        research_topic = (
+            get_research_topic(state["messages"]) if state.get("messages") else ""
+        )
+    return RunContext(
+        configuration=resolve_configuration(config),
+        run_date=run_date,
+        research_topic=research_topic,
+        clients=get_client_registry(),
+    )
@@ -0,0 +1,327 @@
+"""Gemini context caching of the static prompt prefixes shared by many calls."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Protocol, Tuple
+
+from google.genai import types
+
+from agent.clients import get_client_registry
+from agent.memory import count_tokens
+from agent.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Smallest prefixes Gemini accepts for explicit context caching, by model name
+# prefix. Other models get the largest of them.
+GEMINI_MIN_CACHE_TOKENS = {
+    "gemini-2.0-flash": 4096,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+
+
+class ContextCacheBackend(Protocol):
+    """Storage of cached prompt prefixes, e.g. Gemini `cachedContents`."""
+
+    async def create(
+        self, model: str, prefix: str, ttl_seconds: int, tools: List[Any] | None
+    ) -> Tuple[str, int]:
+        """Cache `prefix` for `model` and return the cache name and its token count."""
+        ...
+
+    async def delete(self, name: str) -> None:
+        """Delete a cached prefix."""
+        ...
+
+    def min_tokens(self, model: str) -> int:
+        """Return the smallest prefix, in tokens, the backend can cache for `model`."""
+        ...
+
+
+class GeminiContextCacheBackend:
+    """Explicit context caching through the google-genai `caches` API.
+
+    Requests using a cache may not set tools themselves, so the tools of the
+    calls sharing a prefix are stored in the cache with it.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any] | None = None):
+        """Create a backend using the genai client returned by `client_factory`."""
+        self._client_factory = client_factory or (
+            lambda: get_client_registry().genai_client
+        )
+
+    async def create(
+        self, model: str, prefix: str, ttl_seconds: int, tools: List[Any] | None
+    ) -> Tuple[str, int]:
+        """Cache `prefix` for `model` and return the cache name and its token count."""
+        cache = await self._client_factory().aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+                tools=tools,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        usage = cache.usage_metadata
+        tokens = usage.total_token_count if usage and usage.total_token_count else None
+        return cache.name, tokens or count_tokens(prefix)
+
+    async def delete(self, name: str) -> None:
+        """Delete the cache named `name`."""
+        await self._client_factory().aio.caches.delete(name=name)
+
+    def min_tokens(self, model: str) -> int:
+        """Return Gemini's minimum cache size for `model`."""
+        for name, tokens in GEMINI_MIN_CACHE_TOKENS.items():
+            if model.startswith(name):
+                return tokens
+        return max(GEMINI_MIN_CACHE_TOKENS.values())
+
+
+class LocalContextCacheBackend:
+    """In-process stand-in for Gemini context caching, for offline runs and tests."""
+
+    def __init__(self):
+        """Create a backend without caches."""
+        self.entries: Dict[str, Tuple[str, str]] = {}
+        self.created = 0
+        self.deleted = 0
+
+    async def create(
+        self, model: str, prefix: str, ttl_seconds: int, tools: List[Any] | None
+    ) -> Tuple[str, int]:
+        """Cache `prefix` for `model` and return the cache name and its token count."""
+        self.created += 1
+        digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:12]
+        name = f"cachedContents/local-{self.created}-{digest}"
+        self.entries[name] = (model, prefix)
+        return name, count_tokens(prefix)
+
+    async def delete(self, name: str) -> None:
+        """Delete the cache named `name`, if it still exists."""
+        if self.entries.pop(name, None) is not None:
+            self.deleted += 1
+
+    def min_tokens(self, model: str) -> int:
+        """Return 0: the stand-in caches prefixes of any size."""
+        return 0
+
+    def lookup(self, name: str) -> str | None:
+        """Return the prefix cached under `name`, if it still exists."""
+        entry = self.entries.get(name)
+        return entry[1] if entry else None
+
+
+@dataclass
+class CachedPrefix:
+    """A prompt prefix cached for one model."""
+
+    name: str
+    model: str
+    tokens: int
+    expires_at: float
+
+
+@dataclass
+class CachedPrompt:
+    """A prompt ready to send, with the cache holding its prefix if there is one.
+
+    Attributes:
+        text: The contents to send: the dynamic suffix when `cached_content`
+            is set, otherwise the whole prompt.
+        cached_content: The name of the cache holding the static prefix.
+    """
+
+    text: str
+    cached_content: str | None = None
+
+    @property
+    def model_kwargs(self) -> Dict[str, str]:
+        """Keyword arguments that make a LangChain Gemini model use the cache."""
+        return {"cached_content": self.cached_content} if self.cached_content else {}
+
+
+class ContextCacheManager:
+    """Create, reuse and expire cached prompt prefixes per model.
+
+    Prefixes below `min_tokens`, or below the backend's minimum for the
+    model, are never cached. A cache is recreated `refresh_margin_seconds`
+    before it expires, so calls never reference a cache about to disappear.
+    The replaced cache is not deleted but left to expire on its TTL: calls
+    given its name just before the refresh may still be queued, and keep it
+    for at least the margin. Concurrent requests for the same uncached
+    prefix on one event loop share a single creation call, and a failed
+    creation is not retried for `retry_after_seconds`.
+    """
+
+    def __init__(
+        self,
+        backend: ContextCacheBackend,
+        ttl_seconds: int = 3600,
+        min_tokens: int = 1024,
+        refresh_margin_seconds: int = 60,
+        retry_after_seconds: int = 300,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Create a manager of the caches of `backend`."""
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self._clock = clock
+        self._entries: Dict[Tuple[str, str], CachedPrefix] = {}
+        self._failed_until: Dict[Tuple[str, str], float] = {}
+        self._too_small: set = set()
+        self._loops: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, Dict[Tuple[str, str], asyncio.Future]
+        ] = weakref.WeakKeyDictionary()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def _in_flight(self) -> Dict[Tuple[str, str], asyncio.Future]:
+        # Futures belong to the event loop that created them, e.g. one of
+        # several `asyncio.run` calls, so each loop shares its own creations.
+        loop = asyncio.get_running_loop()
+        in_flight = self._loops.get(loop)
+        if in_flight is None:
+            in_flight = self._loops[loop] = {}
+        return in_flight
+
+    def _record(self, model: str, result: str, saved_tokens: int = 0) -> None:
+        stats = self.stats.setdefault(
+            model, {"hit": 0, "miss": 0, "skipped": 0, "error": 0, "saved_tokens": 0}
+        )
+        stats[result] += 1
+        stats["saved_tokens"] += saved_tokens
+        metrics_registry.inc(
+            "agentflow_context_cache_requests_total",
+            "Prompt prefix context cache lookups by outcome.",
+            model=model,
+            result=result,
+        )
+        if saved_tokens:
+            metrics_registry.inc(
+                "agentflow_context_cache_saved_tokens_total",
+                "Prompt tokens served from a context cache instead of being resent.",
+                saved_tokens,
+                model=model,
+            )
+
+    async def get(
+        self, model: str, prefix: str, tools: List[Any] | None = None
+    ) -> CachedPrefix | None:
+        """Return a live cache of `prefix` for `model`, creating it if needed.
+
+        Returns:
+            The cached prefix, or None when the prefix is too small to cache
+            or the cache could not be created; the caller then sends the whole
+            prompt.
+        """
+        fingerprint = hashlib.sha256(
+            (prefix + json.dumps(tools, sort_keys=True, default=str)).encode("utf-8")
+        ).hexdigest()
+        key = (model, fingerprint)
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at - self.refresh_margin_seconds > now:
+            self._record(model, "hit", entry.tokens)
+            return entry
+        if key in self._too_small:
+            self._record(model, "skipped")
+            return None
+        if count_tokens(prefix) < max(self.min_tokens, self.backend.min_tokens(model)):
+            self._too_small.add(key)
+            self._record(model, "skipped")
+            return None
+        if self._failed_until.get(key, 0) > now:
+            self._record(model, "error")
+            return None
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            entry = await asyncio.shield(pending)
+            if entry is not None:
+                self._record(model, "hit", entry.tokens)
+            return entry
+
+        in_flight = self._in_flight
+        future = asyncio.get_running_loop().create_future()
+        in_flight[key] = future
+        try:
+            name, tokens = await self.backend.create(
+                model, prefix, self.ttl_seconds, tools
+            )
+        except asyncio.CancelledError:
+            # Callers waiting on this creation fall back to the whole prompt.
+            future.set_result(None)
+            raise
+        except Exception as exc:
+            logger.warning("Could not create context cache for %s: %s", model, exc)
+            self._failed_until[key] = now + self.retry_after_seconds
+            self._record(model, "error")
+            future.set_result(None)
+            return None
+        else:
+            new_entry = CachedPrefix(
+                name=name, model=model, tokens=tokens, expires_at=now + self.ttl_seconds
+            )
+            self._entries[key] = new_entry
+            self._record(model, "miss")
+            future.set_result(new_entry)
+        finally:
+            del in_flight[key]
+        return new_entry
+
+    async def prompt(
+        self,
+        model: str,
+        prefix: str,
+        suffix: str,
+        tools: List[Any] | None = None,
+    ) -> CachedPrompt:
+        """Return the prompt to send to `model`, using a cached prefix when possible."""
+        entry = await self.get(model, prefix, tools)
+        if entry is None:
+            return CachedPrompt(text=prefix + suffix)
+        return CachedPrompt(text=suffix, cached_content=entry.name)
+
+
+_managers: Dict[Tuple[str, int, int], ContextCacheManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_context_cache(
+    backend: str, ttl_seconds: int, min_tokens: int
+) -> ContextCacheManager:
+    """Return the process-wide context cache manager for the given settings.
+
+    Args:
+        backend: "gemini" for Gemini explicit context caching, or "local" for
+            the in-process stand-in.
+        ttl_seconds: Lifetime of each cached prefix.
+        min_tokens: Smallest prefix worth caching.
+    """
+    key = (backend, ttl_seconds, min_tokens)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            if backend == "gemini":
+                store: ContextCacheBackend = GeminiContextCacheBackend()
+            elif backend == "local":
+                store = LocalContextCacheBackend()
+            else:
+                raise ValueError(f"Unknown context cache backend: {backend}")
+            manager = ContextCacheManager(
+                store, ttl_seconds=ttl_seconds, min_tokens=min_tokens
+            )
+            _managers[key] = manager
+        return manager
@@ -0,0 +1,226 @@
+"""Coordination of replicas through Redis: shared search results, locks and rate limits."""
+
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from agent.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Refills the bucket by the elapsed time on the Redis server clock, so the
+# replicas' clocks do not matter, then takes a token if one is available.
+# Returns the seconds until a token is available as a string, since Lua
+# numbers are truncated to integers in replies.
+_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+# Deletes a lock only if it is still held by the caller's token.
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _redis_errors() -> tuple:
+    errors: tuple = (OSError, asyncio.TimeoutError)
+    try:
+        from redis.exceptions import RedisError
+    except ImportError:
+        return errors
+    return errors + (RedisError,)
+
+
+class RedisCoordinator:
+    """Shared result cache, single-flight locks and token buckets in one Redis server.
+
+    Replicas sharing a Redis server share short-lived search results, make a
+    single upstream call for a search in flight on several of them, and draw
+    from one token bucket per Gemini model. Coordination is an optimization:
+    while Redis cannot be reached, calls log a warning and proceed locally.
+
+    Args:
+        client: An asyncio Redis client, e.g. `redis.asyncio.Redis` or
+            `fakeredis.aioredis.FakeRedis`.
+        prefix: Prefix of every key written, so several deployments can share a server.
+    """
+
+    def __init__(self, client: Any, prefix: str = "agentflow"):
+        """Create a coordinator over `client`."""
+        self.client = client
+        self.prefix = prefix
+        self._token_bucket = client.register_script(_TOKEN_BUCKET)
+        self._release = client.register_script(_RELEASE)
+        self._errors = _redis_errors()
+
+    def _record(self, result: str) -> None:
+        metrics_registry.inc(
+            "agentflow_coordination_cache_requests_total",
+            "Lookups of the cross-replica search cache by outcome.",
+            result=result,
+        )
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[T]],
+        encode: Callable[[T], str],
+        decode: Callable[[bytes], T],
+        ttl_seconds: int,
+        lock_seconds: float = 30.0,
+    ) -> T:
+        """Return the shared result of `key`, calling `fetch` on one replica at a time.
+
+        The replica that misses the cache first takes the key's lock, calls
+        `fetch` and stores the result for `ttl_seconds`. Replicas missing the
+        cache meanwhile poll for the result. Once the lock is released without
+        a result, e.g. because the call failed, one of them takes it over. A
+        lock expires after `lock_seconds`, so a crashed replica cannot block
+        the key, and waiters give up waiting after as long.
+        """
+        cache_key = f"{self.prefix}:result:{key}"
+        lock_key = f"{self.prefix}:lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            cached, locked = await self._wait_for_result(
+                cache_key, lock_key, token, lock_seconds
+            )
+        except self._errors as exc:
+            logger.warning("Redis coordination unavailable, searching locally: %s", exc)
+            self._record("unavailable")
+            return await fetch()
+        if cached is not None:
+            return decode(cached)
+        if not locked:
+            logger.warning("Gave up waiting for the shared search of %s", key)
+            return await fetch()
+
+        try:
+            result = await fetch()
+            # The search succeeded: failing to share it must not lose it.
+            try:
+                await self.client.set(cache_key, encode(result), ex=ttl_seconds)
+            except self._errors as exc:
+                logger.warning("Could not share the search result of %s: %s", key, exc)
+            return result
+        finally:
+            try:
+                await self._release(keys=[lock_key], args=[token])
+            except self._errors as exc:
+                logger.warning("Could not release the search lock of %s: %s", key, exc)
+
+    async def _wait_for_result(
+        self, cache_key: str, lock_key: str, token: str, lock_seconds: float
+    ) -> tuple[bytes | None, bool]:
+        # Returns the shared result if there is one, else whether the lock was taken.
+        cached = await self.client.get(cache_key)
+        if cached is not None:
+            self._record("hit")
+            return cached, False
+        deadline = time.monotonic() + lock_seconds
+        delay = 0.02
+        while not await self.client.set(
+            lock_key, token, nx=True, px=int(lock_seconds * 1000)
+        ):
+            if time.monotonic() >= deadline:
+                self._record("timeout")
+                return None, False
+            await asyncio.sleep(delay)
+            delay = min(0.25, delay * 2)
+            cached = await self.client.get(cache_key)
+            if cached is not None:
+                self._record("joined")
+                return cached, False
+        # The previous holder of the lock may have stored the result just before releasing it.
+        cached = await self.client.get(cache_key)
+        if cached is not None:
+            await self._release(keys=[lock_key], args=[token])
+            self._record("joined")
+            return cached, False
+        self._record("miss")
+        return None, True
+
+    async def reserve(self, name: str, rate: float, capacity: float) -> float:
+        """Take a token from the shared bucket `name`, or return the seconds until one is available."""
+        wait = await self._token_bucket(
+            keys=[f"{self.prefix}:bucket:{name}"], args=[rate, capacity]
+        )
+        return float(wait)
+
+    async def admit(self, model: str, requests_per_minute: float) -> None:
+        """Wait until the cluster-wide rate limit of `model` admits one more call.
+
+        The bucket holds one second of requests, like the scheduler's local
+        buckets. A limit of 0 or less admits every call.
+        """
+        if requests_per_minute <= 0:
+            return
+        rate = requests_per_minute / 60
+        started = time.perf_counter()
+        try:
+            while (wait := await self.reserve(model, rate, max(1.0, rate))) > 0:
+                await asyncio.sleep(wait)
+        except self._errors as exc:
+            logger.warning("Redis rate limiter unavailable for %s: %s", model, exc)
+            return
+        metrics_registry.observe(
+            "agentflow_coordination_rate_wait_seconds",
+            "Time Gemini calls waited for the cluster-wide rate limit, by model.",
+            time.perf_counter() - started,
+            model=model,
+        )
+
+
+_coordinators: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, RedisCoordinator]]" = weakref.WeakKeyDictionary()
+
+
+def get_coordinator(redis_url: str) -> RedisCoordinator | None:
+    """Return the coordinator of the Redis server at `redis_url`, or None if coordination is off.
+
+    Redis asyncio clients belong to the event loop that created them, so
+    each running loop gets its own client.
+    """
+    if not redis_url:
+        return None
+    loop = asyncio.get_running_loop()
+    coordinators = _coordinators.setdefault(loop, {})
+    coordinator = coordinators.get(redis_url)
+    if coordinator is None:
+        try:
+            from redis.asyncio import Redis
+        except ImportError as exc:
+            raise ImportError(
+                "Cross-replica coordination requires redis: pip install 'agent[redis]'"
+            ) from exc
+        coordinator = RedisCoordinator(Redis.from_url(redis_url))
+        coordinators[redis_url] = coordinator
+    return coordinator
+
+
+def set_coordinator(redis_url: str, coordinator: RedisCoordinator) -> None:
+    """Use `coordinator` for `redis_url` in the running event loop, e.g. one backed by fakeredis."""
+    _coordinators.setdefault(asyncio.get_running_loop(), {})[redis_url] = coordinator
@@ -0,0 +1,175 @@
+"""Planning of research within a run's deadline from running latency estimates."""
+
+import contextlib
+import math
+import threading
+import time
+from typing import Any, Dict, Iterator, Mapping, Tuple
+
+from agent.configuration import Configuration
+from agent.metrics import metrics_registry
+
+# Latencies assumed for the calls of a model that has not been observed yet, in
+# seconds. They are optimistic: a pessimistic prior would rule out the calls
+# whose latencies are needed to replace it.
+_PRIOR_SECONDS = {"query": 1.0, "search": 2.0, "reflection": 2.0, "answer": 4.0}
+
+
+class LatencyEstimate:
+    """Running estimate of a call's latency from its exponentially weighted mean and deviation.
+
+    Like the round-trip time estimator of TCP, the estimate is the mean plus
+    a multiple of the mean deviation, so it follows load changes within a
+    few dozen calls and errs towards the slow ones.
+    """
+
+    def __init__(self, alpha: float = 0.125, beta: float = 0.25):
+        """Create an estimate with the smoothing factors of the mean and the deviation."""
+        self.alpha = alpha
+        self.beta = beta
+        self.count = 0
+        self.mean = 0.0
+        self.deviation = 0.0
+
+    def add(self, seconds: float) -> None:
+        """Add the latency of a call."""
+        self.count += 1
+        if self.count == 1:
+            self.mean, self.deviation = seconds, seconds / 2
+            return
+        self.deviation += self.beta * (abs(seconds - self.mean) - self.deviation)
+        self.mean += self.alpha * (seconds - self.mean)
+
+    def value(self, deviations: float) -> float:
+        """Return the mean plus `deviations` mean deviations."""
+        return self.mean + deviations * self.deviation
+
+
+class LatencyEstimates:
+    """Running latency estimates of Gemini calls, per model and kind of call.
+
+    The kinds are "query", "search", "reflection" and "answer". Until a model
+    has made `min_samples` calls of a kind, an optimistic prior is used.
+
+    Args:
+        min_samples: Calls observed before the estimate replaces the prior.
+        deviations: Mean deviations added to the mean latency.
+    """
+
+    def __init__(self, min_samples: int = 3, deviations: float = 2.0):
+        """Create estimates without any observed call."""
+        self.min_samples = min_samples
+        self.deviations = deviations
+        self._lock = threading.Lock()
+        self._estimates: Dict[Tuple[str, str], LatencyEstimate] = {}
+
+    def observe(self, model: str, call: str, seconds: float) -> None:
+        """Add the latency of a call of `model`."""
+        with self._lock:
+            estimate = self._estimates.setdefault((model, call), LatencyEstimate())
+            estimate.add(seconds)
+            value = estimate.value(self.deviations)
+        metrics_registry.set(
+            "agentflow_latency_estimate_seconds",
+            "Running latency estimates deadlines are planned with, by model and call.",
+            value,
+            model=model,
+            call=call,
+        )
+
+    def estimate(self, model: str, call: str) -> float:
+        """Return the seconds a call of `model` is expected to take at most."""
+        with self._lock:
+            estimate = self._estimates.get((model, call))
+            if estimate is not None and estimate.count >= self.min_samples:
+                return estimate.value(self.deviations)
+        return _PRIOR_SECONDS[call]
+
+    def mean(self, model: str, call: str) -> float:
+        """Return the mean latency of the calls of `model`, the prior before any were observed."""
+        with self._lock:
+            estimate = self._estimates.get((model, call))
+            if estimate is not None and estimate.count:
+                return estimate.mean
+        return _PRIOR_SECONDS[call]
+
+    @contextlib.contextmanager
+    def measure(self, model: str, call: str) -> Iterator[None]:
+        """Observe the duration of the block, including its wait for a scheduler slot, if it succeeds."""
+        started = time.perf_counter()
+        yield
+        self.observe(model, call, time.perf_counter() - started)
+
+    def reset(self) -> None:
+        """Forget every observed call."""
+        with self._lock:
+            self._estimates.clear()
+
+
+latency_estimates = LatencyEstimates()
+
+
+def deadline_at(deadline_ms: int) -> float | None:
+    """Return the wall-clock time a run starting now must finish by, or None without a deadline."""
+    if deadline_ms <= 0:
+        return None
+    return time.time() + deadline_ms / 1000
+
+
+def remaining_seconds(state: Mapping[str, Any]) -> float | None:
+    """Return the seconds left until the run's deadline, or None without a deadline."""
+    deadline = state.get("deadline_at")
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def record_deadline_action(action: str) -> None:
+    """Count a step a run took to meet its deadline."""
+    metrics_registry.inc(
+        "agentflow_deadline_actions_total",
+        "Research cut short to meet run deadlines, by action.",
+        action=action,
+    )
+
+
+def search_seconds(configurable: Configuration, queries: int) -> float:
+    """Return the expected duration of searching `queries` queries in waves of concurrent branches."""
+    concurrency = configurable.max_concurrent_research
+    waves = math.ceil(queries / concurrency) if concurrency >= 1 else min(queries, 1)
+    return waves * latency_estimates.estimate(
+        configurable.query_generator_model, "search"
+    )
+
+
+def affordable_queries(
+    configurable: Configuration, budget_seconds: float, requested: int
+) -> int:
+    """Return how many of `requested` queries can be searched within `budget_seconds`.
+
+    Queries are dropped a wave of `max_concurrent_research` branches at a
+    time, since fewer queries than that do not make a wave any shorter.
+    Returns 0 when not even one wave fits.
+    """
+    wave = latency_estimates.estimate(configurable.query_generator_model, "search")
+    waves = int(budget_seconds // wave) if wave > 0 else requested
+    per_wave = configurable.max_concurrent_research
+    if per_wave < 1:
+        return requested if waves >= 1 else 0
+    return max(0, min(requested, waves * per_wave))
+
+
+def choose_answer_model(
+    configurable: Configuration, answer_model: str, remaining: float | None
+) -> str:
+    """Return the answer model to use, the deadline answer model if only it fits the time left."""
+    fast_model = configurable.deadline_answer_model
+    if remaining is None or not fast_model or fast_model == answer_model:
+        return answer_model
+    expected = latency_estimates.estimate(answer_model, "answer")
+    if (
+        expected <= remaining
+        or latency_estimates.estimate(fast_model, "answer") >= expected
+    ):
+        return answer_model
+    return fast_model
@@ -0,0 +1,150 @@
+"""Detection of redundant search queries by MinHash similarity or embeddings."""
+
+import functools
+import logging
+import random
+import re
+import zlib
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or the to what when "
+    "where which who why with vs versus about latest current".split()
+)
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+_MERSENNE_PRIME = (1 << 61) - 1
+_NUM_PERM = 64
+_rng = random.Random(1337)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(_NUM_PERM)
+]
+
+
+def content_words(text: str) -> List[str]:
+    """Return the lowercased words of a text, leaving out stopwords."""
+    words = re.findall(r"\w+", text.lower())
+    return [word for word in words if word not in _STOPWORDS]
+
+
+def shingles(text: str, k: int = 4) -> frozenset:
+    """Return the shingle set of a query.
+
+    Shingles are the query's content words plus the character k-grams of each
+    word, so the set ignores word order and tolerates inflections
+    ("rates"/"rate", "forecasts"/"forecast").
+    """
+    result = set()
+    for token in content_words(text):
+        result.add(token)
+        padded = f"^{token}$"
+        result.update(padded[i : i + k] for i in range(max(1, len(padded) - k + 1)))
+    return frozenset(result)
+
+
+@functools.lru_cache(maxsize=4096)
+def topic_numbers(topic: str) -> frozenset:
+    """Return the numbers in a topic.
+
+    Topics differing only in a year, version or amount embed close together
+    but ask different questions, so only topics with the same numbers can match.
+    """
+    return frozenset(_NUMBER.findall(topic))
+
+
+@functools.lru_cache(maxsize=4096)
+def minhash_signature(text: str) -> Tuple[int, ...]:
+    """Return the MinHash signature of a query's shingle set."""
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)]
+    if not hashes:
+        return tuple([_MERSENNE_PRIME] * _NUM_PERM)
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS
+    )
+
+
+def estimate_similarity(left: str, right: str) -> float:
+    """Estimate the Jaccard similarity of two queries' shingle sets."""
+    sig_left, sig_right = minhash_signature(left), minhash_signature(right)
+    return sum(a == b for a, b in zip(sig_left, sig_right)) / _NUM_PERM
+
+
+@functools.lru_cache(maxsize=4)
+def load_embedding_model(name: str) -> Callable[[List[str]], Any] | None:
+    """Load a local sentence-transformers model, or return None if unavailable."""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning(
+            "sentence-transformers is not installed; query dedupe falls back to MinHash only"
+        )
+        return None
+    model = SentenceTransformer(name)
+    return functools.partial(model.encode, normalize_embeddings=True)
+
+
+def dedupe_queries(
+    candidates: Sequence[str],
+    existing: Sequence[str] = (),
+    threshold: float = 0.7,
+    embed: Callable[[List[str]], Any] | None = None,
+    embedding_threshold: float = 0.9,
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Drop candidate queries that paraphrase an existing or earlier candidate query.
+
+    A candidate is redundant when its estimated shingle similarity to a kept
+    query reaches `threshold`, or, when an `embed` function is given, when the
+    cosine similarity of their embeddings reaches `embedding_threshold`.
+    Queries with different numbers, e.g. years or versions, are never
+    redundant, however similar their words.
+
+    Args:
+        candidates: The queries about to be researched, in priority order.
+        existing: Queries that were already researched.
+        threshold: Minimum MinHash similarity for a candidate to be dropped. 0 disables dedupe.
+        embed: Optional function mapping a list of texts to normalized embedding vectors.
+        embedding_threshold: Minimum cosine similarity for a candidate to be dropped.
+
+    Returns:
+        The kept queries, and one record per dropped query with the query, the
+        query it duplicates and their similarity.
+    """
+    if threshold <= 0:
+        return list(candidates), []
+
+    kept: List[str] = []
+    dropped: List[Dict[str, Any]] = []
+    reference = list(dict.fromkeys(existing))
+    vectors: Dict[str, Any] = {}
+    if embed is not None and candidates:
+        texts = list(dict.fromkeys([*reference, *candidates]))
+        vectors = dict(zip(texts, embed(texts)))
+
+    for query in candidates:
+        best, best_score = None, 0.0
+        for other in (*reference, *kept):
+            if topic_numbers(query) != topic_numbers(other):
+                continue
+            score = estimate_similarity(query, other)
+            duplicate = score >= threshold
+            if vectors:
+                cosine = float(
+                    sum(a * b for a, b in zip(vectors[query], vectors[other]))
+                )
+                if cosine >= embedding_threshold:
+                    duplicate, score = True, max(score, cosine)
+            if duplicate and score > best_score:
+                best, best_score = other, score
+        if best is None:
+            kept.append(query)
+        else:
+            dropped.append(
+                {
+                    "query": query,
+                    "duplicate_of": best,
+                    "similarity": round(best_score, 3),
+                }
+            )
+    return kept, dropped
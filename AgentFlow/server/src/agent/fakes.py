@@ -0,0 +1,343 @@
+"""Offline fakes of the Gemini clients with configurable latency, for benchmarks and tests."""
+
+import asyncio
+import hashlib
+import math
+import random
+import re
+import time
+from contextlib import contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Type,
+    Union,
+)
+
+from google.genai import errors, types
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel
+
+from agent.clients import ClientRegistry
+from agent.tools_and_schemas import Reflection, SearchQueryList, TriageReflection
+
+_CITATION = re.compile(
+    r"\[([^\]]+)\]\((https://vertexaisearch\.cloud\.google\.com/id/[^)\s]+)\)"
+)
+
+# A latency is either a fixed number of seconds or a callable sampling one.
+Latency = Union[float, Callable[[], float]]
+
+
+def _sample(latency: Latency) -> float:
+    return max(0.0, latency() if callable(latency) else latency)
+
+
+def parse_latency(spec: str, seed: int | None = None) -> Latency:
+    """Parse a latency distribution, in seconds, from a short spec.
+
+    Supported specs are "0.5" (constant), "uniform:LOW,HIGH",
+    "lognormal:MEDIAN,SIGMA" and "exp:MEAN". Long-tailed distributions like
+    lognormal are the closest to real grounded search latencies.
+    """
+    kind, _, args = spec.partition(":")
+    if not args:
+        return float(kind)
+    params = [float(value) for value in args.split(",")]
+    rng = random.Random(seed)
+    if kind == "uniform":
+        low, high = params
+        return lambda: rng.uniform(low, high)
+    if kind == "lognormal":
+        median, sigma = params
+        return lambda: rng.lognormvariate(math.log(median), sigma)
+    if kind == "exp":
+        (mean,) = params
+        return lambda: rng.expovariate(1 / mean)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+
+def make_grounded_response(
+    prompt: str, num_sources: int = 3
+) -> types.GenerateContentResponse:
+    """Build a deterministic search-grounded response for a prompt.
+
+    Every sentence of the text is backed by one grounding chunk, with segment
+    offsets in UTF-8 bytes as returned by the Gemini API.
+    """
+    tag = _digest(prompt)
+    sentences = [
+        f"Finding {i} about topic {tag} is reported by source {i}."
+        for i in range(num_sources)
+    ]
+    text = " ".join(sentences)
+    chunks, supports, offset = [], [], 0
+    for i, sentence in enumerate(sentences):
+        chunks.append(
+            types.GroundingChunk(
+                web=types.GroundingChunkWeb(
+                    uri=f"https://example.com/{tag}/{i}", title=f"source{i}.com"
+                )
+            )
+        )
+        end = offset + len(sentence.encode("utf-8"))
+        supports.append(
+            types.GroundingSupport(
+                segment=types.Segment(start_index=offset, end_index=end, text=sentence),
+                grounding_chunk_indices=[i],
+            )
+        )
+        offset = end + 1
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(text=text)]),
+                grounding_metadata=types.GroundingMetadata(
+                    grounding_chunks=chunks, grounding_supports=supports
+                ),
+            )
+        ]
+    )
+
+
+class _FakeModels:
+    def __init__(self, client: "FakeGenAIClient"):
+        self._client = client
+
+    def generate_content(self, *, model: str, contents: Any, config: Any = None):
+        with self._client._track():
+            self._client._check_capacity()
+            time.sleep(_sample(self._client.latency))
+        return make_grounded_response(str(contents), self._client.num_sources)
+
+
+class _FakeAsyncModels:
+    def __init__(self, client: "FakeGenAIClient"):
+        self._client = client
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None):
+        with self._client._track():
+            self._client._check_capacity()
+            await asyncio.sleep(_sample(self._client.latency))
+        return make_grounded_response(str(contents), self._client.num_sources)
+
+
+class _FakeAio:
+    def __init__(self, client: "FakeGenAIClient"):
+        self.models = _FakeAsyncModels(client)
+
+
+class FakeGenAIClient:
+    """Offline stand-in for `google.genai.Client` with configurable latency.
+
+    Records the number of calls and the highest number of calls in flight at
+    the same time, which makes concurrency limits observable. With a
+    `capacity`, calls beyond that many in flight fail with a 429 error like
+    a throttled API would.
+    """
+
+    def __init__(
+        self,
+        latency: Latency = 0.0,
+        num_sources: int = 3,
+        capacity: int | None = None,
+        **_: Any,
+    ):
+        """Create a client whose searches cite `num_sources` sources."""
+        self.latency = latency
+        self.num_sources = num_sources
+        self.capacity = capacity
+        self.throttled = 0
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+
+    @contextmanager
+    def _track(self) -> Iterator[None]:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def _check_capacity(self) -> None:
+        if self.capacity is not None and self.in_flight > self.capacity:
+            self.throttled += 1
+            raise errors.ClientError(
+                429,
+                {
+                    "error": {
+                        "code": 429,
+                        "message": "Resource has been exhausted.",
+                        "status": "RESOURCE_EXHAUSTED",
+                    }
+                },
+            )
+
+
+_QUERY_ASPECTS = (
+    "market size",
+    "regulatory history",
+    "technical architecture",
+    "competitor landscape",
+    "recent announcements",
+    "expert forecasts",
+)
+_NUMBER_QUERIES = re.compile(r"more than (\d+) queries")
+
+
+def fake_structured_output(schema: Type[BaseModel], prompt: str) -> BaseModel:
+    """Return a deterministic instance of one of the agent's output schemas."""
+    tag = _digest(prompt)
+    if schema is SearchQueryList:
+        match = _NUMBER_QUERIES.search(prompt)
+        number_queries = int(match.group(1)) if match else 3
+        return SearchQueryList(
+            query=[f"{tag} {aspect}" for aspect in _QUERY_ASPECTS[:number_queries]],
+            rationale="Fake rationale.",
+        )
+    if schema is TriageReflection:
+        return TriageReflection(
+            is_sufficient=False,
+            knowledge_gap=f"Fake knowledge gap {tag}.",
+            follow_up_queries=[f"fake follow-up {tag}"],
+            confidence=0.5 + int(tag[:2], 16) / 510,
+        )
+    if schema is Reflection:
+        return Reflection(
+            is_sufficient=False,
+            knowledge_gap=f"Fake knowledge gap {tag}.",
+            follow_up_queries=[f"fake follow-up {tag}"],
+        )
+    raise ValueError(f"No fake output defined for schema {schema.__name__}")
+
+
+class FakeChatModel(BaseChatModel):
+    """Offline stand-in for `ChatGoogleGenerativeAI` with configurable latency."""
+
+    model: str = "fake"
+    temperature: float = 0
+    max_retries: int = 2
+    api_key: str | None = None
+    latency: Any = 0.0
+    chunk_size: int = 7
+    structured_outputs: Dict[Any, Callable[[str], BaseModel]] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def _text(self, messages: List[BaseMessage]) -> str:
+        # Cites the first short urls of the prompt, like a real answer would.
+        prompt = str(messages[-1].content) if messages else ""
+        citations = " ".join(
+            f"[{label}]({url})" for label, url in _CITATION.findall(prompt)[:3]
+        )
+        return f"Fake answer {_digest(prompt)} from {self.model}. {citations}".strip()
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], text: str) -> dict:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(text) // 4
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        text = self._text(messages)
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(_sample(self.latency))
+        return self._result(messages)
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        await asyncio.sleep(_sample(self.latency))
+        return self._result(messages)
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        # The latency is spent before the first token; the text then arrives in
+        # small chunks that split the urls.
+        await asyncio.sleep(_sample(self.latency))
+        text = self._text(messages)
+        for start in range(0, len(text), self.chunk_size):
+            await asyncio.sleep(0)
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content=text[start : start + self.chunk_size])
+            )
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="", usage_metadata=self._usage(messages, text)
+            )
+        )
+
+    def with_structured_output(self, schema, **kwargs) -> Runnable:
+        """Return a runnable building instances of `schema` from the prompt."""
+        build = self.structured_outputs.get(schema) or (
+            lambda prompt: fake_structured_output(schema, prompt)
+        )
+
+        # Keyword arguments such as `cached_content` are accepted and ignored.
+        def invoke(prompt: Any, **_: Any) -> BaseModel:
+            time.sleep(_sample(self.latency))
+            return build(str(prompt))
+
+        async def ainvoke(prompt: Any, **_: Any) -> BaseModel:
+            await asyncio.sleep(_sample(self.latency))
+            return build(str(prompt))
+
+        return RunnableLambda(invoke, afunc=ainvoke)
+
+
+def fake_client_registry(
+    search_latency: Latency = 0.0,
+    llm_latency: Latency = 0.0,
+    num_sources: int = 3,
+    search_capacity: int | None = None,
+    model_latency: Dict[str, Latency] | None = None,
+    **chat_kwargs: Any,
+) -> ClientRegistry:
+    """Return a `ClientRegistry` that hands out fake clients only.
+
+    Args:
+        search_latency: Latency of grounded searches.
+        llm_latency: Latency of chat model calls, before the first streamed token.
+        num_sources: Number of grounding chunks per search response.
+        search_capacity: Number of concurrent searches above which searches are throttled.
+        model_latency: Latency of the chat model calls of specific models, overriding `llm_latency`.
+        **chat_kwargs: Extra fields of every `FakeChatModel`, e.g. `structured_outputs`.
+    """
+    genai_client = FakeGenAIClient(
+        latency=search_latency, num_sources=num_sources, capacity=search_capacity
+    )
+    return ClientRegistry(
+        api_key="fake-key",
+        chat_model_factory=lambda **kwargs: FakeChatModel(
+            latency=(model_latency or {}).get(kwargs.get("model"), llm_latency),
+            **chat_kwargs,
+            **kwargs,
+        ),
+        genai_client_factory=lambda **_: genai_client,
+    )
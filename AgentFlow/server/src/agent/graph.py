@@ -1,47 +1,357 @@
-import os
+import asyncio
+import logging
+import time
 
-from agent.tools_and_schemas import SearchQueryList, Reflection
+from agent.tools_and_schemas import SearchQueryList, Reflection, TriageReflection
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage
 from langgraph.types import Send
 from langgraph.graph import StateGraph
 from langgraph.graph import START, END
 from langchain_core.runnables import RunnableConfig
-from google.genai import Client
 
 from agent.state import (
+    BatchResearchState,
     OverallState,
     QueryGenerationState,
     ReflectionState,
     WebSearchState,
 )
 from agent.configuration import Configuration
+from agent.context import get_run_context, resolve_configuration, start_run_context
 from agent.prompts import (
-    get_current_date,
-    query_writer_instructions,
-    web_searcher_instructions,
-    reflection_instructions,
-    answer_instructions,
+    query_writer_prefix,
+    query_writer_suffix,
+    web_searcher_prefix,
+    web_searcher_suffix,
+    reflection_prefix,
+    reflection_suffix,
+    reflection_triage_prefix,
+    answer_prefix,
+    answer_suffix,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
-from agent.utils import (
+from agent.answer_cache import (
+    AnswerCache,
+    get_answer_cache,
+    get_embedder,
+    parse_run_date,
+    record_answer_cache_lookup,
+)
+from agent.cascade import (
+    heuristic_reflection,
+    parse_cascade_tiers,
+    record_cascade_decision,
+    record_cascade_seconds,
+    triage_confidence,
+)
+from agent.batch import get_question_batch
+from agent.blobs import (
+    BlobStore,
+    get_blob_store,
+    load_sources,
+    load_texts,
+    offload_sources,
+    offload_texts,
+)
+from agent.deadline import (
+    affordable_queries,
+    choose_answer_model,
+    latency_estimates,
+    record_deadline_action,
+    remaining_seconds,
+    search_seconds,
+)
+from agent.dedupe import dedupe_queries, load_embedding_model
+from agent.hedging import hedger
+from agent.limits import get_run_key, research_limiter
+from agent.memory import compact_results, fit_to_budget
+from agent.metrics import (
+    annotate_span,
+    instrument_node,
+    metrics_registry,
+    record_queue_wait,
+    record_usage,
+)
+from agent.novelty import measure_novelty
+from agent.quorum import (
+    merge_updates,
+    parked_searches,
+    quorum_size,
+    quorum_wait,
+    task_results,
+)
+from agent.scheduler import call_scheduled, schedule
+from agent.search_cache import cache_key, dump_response, get_search_cache, load_response
+from agent.coordination import get_coordinator
+from agent.source_index import (
+    chunk_research,
+    get_source_indexes,
+    get_thread_key,
+    relabel,
+    retrieve,
+)
+from agent.streaming import ShortUrlExpandingChatModel
+from agent.citations import (
+    ShortUrlExpander,
     get_citations,
-    get_research_topic,
     insert_citation_markers,
-    resolve_urls,
 )
+from agent.utils import resolve_urls
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-if os.getenv("GOOGLE_API_KEY") is None:
-    raise ValueError("GOOGLE_API_KEY is not set")
+GOOGLE_SEARCH_TOOLS = [{"google_search": {}}]
+
+
+def drop_redundant_queries(
+    queries: list[str], researched: list[str], configurable: Configuration
+) -> tuple[list[str], list[dict]]:
+    """Drop queries that paraphrase each other or an already researched query."""
+    embed = None
+    if configurable.query_dedupe_embedding_model:
+        embed = load_embedding_model(configurable.query_dedupe_embedding_model)
+    return dedupe_queries(
+        queries,
+        researched,
+        threshold=configurable.query_dedupe_threshold,
+        embed=embed,
+        embedding_threshold=configurable.query_dedupe_embedding_threshold,
+    )
+
+
+def share_batch_queries(
+    queries: list[str], researched: list[str], configurable: Configuration
+) -> list[str]:
+    """Replace queries paraphrasing one generated earlier in the run's question batch by it."""
+    batch = get_question_batch(configurable.question_batch_id)
+    if batch is None:
+        return queries
+    return batch.share(queries, researched, configurable.query_dedupe_threshold)
+
+
+def run_blob_store(configurable: Configuration) -> BlobStore | None:
+    """Return the blob store research payloads of the run are offloaded to, if any."""
+    return get_blob_store(
+        configurable.blob_store_backend, configurable.blob_store_location
+    )
+
+
+def load_research(
+    state: OverallState, store: BlobStore | None
+) -> tuple[list[str], list[dict]]:
+    """Return the web research results and the research digest with their texts loaded."""
+    results = load_texts(store, state["web_research_result"])
+    digest = state.get("research_digest") or []
+    texts = load_texts(store, [entry["text"] for entry in digest])
+    return results, [{**entry, "text": text} for entry, text in zip(digest, texts)]
+
+
+def offload_digest(store: BlobStore | None, entries: list[dict]) -> list[dict]:
+    """Replace the texts of research digest entries by blob references."""
+    texts = offload_texts(store, [entry["text"] for entry in entries])
+    return [{**entry, "text": text} for entry, text in zip(entries, texts)]
 
-# Used for Google Search API
-genai_client = Client(api_key=os.getenv("GOOGLE_API_KEY"))
+
+def digest_research(
+    state: OverallState, results: list[str], digest: list[dict]
+) -> tuple[list[dict], list[dict]]:
+    """Compact the web research results not yet in the research digest.
+
+    Returns:
+        The full digest including the new entries, and the new entries alone.
+    """
+    new_results = results[state.get("digested_result_count", 0) :]
+    new_entries = compact_results(new_results, digest)
+    return digest + new_entries, new_entries
+
+
+def get_max_research_loops(state: OverallState, configurable: Configuration) -> int:
+    """Return the research loop limit of the run, preferring the one set in state."""
+    if state.get("max_research_loops") is not None:
+        return state["max_research_loops"]
+    return configurable.max_research_loops
+
+
+def get_answer_model(state: OverallState, configurable: Configuration) -> str:
+    """Return the model answering the run, preferring the one set in state."""
+    return state.get("reasoning_model") or configurable.answer_model
+
+
+def run_answer_cache(state: OverallState, configurable: Configuration) -> AnswerCache:
+    """Return the answer cache of the run's answer model and research effort."""
+    initial_queries = state.get("initial_search_query_count")
+    if initial_queries is None:
+        initial_queries = configurable.number_of_initial_queries
+    return get_answer_cache(
+        configurable.answer_cache_embedding_model,
+        get_answer_model(state, configurable),
+        configurable.answer_cache_max_entries,
+        (initial_queries, get_max_research_loops(state, configurable)),
+    )
+
+
+def early_stop_reason(
+    state: OverallState, configurable: Configuration, results: list[str]
+) -> str:
+    """Return why research should stop before the reflection call, or "" to reflect.
+
+    Reflection is skipped when its follow-up queries could not be run anyway
+    because the loop limit is reached or the run's deadline leaves no time for
+    another loop, or when the latest research loop added too little new text
+    and too few new sources to be worth another.
+    """
+    if state["research_loop_count"] >= get_max_research_loops(state, configurable):
+        return "max_research_loops"
+    remaining = remaining_seconds(state)
+    if remaining is not None:
+        reasoning_model = state.get("reasoning_model") or configurable.reflection_model
+        needed = (
+            latency_estimates.estimate(reasoning_model, "reflection")
+            + search_seconds(configurable, 1)
+            + latency_estimates.estimate(get_answer_model(state, configurable), "answer")
+        )
+        if remaining < needed:
+            record_deadline_action("skip_loop")
+            return "deadline"
+    seen = state.get("digested_result_count", 0)
+    if configurable.novelty_threshold <= 0 or state["research_loop_count"] <= 1 or not seen:
+        return ""
+    report = measure_novelty(results[:seen], results[seen:])
+    annotate_span(
+        text_novelty=round(report.text_novelty, 4),
+        source_novelty=round(report.source_novelty, 4),
+    )
+    if report.novelty < configurable.novelty_threshold:
+        return "low_novelty"
+    return ""
+
+
+def record_research_stop(state: ReflectionState, reason: str) -> None:
+    """Log and count why a run stopped researching."""
+    logger.info(
+        "Research stopped after %d loop(s): %s", state["research_loop_count"], reason
+    )
+    metrics_registry.inc(
+        "agentflow_research_stops_total",
+        "Runs that stopped researching, by reason.",
+        reason=reason,
+    )
+
+
+def send_research(
+    queries: list[str],
+    first_id: int,
+    run_date: str,
+    run_key: str,
+    configurable: Configuration,
+) -> list[Send]:
+    """Send the queries of a research loop to web research.
+
+    Each query gets its own `web_research` branch, unless the loop is joined
+    on a quorum, in which case all queries go to a single `research_batch`.
+    """
+    if configurable.research_join_mode == "quorum":
+        if not queries:
+            return []
+        return [
+            Send(
+                "research_batch",
+                {
+                    "search_queries": list(queries),
+                    "first_id": first_id,
+                    "run_date": run_date,
+                    "run_key": run_key,
+                },
+            )
+        ]
+    if configurable.research_join_mode != "all":
+        raise ValueError(
+            f"Unknown research join mode: {configurable.research_join_mode}"
+        )
+    return [
+        Send(
+            "web_research",
+            {
+                "search_query": search_query,
+                "id": first_id + int(idx),
+                "run_date": run_date,
+                "run_key": run_key,
+            },
+        )
+        for idx, search_query in enumerate(queries)
+    ]
+
+
+async def call_reflection(
+    context, model: str, schema: type[Reflection], prefix: str, summaries: str
+) -> Reflection:
+    """Ask `model` whether the research summaries suffice, as structured output of `schema`."""
+    prompt = await context.prompt(model, prefix, reflection_suffix, summaries=summaries)
+    # Shared across runs
+    structured_llm = context.clients.structured_model(
+        model, schema, temperature=1.0, max_retries=2
+    )
+    with latency_estimates.measure(model, "reflection"):
+        async with schedule(model, context.configuration):
+            return await structured_llm.ainvoke(prompt.text, **prompt.model_kwargs)
 
 
 # Nodes
-def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
+@instrument_node("lookup_answer", finishes_run=lambda update: update["answer_cache_hit"])
+async def lookup_answer(state: OverallState, config: RunnableConfig) -> OverallState:
+    """LangGraph node that answers the User's question from the answer cache when possible.
+
+    Entry node of the graph. It fixes the run date and research topic of the run, then looks
+    the topic up in the semantic answer cache. A recent answer to a closely matching topic,
+    written by the run's answer model after as much research as the run asks for, is
+    returned with its sources, and the run ends without any research.
+
+    Args:
+        state: Current graph state containing the User's question
+        config: Configuration for the runnable, including the answer cache settings
+
+    Returns:
+        Dictionary with state update, including the run_date and research_topic of the run
+        with the conversation history rendered for it, answer_cache_hit, and on a hit the cached answer in messages and its sources_gathered
+    """
+    context, update = start_run_context(state, config)
+    configurable = context.configuration
+    update["answer_cache_hit"] = False
+    if not configurable.answer_cache_enabled:
+        return update
+
+    cache = run_answer_cache(state, configurable)
+    cached, outcome = await asyncio.to_thread(
+        cache.lookup,
+        context.research_topic,
+        context.run_date,
+        configurable.answer_cache_similarity_threshold,
+        configurable.answer_cache_ttl_days,
+    )
+    record_answer_cache_lookup(outcome)
+    annotate_span(answer_cache=outcome)
+    if cached is None:
+        return update
+    annotate_span(answer_cache_similarity=round(cached.similarity, 4))
+    return {
+        **update,
+        "messages": [AIMessage(content=cached.answer)],
+        "sources_gathered": cached.sources_gathered,
+        "answer_cache_hit": True,
+    }
+
+
+def route_cached_answer(state: OverallState) -> str:
+    """LangGraph routing function that ends runs answered from the answer cache."""
+    return END if state.get("answer_cache_hit") else "generate_query"
+
+
+@instrument_node("generate_query")
+async def generate_query(
+    state: OverallState, config: RunnableConfig
+) -> QueryGenerationState:
     """LangGraph node that generates search queries based on the User's question.
 
     Uses Gemini 2.0 Flash to create an optimized search queries for web research based on
@@ -52,50 +362,176 @@ def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerati
         config: Configuration for the runnable, including LLM provider settings
 
     Returns:
-        Dictionary with state update, including search_query key containing the generated queries
+        Dictionary with state update, including search_query key containing the generated queries,
+        pending_queries key with the same queries still to be researched, and dropped_queries key
+        listing the generated queries dropped as paraphrases
     """
-    configurable = Configuration.from_runnable_config(config)
+    context = get_run_context(state, config)
+    configurable = context.configuration
 
     # check for custom initial search query count
     if state.get("initial_search_query_count") is None:
         state["initial_search_query_count"] = configurable.number_of_initial_queries
+    number_queries = state["initial_search_query_count"]
+
+    # Ask for no more queries than can be searched before the run's deadline
+    remaining = remaining_seconds(state)
+    if remaining is not None:
+        budget = (
+            remaining
+            - latency_estimates.estimate(configurable.query_generator_model, "query")
+            - latency_estimates.estimate(get_answer_model(state, configurable), "answer")
+        )
+        affordable = max(1, affordable_queries(configurable, budget, number_queries))
+        if affordable < number_queries:
+            record_deadline_action("cut_queries")
+            annotate_span(deadline_queries=affordable)
+            number_queries = affordable
 
-    # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
+    # Gemini 2.0 Flash, shared across runs
+    structured_llm = context.clients.structured_model(
+        configurable.query_generator_model,
+        SearchQueryList,
         temperature=1.0,
         max_retries=2,
-        api_key=os.getenv("GOOGLE_API_KEY"),
     )
-    structured_llm = llm.with_structured_output(SearchQueryList)
 
-    # Format the prompt
-    current_date = get_current_date()
-    formatted_prompt = query_writer_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        number_queries=state["initial_search_query_count"],
+    # Format the prompt, its static prefix possibly served from the context cache
+    prompt = await context.prompt(
+        configurable.query_generator_model,
+        query_writer_prefix,
+        query_writer_suffix,
+        number_queries=number_queries,
     )
     # Generate the search queries
-    result = structured_llm.invoke(formatted_prompt)
-    return {"search_query": result.query}
+    with latency_estimates.measure(configurable.query_generator_model, "query"):
+        async with schedule(configurable.query_generator_model, configurable):
+            result = await structured_llm.ainvoke(prompt.text, **prompt.model_kwargs)
+    generated = result.query[:number_queries] if remaining is not None else result.query
+    queries, dropped = drop_redundant_queries(
+        generated, state.get("search_query", []), configurable
+    )
+    queries = share_batch_queries(queries, state.get("search_query", []), configurable)
+    return {"search_query": queries, "pending_queries": queries, "dropped_queries": dropped}
 
 
-def continue_to_web_research(state: QueryGenerationState):
-    """LangGraph node that sends the search queries to the web research node.
+def run_source_indexes(configurable: Configuration, config: RunnableConfig):
+    """Return the source indexes the run reads and writes."""
+    return get_source_indexes(
+        get_thread_key(config),
+        configurable.source_index_scope,
+        configurable.source_index_embedding_model,
+        configurable.source_index_max_chunks,
+    )
+
+
+@instrument_node("retrieve_research")
+async def retrieve_research(state: OverallState, config: RunnableConfig) -> OverallState:
+    """LangGraph node that answers search queries from earlier research when it covers them.
 
-    This is used to spawn n number of web research nodes, one for each search query.
+    Looks every generated query up in the source index of the thread, and of the whole server
+    when configured, which hold the result chunks of earlier runs with their citations. A query
+    whose content words are covered well enough by fresh chunks is not searched: its chunks are
+    added as its research result, with short urls of their own. Only the remaining queries are
+    sent to web research.
+
+    Args:
+        state: Current graph state containing the generated search queries
+        config: Configuration for the runnable, including the source index settings
+
+    Returns:
+        Dictionary with state update, including pending_queries key with the queries left to
+        search, retrieved_queries key listing the queries answered from the index, and their
+        web_research_result and sources_gathered
     """
-    return [
-        Send("web_research", {"search_query": search_query, "id": int(idx)})
-        for idx, search_query in enumerate(state["search_query"])
+    configurable = resolve_configuration(config)
+    queries = state.get("pending_queries") or []
+    if not configurable.source_index_scope or not queries:
+        return {}
+
+    retrievals = await asyncio.to_thread(
+        retrieve,
+        run_source_indexes(configurable, config),
+        queries,
+        get_embedder(configurable.source_index_embedding_model),
+        parse_run_date(state["run_date"]),
+        configurable.source_index_ttl_days,
+    )
+    covered = [
+        retrieval
+        for retrieval in retrievals
+        if retrieval.chunks and retrieval.coverage >= configurable.source_index_coverage
     ]
+    store = run_blob_store(configurable)
+    base = len(state["search_query"])
+    web_research_result, sources_gathered = [], []
+    for number, retrieval in enumerate(covered):
+        texts, sources = [], []
+        for position, chunk in enumerate(retrieval.chunks):
+            text, chunk_sources = relabel(chunk, f"r{base}_{number}_{position}")
+            texts.append(text)
+            sources.extend(chunk_sources)
+        web_research_result.append(" ".join(texts))
+        sources_gathered.extend(await asyncio.to_thread(offload_sources, store, sources))
+    web_research_result = await asyncio.to_thread(offload_texts, store, web_research_result)
+
+    for result, count in (("covered", len(covered)), ("searched", len(queries) - len(covered))):
+        metrics_registry.inc(
+            "agentflow_source_index_queries_total",
+            "Search queries answered from the source index or sent to web research.",
+            count,
+            result=result,
+        )
+    annotate_span(retrieved=len(covered), searched=len(queries) - len(covered))
+    covered_queries = {retrieval.query for retrieval in covered}
+    return {
+        "pending_queries": [query for query in queries if query not in covered_queries],
+        "retrieved_queries": [
+            {
+                "query": retrieval.query,
+                "coverage": round(retrieval.coverage, 3),
+                "chunks": len(retrieval.chunks),
+            }
+            for retrieval in covered
+        ],
+        "web_research_result": web_research_result,
+        "sources_gathered": sources_gathered,
+        # Retrieved results are already in the index.
+        "indexed_result_count": len(state["web_research_result"]) + len(covered),
+    }
+
+
+def continue_to_web_research(state: OverallState, config: RunnableConfig):
+    """LangGraph node that sends the search queries to the web research node.
+
+    This is used to spawn n number of web research nodes, one for each search query
+    not answered from the source index, or a single research batch node when the research
+    loop is joined on a quorum. Runs whose queries were all answered from the index go
+    straight to reflection.
+    """
+    queries = state.get("pending_queries", state["search_query"])
+    if not queries:
+        return "reflection"
+    return send_research(
+        queries,
+        0,
+        state["run_date"],
+        state.get("run_key", ""),
+        resolve_configuration(config),
+    )
 
 
-def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
+@instrument_node("web_research")
+async def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     """LangGraph node that performs web research using the native Google Search API tool.
 
     Executes a web search using the native Google Search API tool in combination with Gemini 2.0 Flash.
+    The call goes through the async genai client so a branch never blocks a worker thread, and at
+    most `max_concurrent_research` branches of the same run are in flight at once. Responses are
+    cached per (query, model, day) and identical in-flight queries share a single call, across
+    replicas too when they coordinate through Redis, and across the runs of a question batch. Slow
+    searches are optionally hedged with a duplicate request. With a blob store configured, the
+    result and its sources are stored there and the state update only references them.
 
     Args:
         state: Current graph state containing the search query and research loop count
@@ -105,21 +541,89 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
         Dictionary with state update, including sources_gathered, research_loop_count, and web_research_results
     """
     # Configure
-    configurable = Configuration.from_runnable_config(config)
-    formatted_prompt = web_searcher_instructions.format(
-        current_date=get_current_date(),
-        research_topic=state["search_query"],
-    )
+    context = get_run_context(state, config)
+    configurable = context.configuration
+
+    annotate_span(branch=state["id"], query=state["search_query"])
+    fetched = False
+
+    async def search():
+        nonlocal fetched
+        fetched = True
+        prompt = await context.prompt(
+            configurable.query_generator_model,
+            web_searcher_prefix,
+            web_searcher_suffix,
+            tools=GOOGLE_SEARCH_TOOLS,
+            research_topic=state["search_query"],
+        )
+        # A cached prefix carries the tools, which the request may then not repeat
+        request_config = {"temperature": 0}
+        if prompt.cached_content:
+            request_config["cached_content"] = prompt.cached_content
+        else:
+            request_config["tools"] = GOOGLE_SEARCH_TOOLS
+        queued_at = time.perf_counter()
+        # Uses the google genai client as the langchain client doesn't return grounding metadata
+        async with research_limiter.limit(
+            get_run_key(config, state), configurable.max_concurrent_research
+        ):
+            record_queue_wait(time.perf_counter() - queued_at)
+            # A search running past the model's p90 latency may be hedged with a
+            # duplicate; the first answer wins. Each copy is scheduled on its own,
+            # so hedges count against the model's rate and concurrency limits.
+            with latency_estimates.measure(configurable.query_generator_model, "search"):
+                response = await hedger.call(
+                    configurable.query_generator_model,
+                    lambda: call_scheduled(
+                        configurable.query_generator_model,
+                        configurable,
+                        lambda: context.clients.genai_client.aio.models.generate_content(
+                            model=configurable.query_generator_model,
+                            contents=prompt.text,
+                            config=request_config,
+                        ),
+                    ),
+                    configurable.hedge_budget_percent,
+                    configurable.hedge_quantile,
+                )
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            record_usage(usage.prompt_token_count, usage.candidates_token_count)
+        return response
 
-    # Uses the google genai client as the langchain client doesn't return grounding metadata
-    response = genai_client.models.generate_content(
-        model=configurable.query_generator_model,
-        contents=formatted_prompt,
-        config={
-            "tools": [{"google_search": {}}],
-            "temperature": 0,
-        },
+    key = cache_key(
+        state["search_query"], configurable.query_generator_model, context.run_date
     )
+    fetch = search
+    # Other replicas may have the result, or be fetching it already
+    coordinator = get_coordinator(configurable.coordination_redis_url)
+    if coordinator is not None:
+
+        async def fetch():
+            return await coordinator.get_or_fetch(
+                key,
+                search,
+                dump_response,
+                load_response,
+                configurable.coordination_cache_ttl_seconds,
+                configurable.coordination_lock_seconds,
+            )
+
+    # Without the search cache, runs of a question batch still share their searches
+    batch = get_question_batch(configurable.question_batch_id)
+    if configurable.search_cache_ttl_seconds > 0:
+        cache = get_search_cache(
+            configurable.search_cache_path,
+            configurable.search_cache_ttl_seconds,
+            configurable.search_cache_max_entries,
+        )
+        response = await cache.get_or_fetch(key, fetch)
+    elif batch is not None:
+        response = await batch.get_or_fetch(key, fetch)
+    else:
+        response = await fetch()
+    annotate_span(cache_hit=not fetched)
     # resolve the urls to short urls for saving tokens and time
     resolved_urls = resolve_urls(
         response.candidates[0].grounding_metadata.grounding_chunks, state["id"]
@@ -128,55 +632,227 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     citations = get_citations(response, resolved_urls)
     modified_text = insert_citation_markers(response.text, citations)
     sources_gathered = [item for citation in citations for item in citation["segments"]]
+    web_research_result = [modified_text]
+
+    # Offload the result and its sources so the state only holds their hashes
+    store = run_blob_store(configurable)
+    if store is not None:
+        web_research_result = await asyncio.to_thread(
+            offload_texts, store, web_research_result
+        )
+        sources_gathered = await asyncio.to_thread(
+            offload_sources, store, sources_gathered
+        )
 
     return {
         "sources_gathered": sources_gathered,
         "search_query": [state["search_query"]],
-        "web_research_result": [modified_text],
+        "web_research_result": web_research_result,
     }
 
 
-def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
+@instrument_node("research_batch")
+async def research_batch(
+    state: BatchResearchState, config: RunnableConfig
+) -> OverallState:
+    """LangGraph node that runs the searches of a research loop and joins them on a quorum.
+
+    Runs `web_research` for every query concurrently and returns as soon as
+    `research_quorum` of them finished, or the join deadline passed with at least
+    one finished, so a single slow search no longer holds up reflection. Searches
+    still running are parked and their results folded into the run's next research
+    loop if they finish by then, or cancelled, as `research_straggler_policy` says.
+
+    Args:
+        state: The queries of the research loop, the id of the first one and the run date
+        config: Configuration for the runnable, including the quorum join settings
+
+    Returns:
+        Dictionary with state update, including sources_gathered, web_research_result and
+        search_query like the web_research branches, and straggler_queries listing the
+        searches that were parked or cancelled
+    """
+    configurable = resolve_configuration(config)
+    run_key = get_run_key(config, state)
+    tasks = set()
+    for offset, query in enumerate(state["search_queries"]):
+        task = asyncio.create_task(
+            web_research(
+                {
+                    "search_query": query,
+                    "id": state["first_id"] + offset,
+                    "run_date": state["run_date"],
+                    "run_key": state.get("run_key", ""),
+                },
+                config,
+            )
+        )
+        task.branch_id = state["first_id"] + offset
+        task.query = query
+        tasks.add(task)
+    parked = parked_searches.take(run_key)
+
+    try:
+        done, pending = await quorum_wait(
+            tasks,
+            quorum_size(len(tasks), configurable.research_quorum),
+            configurable.research_join_deadline_seconds,
+            extra=parked,
+        )
+        updates = task_results(done)
+    except BaseException:
+        for task in tasks | parked:
+            task.cancel()
+        raise
+
+    policy = configurable.research_straggler_policy
+    if policy == "park":
+        parked_searches.park(run_key, pending)
+    else:
+        for task in pending:
+            task.cancel()
+    stragglers = [
+        {"query": task.query, "id": task.branch_id, "outcome": policy}
+        for task in sorted(pending & tasks, key=lambda task: task.branch_id)
+    ]
+    annotate_span(
+        searches=len(tasks),
+        finished=len(done & tasks),
+        folded=len(done & parked),
+        stragglers=len(stragglers),
+    )
+
+    # Every sent query counts as ran, so later branch ids never reuse a straggler's id.
+    merged = merge_updates(updates)
+    return {
+        "search_query": list(state["search_queries"]),
+        "web_research_result": merged.get("web_research_result", []),
+        "sources_gathered": merged.get("sources_gathered", []),
+        "straggler_queries": stragglers,
+    }
+
+
+@instrument_node("reflection")
+async def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
     """LangGraph node that identifies knowledge gaps and generates potential follow-up queries.
 
     Analyzes the current summary to identify areas for further research and generates
     potential follow-up queries. Uses structured output to extract
-    the follow-up query in JSON format.
+    the follow-up query in JSON format. With a reflection cascade configured, a local
+    heuristic or a faster model decides first and the reasoning model is only called
+    when they are not confident enough.
 
     Args:
         state: Current graph state containing the running summary and research topic
         config: Configuration for the runnable, including LLM provider settings
 
     Returns:
-        Dictionary with state update, including search_query key containing the generated follow-up query
+        Dictionary with state update, including follow_up_queries key containing the generated follow-up
+        queries that do not paraphrase an already researched query, and with a cascade the
+        reflection_cascade key recording which tier decided and the latency it saved
     """
-    configurable = Configuration.from_runnable_config(config)
+    context = get_run_context(state, config)
+    configurable = context.configuration
     # Increment the research loop count and get the reasoning model
     state["research_loop_count"] = state.get("research_loop_count", 0) + 1
     reasoning_model = state.get("reasoning_model", configurable.reflection_model)
 
-    # Format the prompt
-    current_date = get_current_date()
-    formatted_prompt = reflection_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n\n---\n\n".join(state["web_research_result"]),
+    # Compact only the new results into the digest and fit it into the prompt budget
+    store = run_blob_store(configurable)
+    results, digest = await asyncio.to_thread(load_research, state, store)
+    digest, new_entries = digest_research(state, results, digest)
+    update = {
+        "research_digest": await asyncio.to_thread(offload_digest, store, new_entries),
+        "digested_result_count": len(state["web_research_result"]),
+        "research_loop_count": state["research_loop_count"],
+        "number_of_ran_queries": len(state["search_query"]),
+    }
+
+    # Skip the reflection call when its outcome cannot lead to more useful research
+    stop_reason = early_stop_reason(state, configurable, results)
+    if stop_reason:
+        logger.info(
+            "Skipping reflection call after loop %d: %s",
+            state["research_loop_count"],
+            stop_reason,
+        )
+        metrics_registry.inc(
+            "agentflow_reflection_calls_saved_total",
+            "Reflection LLM calls skipped by early stopping, by reason.",
+            reason=stop_reason,
+        )
+        annotate_span(stop_reason=stop_reason)
+        return {
+            "is_sufficient": False,
+            "knowledge_gap": "",
+            "follow_up_queries": [],
+            "dropped_queries": [],
+            "stop_reason": stop_reason,
+            **update,
+        }
+
+    summaries = "\n\n---\n\n".join(
+        fit_to_budget(digest, configurable.reflection_token_budget)
     )
-    # init Reasoning Model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GOOGLE_API_KEY"),
+
+    # Cheaper tiers decide first, escalating to the reasoning model while unsure
+    tiers = parse_cascade_tiers(configurable.reflection_cascade)
+    result, decided_by, confidence = None, reasoning_model, 1.0
+    expected_seconds = latency_estimates.mean(reasoning_model, "reflection")
+    started = time.perf_counter()
+    for tier in tiers:
+        if tier == "heuristic":
+            candidate, confidence = heuristic_reflection(context.research_topic, results)
+        else:
+            candidate = await call_reflection(
+                context,
+                configurable.reflection_cascade_model,
+                TriageReflection,
+                reflection_triage_prefix,
+                summaries,
+            )
+            confidence = triage_confidence(candidate)
+        accepted = confidence >= configurable.reflection_cascade_confidence
+        record_cascade_decision(tier, accepted)
+        if accepted:
+            result, decided_by = candidate, tier
+            break
+    cascade_seconds = time.perf_counter() - started
+    if result is None:
+        result = await call_reflection(
+            context, reasoning_model, Reflection, reflection_prefix, summaries
+        )
+    if tiers:
+        seconds_saved = (
+            expected_seconds - cascade_seconds
+            if decided_by != reasoning_model
+            else -cascade_seconds
+        )
+        record_cascade_seconds(seconds_saved)
+        annotate_span(reflection_decided_by=decided_by, seconds_saved=round(seconds_saved, 3))
+        update["reflection_cascade"] = [
+            {
+                "loop": state["research_loop_count"],
+                "decided_by": decided_by,
+                "escalations": tiers.index(decided_by) if decided_by in tiers else len(tiers),
+                "confidence": round(confidence, 3),
+                "seconds_saved": round(seconds_saved, 3),
+            }
+        ]
+    follow_up_queries, dropped = drop_redundant_queries(
+        result.follow_up_queries, state["search_query"], configurable
+    )
+    follow_up_queries = share_batch_queries(
+        follow_up_queries, state["search_query"], configurable
     )
-    result = llm.with_structured_output(Reflection).invoke(formatted_prompt)
 
     return {
         "is_sufficient": result.is_sufficient,
         "knowledge_gap": result.knowledge_gap,
-        "follow_up_queries": result.follow_up_queries,
-        "research_loop_count": state["research_loop_count"],
-        "number_of_ran_queries": len(state["search_query"]),
+        "follow_up_queries": follow_up_queries,
+        "dropped_queries": dropped,
+        "stop_reason": "",
+        **update,
     }
 
 
@@ -188,6 +864,8 @@ def evaluate_research(
 
     Controls the research loop by deciding whether to continue gathering information
     or to finalize the summary based on the configured maximum number of research loops.
+    Runs whose reflection was skipped by early stopping go straight to the answer. Runs
+    with a deadline only search the follow-up queries that fit the time left, if any.
 
     Args:
         state: Current graph state containing the research loop count
@@ -196,33 +874,52 @@ def evaluate_research(
     Returns:
         String literal indicating the next node to visit ("web_research" or "finalize_summary")
     """
-    configurable = Configuration.from_runnable_config(config)
-    max_research_loops = (
-        state.get("max_research_loops")
-        if state.get("max_research_loops") is not None
-        else configurable.max_research_loops
-    )
-    if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:
+    configurable = resolve_configuration(config)
+    if state.get("stop_reason"):
+        stop_reason = state["stop_reason"]
+    elif state["is_sufficient"]:
+        stop_reason = "sufficient"
+    elif state["research_loop_count"] >= get_max_research_loops(state, configurable):
+        stop_reason = "max_research_loops"
+    elif not state["follow_up_queries"]:
+        stop_reason = "no_follow_up_queries"
+    else:
+        stop_reason = ""
+    follow_up_queries = state.get("follow_up_queries") or []
+    remaining = remaining_seconds(state)
+    if not stop_reason and remaining is not None:
+        budget = remaining - latency_estimates.estimate(get_answer_model(state, configurable), "answer")
+        affordable = affordable_queries(configurable, budget, len(follow_up_queries))
+        if affordable == 0:
+            record_deadline_action("skip_loop")
+            stop_reason = "deadline"
+        elif affordable < len(follow_up_queries):
+            record_deadline_action("cut_queries")
+            follow_up_queries = follow_up_queries[:affordable]
+    if stop_reason:
+        record_research_stop(state, stop_reason)
         return "finalize_answer"
     else:
-        return [
-            Send(
-                "web_research",
-                {
-                    "search_query": follow_up_query,
-                    "id": state["number_of_ran_queries"] + int(idx),
-                },
-            )
-            for idx, follow_up_query in enumerate(state["follow_up_queries"])
-        ]
+        return send_research(
+            follow_up_queries,
+            state["number_of_ran_queries"],
+            state["run_date"],
+            state.get("run_key", ""),
+            configurable,
+        )
 
 
-def finalize_answer(state: OverallState, config: RunnableConfig):
+@instrument_node("finalize_answer", finishes_run=True)
+async def finalize_answer(state: OverallState, config: RunnableConfig):
     """LangGraph node that finalizes the research summary.
 
     Prepares the final output by deduplicating and formatting sources, then
     combining them with the running summary to create a well-structured
-    research report with proper citations.
+    research report with proper citations. The answer is streamed token by
+    token with its short urls already expanded, and stored in the answer cache unless the run
+    has a deadline. When the run's deadline leaves too little time for the answer model, the
+    faster deadline answer model answers instead. The results researched by the run are added
+    to the source index for follow-up questions.
 
     Args:
         state: Current graph state containing the running summary and sources gathered
@@ -230,38 +927,94 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
     Returns:
         Dictionary with state update, including running_summary key containing the formatted final summary with sources
     """
-    configurable = Configuration.from_runnable_config(config)
-    reasoning_model = state.get("reasoning_model") or configurable.answer_model
+    context = get_run_context(state, config)
+    configurable = context.configuration
+    reasoning_model = get_answer_model(state, configurable)
+    answer_model = choose_answer_model(
+        configurable, reasoning_model, remaining_seconds(state)
+    )
+    if answer_model != reasoning_model:
+        record_deadline_action("fast_answer_model")
+        annotate_span(deadline_answer_model=answer_model)
+
+    # Searches parked by a quorum join are no longer needed
+    cancelled = parked_searches.cancel(get_run_key(config, state))
+    if cancelled:
+        logger.info("Cancelled %d parked search(es) before the answer", cancelled)
+
+    store = run_blob_store(configurable)
+    results, digest = await asyncio.to_thread(load_research, state, store)
+    digest, new_entries = digest_research(state, results, digest)
+    sources = await asyncio.to_thread(load_sources, store, state["sources_gathered"])
+    summaries = fit_to_budget(digest, configurable.answer_token_budget)
 
     # Format the prompt
-    current_date = get_current_date()
-    formatted_prompt = answer_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n---\n\n".join(state["web_research_result"]),
+    prompt = await context.prompt(
+        answer_model,
+        answer_prefix,
+        answer_suffix,
+        summaries="\n---\n\n".join(summaries),
     )
 
-    # init Reasoning Model, default to Gemini 2.5 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    # Reasoning Model, default to Gemini 2.5 Pro, shared across runs. Tokens are
+    # streamed to `messages` stream mode with the short urls already replaced by
+    # the original urls.
+    expander = ShortUrlExpander(sources)
+    llm = ShortUrlExpandingChatModel(
+        llm=context.clients.chat_model(
+            answer_model, temperature=0, max_retries=2
+        ),
+        expander=expander,
     )
-    result = llm.invoke(formatted_prompt)
-
-    # Replace the short urls with the original urls and add all used urls to the sources_gathered
-    unique_sources = []
-    for source in state["sources_gathered"]:
-        if source["short_url"] in result.content:
-            result.content = result.content.replace(
-                source["short_url"], source["value"]
-            )
-            unique_sources.append(source)
+    result = None
+    with latency_estimates.measure(answer_model, "answer"):
+        async with schedule(answer_model, configurable):
+            async for chunk in llm.astream(prompt.text, **prompt.model_kwargs):
+                result = chunk if result is None else result + chunk
+    remaining = remaining_seconds(state)
+    if remaining is not None:
+        metrics_registry.inc(
+            "agentflow_deadline_runs_total",
+            "Answered runs with a deadline, by whether they met it.",
+            outcome="met" if remaining >= 0 else "missed",
+        )
+
+    # Runs with a deadline may have searched less or answered with the faster
+    # deadline model; their answers would displace better ones in the cache,
+    # whose key does not include the deadline
+    if (
+        configurable.answer_cache_enabled
+        and state.get("deadline_at") is None
+        and result is not None
+        and result.content
+    ):
+        cache = run_answer_cache(state, configurable)
+        await asyncio.to_thread(
+            cache.put,
+            context.research_topic,
+            result.content,
+            expander.used_sources,
+            context.run_date,
+        )
+
+    # Index the results researched by this run for follow-up questions
+    indexed_result_count = state.get("indexed_result_count", 0)
+    if configurable.source_index_scope and len(results) > indexed_result_count:
+        chunks = chunk_research(results[indexed_result_count:], sources, context.run_date)
+        for index in run_source_indexes(configurable, config):
+            await asyncio.to_thread(index.add, chunks)
 
     return {
-        "messages": [AIMessage(content=result.content)],
-        "sources_gathered": unique_sources,
+        "messages": [
+            AIMessage(
+                content=result.content if result else "",
+                id=result.id if result else None,
+            )
+        ],
+        "sources_gathered": expander.used_sources,
+        "research_digest": await asyncio.to_thread(offload_digest, store, new_entries),
+        "digested_result_count": len(state["web_research_result"]),
+        "indexed_result_count": len(results),
     }
 
 
@@ -269,23 +1022,36 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
 builder = StateGraph(OverallState, config_schema=Configuration)
 
 # Define the nodes we will cycle between
+builder.add_node("lookup_answer", lookup_answer)
 builder.add_node("generate_query", generate_query)
+builder.add_node("retrieve_research", retrieve_research)
 builder.add_node("web_research", web_research)
+builder.add_node("research_batch", research_batch)
 builder.add_node("reflection", reflection)
 builder.add_node("finalize_answer", finalize_answer)
 
-# Set the entrypoint as `generate_query`
+# Set the entrypoint as `lookup_answer`
 # This means that this node is the first one called
-builder.add_edge(START, "generate_query")
-# Add conditional edge to continue with search queries in a parallel branch
+builder.add_edge(START, "lookup_answer")
+# Answer from the cache, or research the question
+builder.add_conditional_edges(
+    "lookup_answer", route_cached_answer, ["generate_query", END]
+)
+# Answer what earlier research covers, then search the rest in parallel branches
+builder.add_edge("generate_query", "retrieve_research")
 builder.add_conditional_edges(
-    "generate_query", continue_to_web_research, ["web_research"]
+    "retrieve_research",
+    continue_to_web_research,
+    ["web_research", "research_batch", "reflection"],
 )
 # Reflect on the web research
 builder.add_edge("web_research", "reflection")
+builder.add_edge("research_batch", "reflection")
 # Evaluate the research
 builder.add_conditional_edges(
-    "reflection", evaluate_research, ["web_research", "finalize_answer"]
+    "reflection",
+    evaluate_research,
+    ["web_research", "research_batch", "finalize_answer"],
 )
 # Finalize the answer
 builder.add_edge("finalize_answer", END)
@@ -0,0 +1,209 @@
+"""Hedged requests: a second copy of a call that is slower than usual."""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from agent.metrics import annotate_span, metrics_registry
+
+
+class P2Quantile:
+    """Streaming quantile estimate in constant memory (the P² algorithm).
+
+    Keeps five markers whose heights approximate the minimum, the `p/2`, `p`
+    and `(1+p)/2` quantiles and the maximum of the observations, adjusting
+    them with piecewise-parabolic interpolation as values arrive (Jain and
+    Chlamtac, 1985).
+    """
+
+    def __init__(self, p: float):
+        """Create an estimate of the `p` quantile, between 0 and 1."""
+        if not 0 < p < 1:
+            raise ValueError("The quantile must be between 0 and 1")
+        self.p = p
+        self.count = 0
+        self._heights: List[float] = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value: float) -> None:
+        """Add an observation."""
+        self.count += 1
+        heights = self._heights
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+        positions = self._positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in range(1, 4):
+            delta = self._desired[i] - positions[i]
+            if (delta >= 1 and positions[i + 1] - positions[i] > 1) or (
+                delta <= -1 and positions[i - 1] - positions[i] < -1
+            ):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (
+                        positions[i + step] - positions[i]
+                    )
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> float | None:
+        """Return the current estimate, or None before any observation."""
+        if not self._heights:
+            return None
+        if self.count <= 5:
+            return self._heights[
+                min(len(self._heights) - 1, int(self.p * len(self._heights)))
+            ]
+        return self._heights[2]
+
+
+class _ModelHedging:
+    def __init__(self, quantile: float):
+        self.latency = P2Quantile(quantile)
+        self.credits = 0.0
+
+
+class Hedger:
+    """Fire a second copy of a slow call and keep whichever answers first.
+
+    A call is hedged once it has run longer than the observed `quantile`
+    latency of its model. Hedges are paid for with credits: each call earns
+    `budget_percent / 100` credits and a hedge spends one, so hedges stay
+    within the budget over time while bursts are capped at `max_burst`.
+
+    Latencies of completed calls are observed as they are. A copy cancelled
+    after running past the hedging delay, usually the primary losing to its
+    hedge, is observed with its elapsed time as a lower bound of its latency,
+    so the slow tail is not left out of the quantile estimate. Copies
+    cancelled earlier tell nothing about the tail and are left out.
+    """
+
+    def __init__(self, min_samples: int = 20, max_burst: float = 10.0):
+        """Create a hedger without any observed latency."""
+        self.min_samples = min_samples
+        self.max_burst = max_burst
+        self._models: Dict[Tuple[str, float], _ModelHedging] = {}
+
+    def _model(self, model: str, quantile: float) -> _ModelHedging:
+        key = (model, quantile)
+        stats = self._models.get(key)
+        if stats is None:
+            stats = self._models[key] = _ModelHedging(quantile)
+        return stats
+
+    def hedge_delay(self, model: str, quantile: float = 0.9) -> float | None:
+        """Return after how many seconds a call of `model` is hedged, None while still learning."""
+        stats = self._model(model, quantile)
+        if stats.latency.count < self.min_samples:
+            return None
+        return stats.latency.value()
+
+    async def _timed(
+        self,
+        stats: _ModelHedging,
+        fn: Callable[[], Awaitable[Any]],
+        delay: float | None,
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            elapsed = time.perf_counter() - started
+            if delay is not None and elapsed >= delay:
+                stats.latency.add(elapsed)
+            raise
+        stats.latency.add(time.perf_counter() - started)
+        return result
+
+    def _record(self, model: str, outcome: str) -> None:
+        metrics_registry.inc(
+            "agentflow_hedged_requests_total",
+            "Calls that ran past the hedging delay, by outcome.",
+            model=model,
+            outcome=outcome,
+        )
+
+    async def call(
+        self,
+        model: str,
+        fn: Callable[[], Awaitable[Any]],
+        budget_percent: float,
+        quantile: float = 0.9,
+    ) -> Any:
+        """Await `fn()`, hedging it with a second `fn()` if it runs past the delay.
+
+        Args:
+            model: The model called by `fn`, whose latencies set the hedging delay.
+            fn: Makes the call; invoked once, or twice when hedged. Each copy
+                should go through the scheduler on its own, so a hedge also
+                takes a rate limit token and a concurrency slot.
+            budget_percent: Hedges allowed per hundred calls; 0 disables hedging.
+            quantile: The latency quantile after which a call is hedged.
+
+        Returns:
+            The result of the first copy of the call to succeed.
+        """
+        stats = self._model(model, quantile)
+        stats.credits = min(self.max_burst, stats.credits + budget_percent / 100)
+        delay = self.hedge_delay(model, quantile) if budget_percent > 0 else None
+        primary = asyncio.ensure_future(self._timed(stats, fn, delay))
+        if delay is None:
+            return await primary
+
+        attempts = {primary}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done:
+                return primary.result()
+            if stats.credits < 1:
+                self._record(model, "over_budget")
+                return await primary
+            stats.credits -= 1
+            hedge = asyncio.ensure_future(self._timed(stats, fn, delay))
+            attempts.add(hedge)
+            annotate_span(hedged=True)
+            errors = []
+            while attempts:
+                done, attempts = await asyncio.wait(
+                    attempts, return_when=asyncio.FIRST_COMPLETED
+                )
+                for attempt in done:
+                    if attempt.exception() is None:
+                        outcome = "hedge_won" if attempt is hedge else "primary_won"
+                        self._record(model, outcome)
+                        annotate_span(hedge_won=attempt is hedge)
+                        return attempt.result()
+                    errors.append(attempt.exception())
+            self._record(model, "failed")
+            raise errors[0]
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+
+hedger = Hedger()
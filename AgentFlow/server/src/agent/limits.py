@@ -0,0 +1,71 @@
+"""Per-run limits on the concurrency of research branches."""
+
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Mapping, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+
+def get_run_key(
+    config: RunnableConfig | None, state: Mapping[str, Any] | None = None
+) -> str:
+    """Return a key identifying the graph run a node belongs to.
+
+    The LangGraph API server puts `run_id` in the configurable (and in the
+    metadata). Local invocations fall back to the thread id, then to the
+    `run_key` the entry node of the graph generated in `state`, so runs
+    invoked without either do not share one key. "default" is only left for
+    calls outside of a run.
+    """
+    configurable = (config or {}).get("configurable") or {}
+    metadata = (config or {}).get("metadata") or {}
+    for key in ("run_id", "thread_id"):
+        value = configurable.get(key) or metadata.get(key)
+        if value:
+            return str(value)
+    if state and state.get("run_key"):
+        return str(state["run_key"])
+    return "default"
+
+
+class RunConcurrencyLimiter:
+    """Bound the number of concurrent research branches of a single run.
+
+    One semaphore is kept per run key and event loop, since a semaphore
+    belongs to the loop it first waited on, e.g. one of several
+    `asyncio.run` calls reusing a thread id. Semaphores are held weakly, so
+    the entry for a run disappears as soon as none of its branches is
+    waiting on or holding it.
+    """
+
+    def __init__(self):
+        """Create a limiter without any run."""
+        self._semaphores: weakref.WeakValueDictionary[
+            Tuple[int, str], asyncio.Semaphore
+        ] = weakref.WeakValueDictionary()
+
+    def _semaphore(self, run_key: str, limit: int) -> asyncio.Semaphore:
+        key = (id(asyncio.get_running_loop()), run_key)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[key] = semaphore
+        return semaphore
+
+    @asynccontextmanager
+    async def limit(self, run_key: str, limit: int) -> AsyncIterator[None]:
+        """Hold one of the `limit` slots of the run for the duration of the block.
+
+        A `limit` below 1 disables the bound.
+        """
+        if limit < 1:
+            yield
+            return
+        semaphore = self._semaphore(run_key, limit)
+        async with semaphore:
+            yield
+
+
+research_limiter = RunConcurrencyLimiter()
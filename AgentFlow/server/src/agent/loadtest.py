@@ -0,0 +1,226 @@
+r"""Offline load-testing harness for the research graph.
+
+Runs the compiled `graph` against fake Gemini clients with configurable
+latency distributions, so it needs neither network access nor API keys.
+
+Usage:
+    python -m agent.loadtest --runs 200 --concurrency 50 \
+        --search-latency lognormal:1.5,0.5 --llm-latency lognormal:0.8,0.4
+
+Runs go through the same per-model scheduler as production, including its
+default rate limits; pass e.g. `--configurable '{"model_requests_per_minute":
+"gemini-2.5-pro=0"}'` to lift them, and `--search-capacity` to make the fake
+search API throttle.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import HumanMessage
+
+from agent.clients import set_client_registry
+from agent.fakes import fake_client_registry, parse_latency
+
+
+@dataclass
+class LoadTestConfig:
+    """Settings of a load test."""
+
+    runs: int = 100
+    concurrency: int = 20
+    search_latency: str = "lognormal:1.5,0.5"
+    llm_latency: str = "lognormal:0.8,0.4"
+    num_sources: int = 5
+    search_capacity: int | None = None
+    model_latency: Dict[str, str] = field(default_factory=dict)
+    initial_queries: Sequence[int] = (1, 3, 5)
+    research_loops: Sequence[int] = (1, 2, 3)
+    search_cache: bool = False
+    answer_cache: bool = False
+    seed: int = 0
+    configurable: Dict[str, Any] = field(default_factory=dict)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Return the nearest-rank `q` percentile (0-100) of `values`."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+async def run_load_test(config: LoadTestConfig) -> Dict[str, Any]:
+    """Drive `config.runs` graph runs, at most `config.concurrency` at once.
+
+    Each run picks its `number_of_initial_queries` and `max_research_loops`
+    from the configured choices. The process-wide client registry is swapped
+    for fake clients for the duration of the test.
+
+    Returns:
+        Throughput, latency percentiles, peak traced memory, upstream call
+        counts and errors of the test.
+    """
+    from agent.graph import graph
+
+    rng = random.Random(config.seed)
+    registry = fake_client_registry(
+        search_latency=parse_latency(config.search_latency, config.seed),
+        llm_latency=parse_latency(config.llm_latency, config.seed + 1),
+        num_sources=config.num_sources,
+        search_capacity=config.search_capacity,
+        model_latency={
+            model: parse_latency(spec, config.seed + 2 + index)
+            for index, (model, spec) in enumerate(sorted(config.model_latency.items()))
+        },
+    )
+    previous = set_client_registry(registry)
+    semaphore = asyncio.Semaphore(config.concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        base_configurable = {
+            "search_cache_ttl_seconds": 3600 if config.search_cache else 0,
+            "search_cache_path": f"{cache_dir}/search_cache.sqlite3",
+            "answer_cache_enabled": config.answer_cache,
+            **config.configurable,
+        }
+
+        async def one_run(index: int) -> None:
+            state = {
+                "messages": [HumanMessage(f"Load test question {index % 50}")],
+                "initial_search_query_count": rng.choice(config.initial_queries),
+                "max_research_loops": rng.choice(config.research_loops),
+            }
+            run_config = {
+                "configurable": {**base_configurable, "thread_id": f"loadtest-{index}"}
+            }
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await graph.ainvoke(state, run_config)
+                except Exception as exc:
+                    errors.append(f"{type(exc).__name__}: {exc}")
+                else:
+                    latencies.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(one_run(index) for index in range(config.runs)))
+        finally:
+            elapsed = time.perf_counter() - start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            set_client_registry(previous)
+
+    genai_client = registry.genai_client
+    return {
+        "config": asdict(config),
+        "completed": len(latencies),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_s": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies, default=0.0), 4),
+        },
+        "peak_memory_mib": round(peak_memory / 2**20, 2),
+        "search_calls": genai_client.calls,
+        "throttled_searches": genai_client.throttled,
+        "max_searches_in_flight": genai_client.max_in_flight,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Render a load test report as a short human-readable table."""
+    latency = report["latency_s"]
+    return "\n".join(
+        [
+            f"runs completed     : {report['completed']} ({report['errors']} errors)",
+            f"elapsed            : {report['elapsed_s']:.2f} s",
+            f"throughput         : {report['throughput_rps']:.2f} runs/s",
+            f"latency p50/p95/p99: {latency['p50']:.3f} / {latency['p95']:.3f} / {latency['p99']:.3f} s",
+            f"latency mean/max   : {latency['mean']:.3f} / {latency['max']:.3f} s",
+            f"peak traced memory : {report['peak_memory_mib']:.1f} MiB",
+            f"search calls       : {report['search_calls']} "
+            f"(max {report['max_searches_in_flight']} in flight, "
+            f"{report['throttled_searches']} throttled)",
+        ]
+    )
+
+
+def main() -> None:
+    """Run the load test command line."""
+    parser = argparse.ArgumentParser(
+        description="Offline load test of the research graph."
+    )
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--search-latency", default="lognormal:1.5,0.5")
+    parser.add_argument("--llm-latency", default="lognormal:0.8,0.4")
+    parser.add_argument("--num-sources", type=int, default=5)
+    parser.add_argument(
+        "--search-capacity",
+        type=int,
+        default=None,
+        help="Concurrent searches above which the fake API answers 429.",
+    )
+    parser.add_argument(
+        "--model-latency",
+        nargs="*",
+        default=[],
+        metavar="MODEL=SPEC",
+        help="Latency of a specific model's calls, e.g. gemini-2.5-pro=lognormal:3,0.4.",
+    )
+    parser.add_argument("--initial-queries", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--research-loops", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--search-cache", action="store_true")
+    parser.add_argument(
+        "--answer-cache",
+        action="store_true",
+        help="Serve repeated questions from the answer cache.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--configurable",
+        type=json.loads,
+        default={},
+        help="JSON object of extra Configuration values for every run.",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the raw report.")
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        runs=args.runs,
+        concurrency=args.concurrency,
+        search_latency=args.search_latency,
+        llm_latency=args.llm_latency,
+        num_sources=args.num_sources,
+        search_capacity=args.search_capacity,
+        model_latency=dict(spec.split("=", 1) for spec in args.model_latency),
+        initial_queries=args.initial_queries,
+        research_loops=args.research_loops,
+        search_cache=args.search_cache,
+        answer_cache=args.answer_cache,
+        seed=args.seed,
+        configurable=args.configurable,
+    )
+    report = asyncio.run(run_load_test(config))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
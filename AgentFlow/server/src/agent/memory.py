@@ -0,0 +1,126 @@
+"""Compaction of research results into a digest that fits the prompt token budgets."""
+
+import re
+from typing import Iterable, List, Set, TypedDict
+
+# A sentence ends at ".", "!" or "?" followed by whitespace, together with the
+# citation markers attached right after it, or at a line break.
+_SENTENCE_END = re.compile(r"[.!?](?:[ \t]+\[[^\]\n]*\]\([^)\s]*\))*(?=\s|$)|\n")
+_CITATION = re.compile(r"\s*\[[^\]\n]*\]\([^)\s]*\)")
+# Roughly one token per punctuation mark and per four characters of a word,
+# which slightly overestimates Gemini's SentencePiece token counts.
+_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class DigestEntry(TypedDict):
+    """A digest entry: the compacted text of a research result and its token count."""
+
+    text: str
+    tokens: int
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text without calling the API."""
+    return len(_TOKEN.findall(text))
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, keeping citation markers with their sentence."""
+    sentences, start = [], 0
+    for match in _SENTENCE_END.finditer(text):
+        sentence = text[start : match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(_CITATION.sub("", sentence).lower().split())
+
+
+def compact_results(
+    results: Iterable[str], digest: Iterable[DigestEntry]
+) -> List[DigestEntry]:
+    """Compact new web research results into digest entries.
+
+    Sentences already present in the digest, or earlier in the new results,
+    are dropped; every kept sentence keeps its citation markers.
+
+    Args:
+        results: The web research results that are not in the digest yet.
+        digest: The existing digest entries.
+
+    Returns:
+        One digest entry per result that still has new content.
+    """
+    seen: Set[str] = {
+        _sentence_key(sentence)
+        for entry in digest
+        for sentence in split_sentences(entry["text"])
+    }
+    entries: List[DigestEntry] = []
+    for result in results:
+        kept = []
+        for sentence in split_sentences(result):
+            key = _sentence_key(sentence)
+            if key and key not in seen:
+                seen.add(key)
+                kept.append(sentence)
+        if kept:
+            text = " ".join(kept)
+            entries.append({"text": text, "tokens": count_tokens(text)})
+    return entries
+
+
+def _trim(text: str, budget: int) -> str:
+    # Cited sentences are kept first, then uncited ones, in their original order.
+    sentences = split_sentences(text)
+    costs = [count_tokens(sentence) + 1 for sentence in sentences]
+    keep = [False] * len(sentences)
+    remaining = budget
+    for cited in (True, False):
+        for i, sentence in enumerate(sentences):
+            is_cited = _CITATION.search(sentence) is not None
+            if not keep[i] and is_cited == cited and costs[i] <= remaining:
+                keep[i] = True
+                remaining -= costs[i]
+    return " ".join(sentence for sentence, kept in zip(sentences, keep) if kept)
+
+
+def fit_to_budget(entries: List[DigestEntry], budget: int) -> List[str]:
+    """Return the digest texts, trimmed so that together they fit in `budget` tokens.
+
+    Every entry gets a fair share of the budget: entries smaller than their
+    share are kept whole and their unused share goes to the larger ones,
+    which are trimmed at sentence boundaries.
+
+    Args:
+        entries: The digest entries, in order.
+        budget: The token budget for all entries. 0 disables trimming.
+
+    Returns:
+        The texts to put in the prompt, in the order of the entries.
+    """
+    if budget <= 0 or sum(entry["tokens"] for entry in entries) <= budget:
+        return [entry["text"] for entry in entries]
+
+    shares = [0] * len(entries)
+    remaining = budget
+    order = sorted(range(len(entries)), key=lambda i: entries[i]["tokens"])
+    for position, index in enumerate(order):
+        fair = remaining // (len(entries) - position)
+        shares[index] = min(entries[index]["tokens"], fair)
+        remaining -= shares[index]
+
+    texts = []
+    for entry, share in zip(entries, shares):
+        text = (
+            entry["text"] if share >= entry["tokens"] else _trim(entry["text"], share)
+        )
+        if text:
+            texts.append(text)
+    return texts
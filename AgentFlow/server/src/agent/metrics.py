@@ -0,0 +1,398 @@
+"""In-process metrics and per-run traces of graph nodes."""
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tracers.context import register_configure_hook
+
+from agent.limits import get_run_key
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = (*labels, *extra)
+    if not items:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in items
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """In-process counters, gauges and histograms rendered in Prometheus text format."""
+
+    def __init__(self):
+        """Create an empty registry."""
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def _declare(self, name: str, kind: str, help_text: str) -> None:
+        self._help.setdefault(name, (kind, help_text))
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, help_text: str, value: float = 1, **labels: Any) -> None:
+        """Increase a counter."""
+        with self._lock:
+            self._declare(name, "counter", help_text)
+            series = self._counters.setdefault(name, {})
+            key = self._labels(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, help_text: str, value: float, **labels: Any) -> None:
+        """Set a gauge."""
+        with self._lock:
+            self._declare(name, "gauge", help_text)
+            self._gauges.setdefault(name, {})[self._labels(labels)] = value
+
+    def observe(
+        self,
+        name: str,
+        help_text: str,
+        value: float,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        **labels: Any,
+    ) -> None:
+        """Record an observation in a histogram."""
+        with self._lock:
+            self._declare(name, "histogram", help_text)
+            buckets = self._buckets.setdefault(name, buckets)
+            series = self._histograms.setdefault(name, {})
+            key = self._labels(labels)
+            if key not in series:
+                series[key] = _Histogram(buckets)
+            series[key].observe(value)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, (kind, help_text) in sorted(self._help.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for labels, histogram in sorted(self._histograms[name].items()):
+                        cumulative = 0
+                        for bound, count in zip(
+                            (*histogram.buckets, math.inf), histogram.counts
+                        ):
+                            cumulative += count
+                            le = (("le", _format_value(bound)),)
+                            lines.append(
+                                f"{name}_bucket{_format_labels(labels, le)} {cumulative}"
+                            )
+                        lines.append(
+                            f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}"
+                        )
+                        lines.append(
+                            f"{name}_count{_format_labels(labels)} {histogram.count}"
+                        )
+                else:
+                    series = self._counters if kind == "counter" else self._gauges
+                    for labels, value in sorted(series[name].items()):
+                        lines.append(
+                            f"{name}{_format_labels(labels)} {_format_value(value)}"
+                        )
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class NodeSpan:
+    """Measurements of a single node execution."""
+
+    node: str
+    run_key: str
+    started_at: float
+    duration: float = 0.0
+    queue_wait: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = 0
+    cache_hit: bool | None = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class RunTraces:
+    """Per-run lists of node spans, with summaries of the most recent runs.
+
+    Runs still in progress are kept in a bounded LRU so runs that never reach
+    `finalize_answer` cannot grow memory without limit.
+    """
+
+    def __init__(self, max_active: int = 1000, max_finished: int = 200):
+        """Create empty traces keeping at most the given active and finished runs."""
+        self._lock = threading.Lock()
+        self._active: OrderedDict[str, List[NodeSpan]] = OrderedDict()
+        self._finished: deque[Dict[str, Any]] = deque(maxlen=max_finished)
+        self._max_active = max_active
+
+    def add(self, span: NodeSpan) -> None:
+        """Add the span of a node execution to its run."""
+        with self._lock:
+            spans = self._active.setdefault(span.run_key, [])
+            self._active.move_to_end(span.run_key)
+            spans.append(span)
+            while len(self._active) > self._max_active:
+                self._active.popitem(last=False)
+
+    def finish(self, run_key: str) -> Dict[str, Any] | None:
+        """Close the trace of a run and return its summary."""
+        with self._lock:
+            spans = self._active.pop(run_key, None)
+            if spans is None:
+                return None
+            summary = summarize_run(run_key, spans)
+            self._finished.append(summary)
+            return summary
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Return the summaries of the most recently finished runs, newest first."""
+        with self._lock:
+            return list(reversed(self._finished))
+
+    def get(self, run_key: str) -> Dict[str, Any] | None:
+        """Return the summary of a finished or in-progress run."""
+        with self._lock:
+            if run_key in self._active:
+                return summarize_run(run_key, self._active[run_key], finished=False)
+            for summary in self._finished:
+                if summary["run_id"] == run_key:
+                    return summary
+        return None
+
+
+def summarize_run(
+    run_key: str, spans: List[NodeSpan], finished: bool = True
+) -> Dict[str, Any]:
+    """Aggregate the spans of one run into a trace summary."""
+    started = min(span.started_at for span in spans)
+    ended = max(span.started_at + span.duration for span in spans)
+    research = [span for span in spans if span.node == "web_research"]
+    slowest = max(research, key=lambda span: span.duration, default=None)
+    return {
+        "run_id": run_key,
+        "finished": finished,
+        "wall_time": round(ended - started, 4),
+        "prompt_tokens": sum(span.prompt_tokens for span in spans),
+        "completion_tokens": sum(span.completion_tokens for span in spans),
+        "retries": sum(span.retries for span in spans),
+        "research_branches": len(research),
+        "cache_hits": sum(1 for span in research if span.cache_hit),
+        "slowest_branch": asdict(slowest) if slowest else None,
+        "spans": [asdict(span) for span in spans],
+    }
+
+
+metrics_registry = MetricsRegistry()
+run_traces = RunTraces()
+
+_current_span: ContextVar[NodeSpan | None] = ContextVar(
+    "agentflow_current_span", default=None
+)
+
+
+def current_span() -> NodeSpan | None:
+    """Return the span of the node executing in the current context, if any."""
+    return _current_span.get()
+
+
+def record_usage(prompt_tokens: int | None, completion_tokens: int | None) -> None:
+    """Add LLM token usage to the current node span."""
+    span = current_span()
+    if span is not None:
+        span.prompt_tokens += prompt_tokens or 0
+        span.completion_tokens += completion_tokens or 0
+
+
+def record_queue_wait(seconds: float) -> None:
+    """Add time spent waiting for a concurrency slot to the current node span."""
+    span = current_span()
+    if span is not None:
+        span.queue_wait += seconds
+
+
+def annotate_span(**values: Any) -> None:
+    """Set fields of the current node span; unknown names become span attributes."""
+    span = current_span()
+    if span is None:
+        return
+    for key, value in values.items():
+        if key in NodeSpan.__dataclass_fields__:
+            setattr(span, key, value)
+        else:
+            span.attributes[key] = value
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Attribute token usage and retries of LangChain model calls to a node span."""
+
+    run_inline = True
+
+    def __init__(self, span: NodeSpan):
+        """Create a handler adding to `span`."""
+        self.span = span
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        """Add the token usage of a finished call to the span."""
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    self.span.prompt_tokens += usage.get("input_tokens", 0)
+                    self.span.completion_tokens += usage.get("output_tokens", 0)
+
+    def on_retry(self, retry_state: Any, **kwargs: Any) -> None:
+        """Count a retry of a call in the span."""
+        self.span.retries += 1
+
+
+_usage_handler: ContextVar[UsageCallbackHandler | None] = ContextVar(
+    "agentflow_usage_handler", default=None
+)
+# Every callback manager configured while a node runs picks up its handler.
+register_configure_hook(_usage_handler, inheritable=True)
+
+
+def _record_span(span: NodeSpan) -> None:
+    labels = {"node": span.node}
+    metrics_registry.observe(
+        "agentflow_node_duration_seconds",
+        "Wall time of graph node executions.",
+        span.duration,
+        **labels,
+    )
+    metrics_registry.inc(
+        "agentflow_node_executions_total",
+        "Graph node executions by outcome.",
+        node=span.node,
+        status=span.status,
+    )
+    if span.queue_wait:
+        metrics_registry.observe(
+            "agentflow_node_queue_wait_seconds",
+            "Time graph nodes waited for a concurrency slot.",
+            span.queue_wait,
+            **labels,
+        )
+    for kind, tokens in (
+        ("prompt", span.prompt_tokens),
+        ("completion", span.completion_tokens),
+    ):
+        if tokens:
+            metrics_registry.inc(
+                "agentflow_llm_tokens_total",
+                "LLM tokens used by graph nodes.",
+                tokens,
+                node=span.node,
+                kind=kind,
+            )
+    if span.retries:
+        metrics_registry.inc(
+            "agentflow_llm_retries_total",
+            "Retried LLM calls by graph node.",
+            span.retries,
+            **labels,
+        )
+    if span.cache_hit is not None:
+        metrics_registry.inc(
+            "agentflow_search_cache_requests_total",
+            "Web research lookups by search cache outcome.",
+            result="hit" if span.cache_hit else "miss",
+        )
+
+
+def instrument_node(
+    name: str, finishes_run: bool | Callable[[Any], bool] = False
+) -> Callable:
+    """Decorate an async graph node to record a span of each of its executions.
+
+    Args:
+        name: The node name used as metric label.
+        finishes_run: Whether the node ends the run, closing its trace, or a
+            function of the node's state update telling whether it did.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(state: Any, config: RunnableConfig) -> Any:
+            span = NodeSpan(
+                node=name, run_key=get_run_key(config, state), started_at=time.time()
+            )
+            span_token = _current_span.set(span)
+            handler_token = _usage_handler.set(UsageCallbackHandler(span))
+            start = time.perf_counter()
+            finished = finishes_run is True
+            try:
+                update = await fn(state, config)
+                # The entry node generates the run key of runs without a run or thread id
+                if isinstance(update, dict) and update.get("run_key"):
+                    span.run_key = get_run_key(config, update)
+                if callable(finishes_run):
+                    finished = bool(finishes_run(update))
+                return update
+            except asyncio.CancelledError:
+                span.status = "cancelled"
+                raise
+            except BaseException:
+                span.status = "error"
+                raise
+            finally:
+                span.duration = time.perf_counter() - start
+                _usage_handler.reset(handler_token)
+                _current_span.reset(span_token)
+                _record_span(span)
+                run_traces.add(span)
+                if finished:
+                    run_traces.finish(span.run_key)
+
+        return wrapper
+
+    return decorator
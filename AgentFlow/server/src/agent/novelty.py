@@ -0,0 +1,82 @@
+"""Measures of how much new information a batch of research results adds."""
+
+import functools
+import re
+import zlib
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, List
+
+# Citation markers inserted by `web_research`, e.g. " [apnews](https://...)".
+_CITATION = re.compile(r"\s*\[([^\]\n]*)\]\([^)\s]*\)")
+_WORD = re.compile(r"\w+")
+
+
+@functools.lru_cache(maxsize=2048)
+def text_shingles(text: str, k: int = 3) -> FrozenSet[int]:
+    """Return the hashed word k-grams of a research result, ignoring citation markers."""
+    words = _WORD.findall(_CITATION.sub(" ", text).lower())
+    if len(words) < k:
+        return frozenset([zlib.crc32(" ".join(words).encode("utf-8"))] if words else [])
+    return frozenset(
+        zlib.crc32(" ".join(words[i : i + k]).encode("utf-8"))
+        for i in range(len(words) - k + 1)
+    )
+
+
+@functools.lru_cache(maxsize=2048)
+def cited_sources(text: str) -> FrozenSet[str]:
+    """Return the labels of the sources cited in a research result.
+
+    Labels name the site ("apnews"); the grounding redirect urls differ on
+    every search even for the same page, so they cannot tell new sources
+    from known ones.
+    """
+    return frozenset(label.lower() for label in _CITATION.findall(text) if label)
+
+
+def _union(sets: Iterable[FrozenSet]) -> set:
+    result: set = set()
+    for items in sets:
+        result |= items
+    return result
+
+
+def _novel_fraction(new: set, known: set) -> float:
+    return len(new - known) / len(new) if new else 0.0
+
+
+@dataclass
+class NoveltyReport:
+    """How much a batch of research results adds to the results before it.
+
+    Attributes:
+        text_novelty: Fraction of the batch's word 3-grams absent from earlier results.
+        source_novelty: Fraction of the batch's cited sites not cited before.
+        new_results: Number of results in the batch.
+    """
+
+    text_novelty: float
+    source_novelty: float
+    new_results: int
+
+    @property
+    def novelty(self) -> float:
+        """The marginal novelty of the batch: high if either new text or new sources came in."""
+        return max(self.text_novelty, self.source_novelty)
+
+
+def measure_novelty(previous: List[str], batch: List[str]) -> NoveltyReport:
+    """Measure the marginal novelty of `batch` given the `previous` research results.
+
+    Shingle and source sets are cached per result text, so measuring after
+    every loop only hashes the results of the latest batch.
+    """
+    known_text = _union(text_shingles(text) for text in previous)
+    known_sources = _union(cited_sources(text) for text in previous)
+    new_text = _union(text_shingles(text) for text in batch)
+    new_sources = _union(cited_sources(text) for text in batch)
+    return NoveltyReport(
+        text_novelty=_novel_fraction(new_text, known_text),
+        source_novelty=_novel_fraction(new_sources, known_sources),
+        new_results=len(batch),
+    )
@@ -6,15 +6,18 @@ def get_current_date():
     return datetime.now().strftime("%B %d, %Y")
 
 
-query_writer_instructions = """Your goal is to generate sophisticated and diverse web search queries. These queries are intended for an advanced automated web research tool capable of analyzing complex results, following links, and synthesizing information.
+# Every prompt is a static prefix, identical for all runs, followed by a dynamic
+# suffix holding the date, the research topic and the per-call values. Keeping
+# the long instructions in front lets provider prefix caches reuse them.
+query_writer_prefix = """Your goal is to generate sophisticated and diverse web search queries. These queries are intended for an advanced automated web research tool capable of analyzing complex results, following links, and synthesizing information.
 
 Instructions:
 - Always prefer a single search query, only add another query if the original question requests multiple aspects or elements and one query is not enough.
 - Each query should focus on one specific aspect of the original question.
-- Don't produce more than {number_queries} queries.
+- Don't produce more queries than the limit given below.
 - Queries should be diverse, if the topic is broad, generate more than 1 query.
 - Don't generate multiple similar queries, 1 is enough.
-- Query should ensure that the most current information is gathered. The current date is {current_date}.
+- Query should ensure that the most current information is gathered, as of the current date given below.
 
 Format: 
 - Format your response as a JSON object with ALL two of these exact keys:
@@ -30,24 +33,38 @@ Topic: What revenue grew more last year apple stock or the number of people buyi
     "query": ["Apple total revenue growth fiscal year 2024", "iPhone unit sales growth fiscal year 2024", "Apple stock price growth fiscal year 2024"],
 }}
 ```
+"""
+
+query_writer_suffix = """
+Limits:
+- Don't produce more than {number_queries} queries.
+- The current date is {current_date}.
 
 Context: {research_topic}"""
 
+query_writer_instructions = query_writer_prefix + query_writer_suffix
 
-web_searcher_instructions = """Conduct targeted Google Searches to gather the most recent, credible information on "{research_topic}" and synthesize it into a verifiable text artifact.
+
+web_searcher_prefix = """Conduct targeted Google Searches to gather the most recent, credible information on the research topic given below and synthesize it into a verifiable text artifact.
 
 Instructions:
-- Query should ensure that the most current information is gathered. The current date is {current_date}.
+- Query should ensure that the most current information is gathered, as of the current date given below.
 - Conduct multiple, diverse searches to gather comprehensive information.
 - Consolidate key findings while meticulously tracking the source(s) for each specific piece of information.
 - The output should be a well-written summary or report based on your search findings. 
 - Only include the information found in the search results, don't make up any information.
+"""
+
+web_searcher_suffix = """
+The current date is {current_date}.
 
 Research Topic:
 {research_topic}
 """
 
-reflection_instructions = """You are an expert research assistant analyzing summaries about "{research_topic}".
+web_searcher_instructions = web_searcher_prefix + web_searcher_suffix
+
+reflection_prefix = """You are an expert research assistant analyzing summaries about the research topic given below.
 
 Instructions:
 - Identify knowledge gaps or areas that need deeper exploration and generate a follow-up query. (1 or multiple).
@@ -73,24 +90,42 @@ Example:
 }}
 ```
 
-Reflect carefully on the Summaries to identify knowledge gaps and produce a follow-up query. Then, produce your output following this JSON format:
+Reflect carefully on the Summaries to identify knowledge gaps and produce a follow-up query. Then, produce your output following this JSON format.
+"""
+
+reflection_suffix = """
+Research Topic:
+{research_topic}
 
 Summaries:
 {summaries}
 """
 
-answer_instructions = """Generate a high-quality answer to the user's question based on the provided summaries.
+reflection_instructions = reflection_prefix + reflection_suffix
+
+reflection_triage_prefix = reflection_prefix + """
+Also rate your confidence in this assessment:
+- "confidence": A number from 0 to 1. Use a high value only when the summaries clearly answer the research topic, or when a specific gap clearly remains. Use a low value when you are unsure whether the summaries are sufficient.
+"""
+
+answer_prefix = """Generate a high-quality answer to the user's question based on the provided summaries.
 
 Instructions:
-- The current date is {current_date}.
+- Take the current date given below into account.
 - You are the final step of a multi-step research process, don't mention that you are the final step. 
 - You have access to all the information gathered from the previous steps.
 - You have access to the user's question.
 - Generate a high-quality answer to the user's question based on the provided summaries and the user's question.
 - Include the sources you used from the Summaries in the answer correctly, use markdown format (e.g. [apnews](https://vertexaisearch.cloud.google.com/id/1-0)). THIS IS A MUST.
+"""
+
+answer_suffix = """
+The current date is {current_date}.
 
 User Context:
 - {research_topic}
 
 Summaries:
-{summaries}"""
\ No newline at end of file
+{summaries}"""
+
+answer_instructions = answer_prefix + answer_suffix
@@ -0,0 +1,130 @@
+"""Quorum joins of research branches: continue once enough searches have returned."""
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Set, Tuple
+
+
+def quorum_size(total: int, fraction: float) -> int:
+    """Return how many of `total` searches make a quorum, at least one."""
+    if total <= 0:
+        return 0
+    return min(total, max(1, math.ceil(total * fraction)))
+
+
+async def quorum_wait(
+    tasks: Set[asyncio.Task],
+    quorum: int,
+    deadline_seconds: float | None = None,
+    extra: Set[asyncio.Task] | None = None,
+) -> Tuple[Set[asyncio.Task], Set[asyncio.Task]]:
+    """Wait until `quorum` of `tasks` are done, or until the deadline passes.
+
+    At least one of `tasks` is always awaited, even past the deadline, so a
+    loop never ends without any result. `extra` tasks are awaited alongside
+    but do not count towards the quorum.
+
+    Args:
+        tasks: The tasks making up the quorum.
+        quorum: How many of `tasks` must be done.
+        deadline_seconds: Seconds after which the wait ends with any number
+            of done tasks; None or 0 waits for the quorum.
+        extra: Further tasks that are collected if they finish in time.
+
+    Returns:
+        The done and the still pending tasks, `extra` ones included.
+    """
+    started = time.monotonic()
+    pending = set(tasks) | set(extra or ())
+    done: Set[asyncio.Task] = set()
+    while pending and len(done & tasks) < quorum:
+        timeout = None
+        if deadline_seconds:
+            remaining = deadline_seconds - (time.monotonic() - started)
+            if remaining <= 0 and done & tasks:
+                break
+            if remaining > 0:
+                timeout = remaining
+        finished, pending = await asyncio.wait(
+            pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        done |= finished
+    return done, pending
+
+
+class ParkedSearches:
+    """Searches of a run still running after their loop's quorum was reached.
+
+    Their results are folded into the run's next research loop, or the
+    searches are cancelled when the run finalizes its answer. At most
+    `max_runs` runs keep parked searches; the searches of older runs are
+    cancelled when newer ones park theirs.
+    """
+
+    def __init__(self, max_runs: int = 1000):
+        """Create an empty registry keeping the searches of at most `max_runs` runs."""
+        self._lock = threading.Lock()
+        self._runs: OrderedDict[str, Set[asyncio.Task]] = OrderedDict()
+        self._max_runs = max_runs
+
+    def park(self, run_key: str, tasks: Set[asyncio.Task]) -> None:
+        """Keep the still running searches of a run until it collects them."""
+        evicted: List[asyncio.Task] = []
+        with self._lock:
+            parked = self._runs.setdefault(run_key, set())
+            parked |= tasks
+            self._runs.move_to_end(run_key)
+            while len(self._runs) > self._max_runs:
+                _, old = self._runs.popitem(last=False)
+                evicted.extend(old)
+        for task in evicted:
+            task.cancel()
+
+    def take(self, run_key: str) -> Set[asyncio.Task]:
+        """Remove and return the parked searches of a run."""
+        with self._lock:
+            return self._runs.pop(run_key, set())
+
+    def cancel(self, run_key: str) -> int:
+        """Cancel the parked searches of a run and return how many were still running."""
+        cancelled = 0
+        for task in self.take(run_key):
+            if not task.done():
+                task.cancel()
+                cancelled += 1
+            elif not task.cancelled():
+                # Mark a failure nobody will collect as retrieved.
+                task.exception()
+        return cancelled
+
+
+parked_searches = ParkedSearches()
+
+
+def task_results(tasks: Set[asyncio.Task]) -> List[Any]:
+    """Return the results of done tasks ordered by their branch id, raising the first failure.
+
+    Each task is expected to carry its branch id as the `branch_id` attribute.
+    """
+    ordered = sorted(tasks, key=lambda task: getattr(task, "branch_id", 0))
+    results: List[Any] = []
+    for task in ordered:
+        if task.cancelled():
+            continue
+        exception = task.exception()
+        if exception is not None:
+            raise exception
+        results.append(task.result())
+    return results
+
+
+def merge_updates(updates: List[Dict[str, list]]) -> Dict[str, list]:
+    """Concatenate the list values of several state updates, like the `operator.add` reducers."""
+    merged: Dict[str, list] = {}
+    for update in updates:
+        for key, value in update.items():
+            merged.setdefault(key, []).extend(value)
+    return merged
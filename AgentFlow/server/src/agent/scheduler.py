@@ -0,0 +1,394 @@
+"""Scheduling of Gemini calls under per-model rate and concurrency limits."""
+
+import asyncio
+import functools
+import random
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict
+
+from agent.configuration import Configuration
+from agent.coordination import get_coordinator
+from agent.metrics import metrics_registry, record_queue_wait
+
+# Relative share of dispatches each lane gets while both have waiting calls.
+LANES = {"interactive": 4, "batch": 1}
+
+# Requests per minute of the paid Gemini API tier 1, used unless overridden
+# through `model_requests_per_minute`. Models not listed are not rate limited.
+DEFAULT_REQUESTS_PER_MINUTE = {
+    "gemini-2.0-flash": 2000,
+    "gemini-2.5-flash": 1000,
+    "gemini-2.5-pro": 150,
+}
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """Return whether an exception reports that the provider throttled the call."""
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if code == 429:
+        return True
+    text = str(exc)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text
+
+
+@functools.lru_cache(maxsize=32)
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """Parse "model=rpm,model=rpm" overrides on top of the default per-model limits."""
+    limits: Dict[str, float] = dict(DEFAULT_REQUESTS_PER_MINUTE)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, rpm = item.partition("=")
+        limits[model.strip()] = float(rpm)
+    return limits
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`.
+
+    A `rate` of 0 or less disables the limit.
+    """
+
+    def __init__(
+        self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic
+    ):
+        """Create a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def reserve(self) -> float:
+        """Take a token if one is available.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one is available.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = self._clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdaptiveLimit:
+    """Concurrency limit adjusted by additive increase, multiplicative decrease.
+
+    The limit grows by one per `limit` successful calls, drops to half the
+    calls still in flight when the provider throttles a call, and shrinks by 10% while the recent latency
+    is well above its long-run average, a sign of queueing upstream.
+    Decreases are spaced by one typical call latency, at least `min_cooldown`
+    seconds, so the errors of calls started under the same limit count once.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        minimum: int = 1,
+        latency_tolerance: float = 2.0,
+        min_cooldown: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a limit starting at `maximum`."""
+        self.maximum = maximum
+        self.minimum = minimum
+        self.value = float(maximum)
+        self.latency_tolerance = latency_tolerance
+        self.min_cooldown = min_cooldown
+        self._clock = clock
+        self._last_decrease = float("-inf")
+        self._short_latency: float | None = None
+        self._long_latency: float | None = None
+
+    @property
+    def latency(self) -> float:
+        """The long-run average latency of successful calls, 0 before the first one."""
+        return self._long_latency or 0.0
+
+    def _decrease(self, factor: float) -> None:
+        now = self._clock()
+        if now - self._last_decrease >= max(
+            self.min_cooldown, self._short_latency or 0.0
+        ):
+            self.value = max(self.minimum, self.value * factor)
+            self._last_decrease = now
+
+    def on_success(self, latency: float) -> None:
+        """Adjust the limit after a call that succeeded in `latency` seconds."""
+        if self._short_latency is None:
+            self._short_latency = self._long_latency = latency
+        else:
+            self._short_latency += 0.3 * (latency - self._short_latency)
+            self._long_latency += 0.02 * (latency - self._long_latency)
+        if self._short_latency > self.latency_tolerance * self._long_latency:
+            self._decrease(0.9)
+        elif self.value < self.maximum:
+            self.value = min(self.maximum, self.value + 1 / self.value)
+
+    def on_overload(self, in_flight: int) -> None:
+        """Decrease the limit after the provider throttled a call."""
+        # The calls still running are what the provider accepts right now.
+        # Clamping to them stops freed slots from being refilled at once.
+        self.value = max(self.minimum, min(self.value, float(in_flight)))
+        self._decrease(0.5)
+
+    def set_maximum(self, maximum: int) -> None:
+        """Change the upper bound of the limit."""
+        self.maximum = maximum
+        self.value = min(self.value, maximum)
+
+
+class _ModelQueue:
+    def __init__(self, model: str, rate: float, max_concurrency: int):
+        self.model = model
+        self.bucket = TokenBucket(rate, capacity=max(1.0, rate))
+        self.limit = AdaptiveLimit(max_concurrency)
+        self.in_flight = 0
+        self.lanes: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self.credit = {lane: 0 for lane in LANES}
+        self.timer: asyncio.TimerHandle | None = None
+
+
+class ModelScheduler:
+    """Process-wide scheduler that every Gemini call of the graph goes through.
+
+    Each model gets a token bucket holding its requests per minute, with a
+    burst of one second of requests, and an adaptive concurrency limit. Calls
+    wait in one queue per priority lane. Free slots are handed out by smooth
+    weighted round robin over the lanes, so interactive runs overtake batch
+    runs without starving them. Queues hold futures and timers of the event
+    loop they were created on, so each loop gets its own, e.g. across
+    repeated `asyncio.run` calls.
+    """
+
+    def __init__(self):
+        """Create a scheduler without any queue."""
+        self._loops: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, Dict[str, _ModelQueue]
+        ] = weakref.WeakKeyDictionary()
+
+    @property
+    def _queues(self) -> Dict[str, _ModelQueue]:
+        loop = asyncio.get_running_loop()
+        queues = self._loops.get(loop)
+        if queues is None:
+            queues = self._loops[loop] = {}
+        return queues
+
+    def _queue(
+        self, model: str, requests_per_minute: float, max_concurrency: int
+    ) -> _ModelQueue:
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = _ModelQueue(model, requests_per_minute / 60, max_concurrency)
+            self._queues[model] = queue
+        else:
+            if queue.bucket.rate != requests_per_minute / 60:
+                queue.bucket.rate = requests_per_minute / 60
+                queue.bucket.capacity = max(1.0, queue.bucket.rate)
+            if queue.limit.maximum != max_concurrency:
+                queue.limit.set_maximum(max_concurrency)
+        return queue
+
+    def _next_lane(self, queue: _ModelQueue) -> str | None:
+        waiting = []
+        for lane, waiters in queue.lanes.items():
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if waiters:
+                waiting.append(lane)
+        if not waiting:
+            return None
+        total = sum(LANES[lane] for lane in waiting)
+        for lane in waiting:
+            queue.credit[lane] += LANES[lane]
+        lane = max(waiting, key=lambda name: queue.credit[name])
+        queue.credit[lane] -= total
+        return lane
+
+    def _dispatch(self, queue: _ModelQueue) -> None:
+        while queue.in_flight < max(1, int(queue.limit.value)):
+            if not any(queue.lanes.values()):
+                break
+            wait = queue.bucket.reserve()
+            if wait > 0:
+                if queue.timer is None:
+                    queue.timer = asyncio.get_running_loop().call_later(
+                        wait, self._on_timer, queue
+                    )
+                break
+            lane = self._next_lane(queue)
+            if lane is None:
+                # Only cancelled waiters were left; give the token back.
+                queue.bucket.tokens += 1
+                break
+            queue.lanes[lane].popleft().set_result(None)
+            queue.in_flight += 1
+        self._publish(queue)
+
+    def _on_timer(self, queue: _ModelQueue) -> None:
+        queue.timer = None
+        self._dispatch(queue)
+
+    def _release(self, queue: _ModelQueue) -> None:
+        queue.in_flight -= 1
+        self._dispatch(queue)
+
+    def _publish(self, queue: _ModelQueue) -> None:
+        for lane, waiters in queue.lanes.items():
+            metrics_registry.set(
+                "agentflow_scheduler_queue_depth",
+                "Gemini calls waiting for the scheduler, by model and lane.",
+                sum(1 for waiter in waiters if not waiter.done()),
+                model=queue.model,
+                lane=lane,
+            )
+        metrics_registry.set(
+            "agentflow_scheduler_in_flight",
+            "Gemini calls currently running, by model.",
+            queue.in_flight,
+            model=queue.model,
+        )
+        metrics_registry.set(
+            "agentflow_scheduler_concurrency_limit",
+            "Current adaptive concurrency limit, by model.",
+            round(queue.limit.value, 2),
+            model=queue.model,
+        )
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        model: str,
+        lane: str = "interactive",
+        requests_per_minute: float = 0,
+        max_concurrency: int = 32,
+        admit: Callable[[], Awaitable[None]] | None = None,
+    ) -> AsyncIterator[None]:
+        """Hold a scheduled slot of `model` for the duration of the block.
+
+        The block's outcome feeds the adaptive limit: throttling errors shrink
+        it and successful calls grow it back.
+
+        Args:
+            model: The Gemini model called in the block.
+            lane: The priority lane of the call, one of `LANES`.
+            requests_per_minute: The model's rate limit; 0 disables it.
+            max_concurrency: The upper bound of the model's concurrency limit.
+            admit: Awaited before the call is queued, e.g. to wait for a
+                cluster-wide rate limit.
+        """
+        if lane not in LANES:
+            raise ValueError(f"Unknown scheduling lane: {lane}")
+        if admit is not None:
+            await admit()
+        queue = self._queue(model, requests_per_minute, max_concurrency)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.lanes[lane].append(waiter)
+        queued_at = time.perf_counter()
+        self._dispatch(queue)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just before the caller was cancelled.
+                self._release(queue)
+            else:
+                self._publish(queue)
+            raise
+        waited = time.perf_counter() - queued_at
+        record_queue_wait(waited)
+        metrics_registry.observe(
+            "agentflow_scheduler_wait_seconds",
+            "Time Gemini calls waited for the scheduler, by model and lane.",
+            waited,
+            model=model,
+            lane=lane,
+        )
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as exc:
+            if is_rate_limit_error(exc):
+                queue.limit.on_overload(queue.in_flight - 1)
+                # Hold back the model's next calls for one refill interval.
+                queue.bucket.tokens = min(queue.bucket.tokens, 0.0)
+                metrics_registry.inc(
+                    "agentflow_scheduler_rate_limited_total",
+                    "Gemini calls throttled by the provider, by model.",
+                    model=model,
+                )
+            raise
+        else:
+            queue.limit.on_success(time.perf_counter() - started)
+        finally:
+            self._release(queue)
+
+    async def call(
+        self,
+        model: str,
+        fn: Callable[[], Awaitable[Any]],
+        retries: int = 2,
+        **slot_kwargs: Any,
+    ) -> Any:
+        """Await `fn()` in a scheduled slot of `model`, re-queueing throttled calls.
+
+        A throttled call goes back to the end of its lane, behind the reduced
+        concurrency limit, up to `retries` times before its error is raised.
+        Re-queued calls first wait a random fraction of the model's typical
+        latency so they do not all come back at once.
+        """
+        for attempt in range(retries + 1):
+            try:
+                async with self.slot(model, **slot_kwargs):
+                    return await fn()
+            except Exception as exc:
+                if attempt == retries or not is_rate_limit_error(exc):
+                    raise
+            queue = self._queues[model]
+            await asyncio.sleep(random.uniform(0, max(queue.limit.latency, 0.05)))
+
+
+model_scheduler = ModelScheduler()
+
+
+def _slot_kwargs(model: str, configurable: Configuration) -> Dict[str, Any]:
+    requests_per_minute = parse_rate_limits(configurable.model_requests_per_minute).get(
+        model, 0
+    )
+    # With a coordinator, the rate limit also holds across all replicas.
+    coordinator = get_coordinator(configurable.coordination_redis_url)
+    admit = None
+    if coordinator is not None and requests_per_minute > 0:
+        admit = functools.partial(coordinator.admit, model, requests_per_minute)
+    return {
+        "lane": configurable.scheduling_lane,
+        "requests_per_minute": requests_per_minute,
+        "max_concurrency": configurable.max_concurrent_model_calls,
+        "admit": admit,
+    }
+
+
+def schedule(model: str, configurable: Configuration):
+    """Return a scheduled slot of `model` for a call made with the given configuration."""
+    return model_scheduler.slot(model, **_slot_kwargs(model, configurable))
+
+
+async def call_scheduled(
+    model: str,
+    configurable: Configuration,
+    fn: Callable[[], Awaitable[Any]],
+    retries: int = 2,
+) -> Any:
+    """Await `fn()` through the scheduler, retrying it when the provider throttles it."""
+    return await model_scheduler.call(
+        model, fn, retries=retries, **_slot_kwargs(model, configurable)
+    )
@@ -0,0 +1,206 @@
+"""Cache of search-grounded responses shared by runs, with single-flight fetches."""
+
+import asyncio
+import hashlib
+import logging
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict
+
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share a cache entry."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?.!")
+
+
+def cache_key(query: str, model: str, date_bucket: str) -> str:
+    """Return the cache key of a grounded search."""
+    raw = "\x1f".join((normalize_query(query), model, date_bucket))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def dump_response(response: types.GenerateContentResponse) -> str:
+    """Serialize what web_research reads of a response: its text and grounding metadata."""
+    candidate = response.candidates[0]
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=candidate.content,
+                grounding_metadata=candidate.grounding_metadata,
+            )
+        ]
+    ).model_dump_json(exclude_none=True)
+
+
+def load_response(payload: str | bytes) -> types.GenerateContentResponse:
+    """Deserialize a response stored by `dump_response`."""
+    return types.GenerateContentResponse.model_validate_json(payload)
+
+
+class FetchAbandoned(Exception):
+    """Raised to the callers waiting on a shared fetch whose own caller was cancelled."""
+
+
+def abandon(future: asyncio.Future) -> None:
+    """Release the waiters of a shared fetch whose caller was cancelled, so they retry.
+
+    Cancelling the future instead would cancel the waiters, which may belong
+    to other runs than the cancelled caller.
+    """
+    future.set_exception(FetchAbandoned())
+    # Mark the exception retrieved when nobody else was waiting.
+    future.exception()
+
+
+class SearchCache:
+    """SQLite-backed cache of search-grounded responses with single-flight.
+
+    Entries expire `ttl_seconds` after they were written, and the least
+    recently read entries are evicted once more than `max_entries` are stored.
+    Concurrent lookups of the same key that miss the cache share a single
+    upstream call.
+
+    Responses are stored without their citation markers, so hits replay
+    through `resolve_urls` and `get_citations` and get short urls matching the
+    id of the branch that reads them.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 86400, max_entries: int = 10000):
+        """Open the cache database at `path`, creating it if needed."""
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        if path != ":memory:":
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS search_cache_accessed_at "
+                "ON search_cache (accessed_at)"
+            )
+
+    def get(self, key: str) -> types.GenerateContentResponse | None:
+        """Return the cached response for `key`, or None if missing or expired."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return load_response(row[0])
+
+    def put(self, key: str, response: types.GenerateContentResponse) -> None:
+        """Store a response, evicting expired and least recently used entries."""
+        now = time.time()
+        payload = dump_response(response)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM search_cache WHERE created_at < ?",
+                (now - self.ttl_seconds,),
+            )
+            self._conn.execute(
+                """DELETE FROM search_cache WHERE key IN (
+                    SELECT key FROM search_cache ORDER BY accessed_at DESC
+                    LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,),
+            )
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[types.GenerateContentResponse]],
+    ) -> types.GenerateContentResponse:
+        """Return the cached response for `key`, calling `fetch` at most once on a miss.
+
+        Callers arriving while a fetch for the same key is running wait for
+        its result instead of issuing their own call. Failures are not cached
+        and are raised to every waiting caller. If the caller running the fetch
+        is cancelled, the waiting callers are not: one of them takes it over.
+        """
+        while True:
+            pending = self._in_flight.get(key)
+            if pending is None:
+                cached = await asyncio.to_thread(self.get, key)
+                if cached is not None:
+                    return cached
+                pending = self._in_flight.get(key)
+            if pending is None:
+                return await self._fetch(key, fetch)
+            try:
+                return await asyncio.shield(pending)
+            except FetchAbandoned:
+                continue
+
+    async def _fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[types.GenerateContentResponse]],
+    ) -> types.GenerateContentResponse:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await fetch()
+        except asyncio.CancelledError:
+            abandon(future)
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark the exception retrieved when nobody else was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(response)
+            # The search succeeded: failing to store it must not lose it.
+            try:
+                await asyncio.to_thread(self.put, key, response)
+            except Exception as exc:
+                logger.warning("Could not cache the search result of %s: %s", key, exc)
+            return response
+        finally:
+            del self._in_flight[key]
+
+
+_caches: Dict[str, SearchCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_search_cache(path: str, ttl_seconds: int, max_entries: int) -> SearchCache:
+    """Return the process-wide cache stored at `path`, creating it on first use."""
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = SearchCache(path, ttl_seconds, max_entries)
+        cache.ttl_seconds = ttl_seconds
+        cache.max_entries = max_entries
+        return cache
@@ -0,0 +1,278 @@
+"""Index of earlier research results of a thread, searched before the web."""
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.runnables import RunnableConfig
+
+from agent.answer_cache import get_embedder, parse_run_date
+from agent.dedupe import content_words
+from agent.memory import split_sentences
+
+# Markdown links inserted as citation markers by `web_research`.
+_LINK = re.compile(r"\]\(([^)\s]+)\)")
+# Words are compared by their first letters, so "rates" covers "rate".
+_STEM = 5
+
+
+def get_thread_key(config: RunnableConfig | None) -> str | None:
+    """Return the thread id of a run, or None for runs outside of a thread."""
+    if not config:
+        return None
+    for values in (config.get("configurable") or {}, config.get("metadata") or {}):
+        if values.get("thread_id"):
+            return str(values["thread_id"])
+    return None
+
+
+def stems(text: str) -> frozenset:
+    """Return the stems of the content words of a text."""
+    return frozenset(word[:_STEM] for word in content_words(text))
+
+
+def chunk_result(text: str, max_chars: int = 600) -> List[str]:
+    """Split a research result into chunks of whole sentences with their citation markers."""
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for sentence in split_sentences(text):
+        if current and size + len(sentence) > max_chars:
+            chunks.append(" ".join(current))
+            current, size = [], 0
+        current.append(sentence)
+        size += len(sentence) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+@dataclass
+class IndexedChunk:
+    """A chunk of an earlier research result and the sources it cites.
+
+    Attributes:
+        text: The chunk, with citation markers pointing at the short urls of `sources`.
+        sources: The sources cited by the chunk, as in `sources_gathered`.
+        run_date: The date of the run that researched the chunk.
+        stems: The stems of the chunk's content words, used to measure query coverage.
+    """
+
+    text: str
+    sources: List[Dict[str, Any]]
+    run_date: str
+    stems: frozenset
+
+
+def chunk_research(
+    results: Sequence[str], sources: Sequence[Dict[str, Any]], run_date: str
+) -> List[IndexedChunk]:
+    """Split research results into chunks, each with the sources its citation markers point at."""
+    by_short_url = {source["short_url"]: source for source in sources}
+    chunks = []
+    for result in results:
+        for text in chunk_result(result):
+            cited = [
+                by_short_url[url]
+                for url in dict.fromkeys(_LINK.findall(text))
+                if url in by_short_url
+            ]
+            chunks.append(IndexedChunk(text, cited, run_date, stems(text)))
+    return chunks
+
+
+def relabel(chunk: IndexedChunk, branch_id: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """Return the text and sources of a chunk with short urls of a new branch id.
+
+    Retrieved chunks keep the short urls of the run that researched them,
+    which may clash with the short urls of the current run's searches.
+    """
+    text, sources = chunk.text, []
+    for idx, source in enumerate(chunk.sources):
+        short_url = source["short_url"].rsplit("/", 1)[0] + f"/{branch_id}-{idx}"
+        text = text.replace(f"({source['short_url']})", f"({short_url})")
+        sources.append({**source, "short_url": short_url})
+    return text, sources
+
+
+class SourceIndex:
+    """Flat NumPy vector index of research result chunks.
+
+    Chunks are keyed by their text, so results seen again are indexed once.
+    Beyond `max_chunks` the oldest chunks are dropped.
+    """
+
+    def __init__(
+        self, embed: Callable[[List[str]], np.ndarray], max_chunks: int = 5000
+    ):
+        """Create an empty index of the chunks embedded by `embed`."""
+        self.embed = embed
+        self.max_chunks = max_chunks
+        self._lock = threading.Lock()
+        self._vectors: np.ndarray | None = None
+        self._size = 0
+        self._chunks: List[IndexedChunk | None] = []
+        self._rows: OrderedDict[str, int] = OrderedDict()
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        """Return the number of indexed chunks."""
+        return len(self._rows)
+
+    def _allocate(self, dimensions: int) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._vectors is None:
+            self._vectors = np.zeros((16, dimensions), dtype=np.float32)
+        elif self._size == len(self._vectors):
+            grown = np.zeros((2 * self._size, dimensions), dtype=np.float32)
+            grown[: self._size] = self._vectors
+            self._vectors = grown
+        self._chunks.append(None)
+        self._size += 1
+        return self._size - 1
+
+    def add(self, chunks: Sequence[IndexedChunk]) -> int:
+        """Index the chunks not indexed yet and return how many were added."""
+        with self._lock:
+            new = {
+                chunk.text: chunk for chunk in chunks if chunk.text not in self._rows
+            }
+        if not new:
+            return 0
+        vectors = self.embed(list(new))
+        with self._lock:
+            for chunk, vector in zip(new.values(), vectors):
+                if chunk.text in self._rows:
+                    continue
+                if len(self._rows) >= self.max_chunks:
+                    _, oldest = self._rows.popitem(last=False)
+                    self._chunks[oldest] = None
+                    self._vectors[oldest] = 0
+                    self._free.append(oldest)
+                row = self._allocate(len(vector))
+                self._vectors[row] = vector
+                self._chunks[row] = chunk
+                self._rows[chunk.text] = row
+        return len(new)
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[IndexedChunk, float]]:
+        """Return the `k` chunks most similar to `vector` with their cosine similarity."""
+        with self._lock:
+            if not self._rows:
+                return []
+            scores = self._vectors[: self._size] @ vector
+            k = min(k, self._size)
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [
+                (self._chunks[row], float(scores[row]))
+                for row in best
+                if self._chunks[row] is not None
+            ]
+
+
+@dataclass
+class Retrieval:
+    """Chunks retrieved for a search query and how well they cover it.
+
+    Attributes:
+        query: The search query.
+        chunks: The retrieved chunks, most similar first.
+        coverage: Fraction of the query's content words found in the chunks.
+    """
+
+    query: str
+    chunks: List[IndexedChunk]
+    coverage: float
+
+
+def retrieve(
+    indexes: Sequence[SourceIndex],
+    queries: Sequence[str],
+    embed: Callable[[List[str]], np.ndarray],
+    today: date | None,
+    ttl_days: int,
+    k: int = 3,
+    min_similarity: float = 0.1,
+) -> List[Retrieval]:
+    """Retrieve the fresh chunks most similar to each query from several indexes.
+
+    A chunk is fresh while fewer than `ttl_days` days separate its run date
+    from `today`. The coverage of a query is the fraction of its content
+    words that appear in its retrieved chunks.
+    """
+    if not queries or not any(len(index) for index in indexes):
+        return [Retrieval(query, [], 0.0) for query in queries]
+    vectors = embed(list(queries))
+    retrievals = []
+    for query, vector in zip(queries, vectors):
+        found: Dict[str, Tuple[IndexedChunk, float]] = {}
+        for index in indexes:
+            for chunk, score in index.search(vector, 2 * k):
+                written = parse_run_date(chunk.run_date)
+                if score < min_similarity or today is None or written is None:
+                    continue
+                if (today - written).days >= ttl_days:
+                    continue
+                if chunk.text not in found or found[chunk.text][1] < score:
+                    found[chunk.text] = (chunk, score)
+        ranked = sorted(found.values(), key=lambda item: -item[1])[:k]
+        chunks = [chunk for chunk, _ in ranked]
+        wanted = stems(query)
+        covered = (
+            frozenset().union(*(chunk.stems for chunk in chunks))
+            if chunks
+            else frozenset()
+        )
+        coverage = len(wanted & covered) / len(wanted) if wanted else 0.0
+        retrievals.append(Retrieval(query, chunks, coverage))
+    return retrievals
+
+
+_GLOBAL = "\x00global"
+_indexes: "OrderedDict[Tuple[str, str], SourceIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_source_indexes(
+    thread_key: str | None,
+    scope: str,
+    embedding_model: str,
+    max_chunks: int,
+    max_threads: int = 256,
+) -> List[SourceIndex]:
+    """Return the source indexes a run reads and writes.
+
+    Args:
+        thread_key: The thread of the run, None outside of threads.
+        scope: "thread" for the thread's own index, "global" for the thread's
+            index and one shared by every run of the process.
+        embedding_model: Optional sentence-transformers model embedding the chunks.
+        max_chunks: The maximum number of chunks per index.
+        max_threads: The number of thread indexes kept; the least recently
+            used ones are dropped.
+    """
+    if scope not in ("thread", "global"):
+        raise ValueError(f"Unknown source index scope: {scope}")
+    keys = [thread_key] if thread_key else []
+    if scope == "global":
+        keys.append(_GLOBAL)
+    indexes = []
+    with _indexes_lock:
+        for key in keys:
+            index = _indexes.get((key, embedding_model))
+            if index is None:
+                index = SourceIndex(get_embedder(embedding_model), max_chunks)
+                _indexes[(key, embedding_model)] = index
+            index.max_chunks = max_chunks
+            _indexes.move_to_end((key, embedding_model))
+            indexes.append(index)
+        threads = [key for key in _indexes if key[0] != _GLOBAL]
+        for key in threads[: max(0, len(threads) - max_threads)]:
+            del _indexes[key]
+    return indexes
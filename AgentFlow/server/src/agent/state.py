@@ -7,23 +7,46 @@ from typing_extensions import Annotated
 
 import operator
 
-class OverAllState(TypedDict):
+class OverallState(TypedDict):
     messages: Annotated[list, add_messages]
     search_query: Annotated[list, operator.add]
-    web_search_result: Annotated[list, operator.add]
+    web_research_result: Annotated[list, operator.add]
     sources_gathered: Annotated[list, operator.add]
+    dropped_queries: Annotated[list, operator.add]
+    retrieved_queries: Annotated[list, operator.add]
+    straggler_queries: Annotated[list, operator.add]
+    reflection_cascade: Annotated[list, operator.add]
+    research_digest: Annotated[list, operator.add]
+    digested_result_count: int
+    indexed_result_count: int
+    pending_queries: list
     initial_search_query_count: int
     max_research_loops: int
     research_loop_count: int
     reasoning_model: str 
+    run_date: str
+    deadline_at: float | None
+    research_topic: str
+    topic_lines: list
+    topic_summary: list
+    topic_message_count: int
+    topic_last_message_id: str
+    answer_cache_hit: bool
+    run_key: str
 
 
 class ReflectionState(TypedDict):
     is_sufficient: bool
     knowledge_gap: str
-    follow_up_queries: Annotated[list, operator.add]
+    follow_up_queries: list
     research_loop_count: int
+    max_research_loops: int
     number_of_ran_queries: int
+    reasoning_model: str
+    run_date: str
+    deadline_at: float | None
+    run_key: str
+    stop_reason: str
 
 class Query(TypedDict):
     query: str
@@ -35,6 +58,15 @@ class QueryGenerationState(TypedDict):
 class WebSearchState(TypedDict):
     search_query: str
     id: str 
+    run_date: str
+    run_key: str
+
+class BatchResearchState(TypedDict):
+    """State of a research branch searching several queries in one call."""
+    search_queries: list
+    first_id: int
+    run_date: str
+    run_key: str
 
 @dataclass(kw_only=True)
 class SearchStateOutput:
@@ -0,0 +1,256 @@
+"""Serving of the frontend build with precompressed variants and cache headers."""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Vite's output for hashed bundles: assets/<name>-<hash>.<ext>.
+HASHED_ASSET = re.compile(r"(^|/)assets/[^/]+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/wasm",
+    "application/xml",
+    "image/svg+xml",
+    "image/x-icon",
+}
+# Content codings in order of preference.
+_CODINGS = ("br", "gzip")
+
+
+def _compressible(media_type: str) -> bool:
+    return media_type.startswith("text/") or media_type in _COMPRESSIBLE_TYPES
+
+
+def _compress(coding: str, data: bytes) -> bytes:
+    if coding == "br":
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the output, and so its ETag, the same across restarts.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def accepted_codings(accept_encoding: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into content codings and their q-values."""
+    codings = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+@dataclass
+class StaticAsset:
+    """A file of the build directory, with its precomputed representations.
+
+    Attributes:
+        path: The full path of the file.
+        media_type: The content type of the file.
+        digest: Hex SHA-256 prefix of the file's bytes, the base of its ETags.
+        last_modified: The HTTP date of the file's modification time.
+        cache_control: `immutable` for hashed bundles, else revalidation through the ETag.
+        size: The size of the file in bytes.
+        body: The bytes of the file, or None if it is too large to keep in memory.
+        encodings: The compressed bytes of the file by content coding.
+    """
+
+    path: str
+    media_type: str
+    digest: str
+    last_modified: str
+    cache_control: str
+    size: int
+    body: bytes | None
+    encodings: Dict[str, bytes] = field(default_factory=dict)
+
+    def etag(self, coding: str | None) -> str:
+        """Return the strong ETag of the representation with the given content coding."""
+        # Each content coding is a different representation and needs its own strong ETag.
+        return f'"{self.digest}-{coding}"' if coding else f'"{self.digest}"'
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """`StaticFiles` serving a snapshot of a build directory taken at startup.
+
+    Every file is read once when the app is created. Text assets get gzip
+    and, if the optional `brotli` package is installed, brotli variants at
+    maximum compression, kept when they are smaller than the file. Files and
+    variants up to `max_memory_bytes` are held in memory, larger files are
+    streamed from disk uncompressed. Responses carry strong ETags per content
+    coding, `Vary: Accept-Encoding` and either `immutable` cache headers, for
+    the content-hashed bundles Vite writes to `assets/`, or `no-cache`, so
+    `index.html` is revalidated on every load. Conditional requests are
+    answered with 304.
+
+    Known files are looked up in memory without touching the disk; any other
+    path, e.g. a directory to redirect or a missing file, is handled by
+    `StaticFiles`. Call `reload` after replacing the build in place.
+
+    Args:
+        directory: The build directory.
+        html: Serve `index.html` for directories and `404.html` for missing files.
+        max_memory_bytes: The largest file or compressed variant held in memory.
+        min_compress_bytes: Files below this size are not worth compressing.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        html: bool = True,
+        max_memory_bytes: int = 1 << 20,
+        min_compress_bytes: int = 512,
+    ):
+        """Serve `directory`, reading every file of it now."""
+        super().__init__(directory=directory, html=html)
+        self.max_memory_bytes = max_memory_bytes
+        self.min_compress_bytes = min_compress_bytes
+        self.reload()
+
+    def reload(self) -> None:
+        """Re-read the build directory."""
+        root = os.path.realpath(self.directory)
+        assets: Dict[str, StaticAsset] = {}
+        routes: Dict[str, StaticAsset] = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                asset = self._load(full_path, os.path.relpath(full_path, root))
+                assets[full_path] = asset
+                routes[os.path.normpath(os.path.relpath(full_path, root))] = asset
+        self._assets = assets
+        self._routes = routes
+
+    def _load(self, full_path: str, relative_path: str) -> StaticAsset:
+        with open(full_path, "rb") as file:
+            data = file.read()
+        stat_result = os.stat(full_path)
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        cache_control = (
+            IMMUTABLE
+            if HASHED_ASSET.search(relative_path.replace(os.sep, "/"))
+            else REVALIDATE
+        )
+        encodings = {}
+        if _compressible(media_type) and len(data) >= self.min_compress_bytes:
+            for coding in _CODINGS:
+                if coding == "br" and brotli is None:
+                    continue
+                compressed = _compress(coding, data)
+                if (
+                    len(compressed) < 0.9 * len(data)
+                    and len(compressed) <= self.max_memory_bytes
+                ):
+                    encodings[coding] = compressed
+        return StaticAsset(
+            path=full_path,
+            media_type=media_type,
+            digest=hashlib.sha256(data).hexdigest()[:32],
+            last_modified=formatdate(stat_result.st_mtime, usegmt=True),
+            cache_control=cache_control,
+            size=len(data),
+            body=data if len(data) <= self.max_memory_bytes else None,
+            encodings=encodings,
+        )
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        """Serve known files from memory, others through `StaticFiles`."""
+        if scope["method"] in ("GET", "HEAD"):
+            asset = self._routes.get(path)
+            if (
+                asset is None
+                and self.html
+                and path == "."
+                and scope["path"].endswith("/")
+            ):
+                asset = self._routes.get("index.html")
+            if asset is not None:
+                return self.asset_response(asset, scope)
+        return await super().get_response(path, scope)
+
+    def file_response(
+        self,
+        full_path: str | os.PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        """Serve known files from memory, others through `StaticFiles`."""
+        asset = self._assets.get(os.path.realpath(full_path))
+        if asset is None or status_code != 200:
+            return super().file_response(full_path, stat_result, scope, status_code)
+        return self.asset_response(asset, scope)
+
+    def asset_response(self, asset: StaticAsset, scope: Scope) -> Response:
+        """Return the best representation of an asset for the request, or 304."""
+        request_headers = Headers(scope=scope)
+        coding = None
+        if asset.encodings:
+            accepted = accepted_codings(request_headers.get("accept-encoding", ""))
+            for candidate in _CODINGS:
+                q = accepted.get(candidate, accepted.get("*", 0.0))
+                if candidate in asset.encodings and q > 0:
+                    coding = candidate
+                    break
+        headers = {
+            "etag": asset.etag(coding),
+            "last-modified": asset.last_modified,
+            "cache-control": asset.cache_control,
+        }
+        if asset.encodings:
+            headers["vary"] = "Accept-Encoding"
+        if self._not_modified(request_headers, headers["etag"], asset.last_modified):
+            return NotModifiedResponse(Headers(headers))
+        if coding is not None:
+            headers["content-encoding"] = coding
+            return Response(
+                asset.encodings[coding], media_type=asset.media_type, headers=headers
+            )
+        if asset.body is not None:
+            return Response(asset.body, media_type=asset.media_type, headers=headers)
+        return FileResponse(asset.path, media_type=asset.media_type, headers=headers)
+
+    @staticmethod
+    def _not_modified(request_headers: Headers, etag: str, last_modified: str) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match uses the weak comparison, which ignores the W/ prefix.
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since is None:
+            return False
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(
+                last_modified
+            )
+        except (TypeError, ValueError):
+            return False
@@ -0,0 +1,102 @@
+"""Streaming of the final answer with short urls expanded as tokens arrive."""
+
+from typing import Any, AsyncIterator, Iterator, List
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.constants import TAG_NOSTREAM
+from pydantic import ConfigDict
+
+from agent.citations import ShortUrlExpander
+
+
+def content_text(content: Any) -> str:
+    """Return the text of a message content, which may be a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in content
+        if isinstance(block, str) or block.get("type") == "text"
+    )
+
+
+class ShortUrlExpandingChatModel(BaseChatModel):
+    """Chat model streaming another chat model's output with short urls expanded.
+
+    The wrapped model runs with the `nostream` tag, so LangGraph's `messages`
+    stream mode only sees the tokens of this model, which pass through the
+    incremental `ShortUrlExpander` first. Clients therefore receive the answer
+    token by token, but never a half-rewritten link.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    llm: BaseChatModel
+    expander: ShortUrlExpander
+
+    @property
+    def _llm_type(self) -> str:
+        return "short-url-expanding"
+
+    def _child_config(self, run_manager: Any) -> dict:
+        return {
+            "tags": [TAG_NOSTREAM],
+            "callbacks": run_manager.get_child() if run_manager else None,
+        }
+
+    def _chunk(self, text: str) -> ChatGenerationChunk:
+        # Usage stays on the wrapped model's run so it is not counted twice.
+        return ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result = self.llm.invoke(
+            messages, config=self._child_config(run_manager), stop=stop, **kwargs
+        )
+        message = AIMessage(content=self.expander.expand(content_text(result.content)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        config = self._child_config(run_manager)
+        for chunk in self.llm.stream(messages, config=config, stop=stop, **kwargs):
+            text = self.expander.feed(content_text(chunk.content))
+            if text:
+                yield self._chunk(text)
+        tail = self.expander.flush()
+        if tail:
+            yield self._chunk(tail)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        config = self._child_config(run_manager)
+        async for chunk in self.llm.astream(
+            messages, config=config, stop=stop, **kwargs
+        ):
+            text = self.expander.feed(content_text(chunk.content))
+            if text:
+                yield self._chunk(text)
+        tail = self.expander.flush()
+        if tail:
+            yield self._chunk(tail)
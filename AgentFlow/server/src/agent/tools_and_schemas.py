@@ -21,4 +21,10 @@ class Reflection(BaseModel):
 
     follow_up_queries: List[str] = Field(
         description="A list of follow-up to address the knowledge gap."
-    )
\ No newline at end of file
+    )
+
+class TriageReflection(Reflection):
+    """Reflection with the model's confidence, for the tiers of the reflection cascade."""
+    confidence: float = Field(
+        description="How confident you are in the sufficiency decision and the follow-up queries, from 0 (unsure) to 1 (certain)."
+    )
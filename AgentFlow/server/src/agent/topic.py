@@ -0,0 +1,98 @@
+"""Rendering of a conversation into the research topic, compacting older turns."""
+
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+
+# Longest excerpt of an earlier question kept in the summary of compacted turns.
+SUMMARY_QUESTION_CHARS = 200
+
+
+def render_message(message: AnyMessage) -> str:
+    """Render one message as a line of the conversation transcript, or "" to leave it out."""
+    if isinstance(message, HumanMessage):
+        return f"User: {message.content}\n"
+    if isinstance(message, AIMessage):
+        return f"Assistant: {message.content}\n"
+    return ""
+
+
+def _summarize(line: str) -> str | None:
+    # Only the user's questions are kept from compacted turns; earlier answers
+    # are long and already reflected in what the user asked next.
+    if not line.startswith("User: "):
+        return None
+    question = " ".join(line[len("User: ") :].split())
+    if len(question) > SUMMARY_QUESTION_CHARS:
+        question = question[: SUMMARY_QUESTION_CHARS - 1].rstrip() + "…"
+    return question
+
+
+def _fit_summary(summary: List[str], max_chars: int) -> List[str]:
+    total = sum(len(item) + 2 for item in summary)
+    start = 0
+    while start < len(summary) and total > max_chars:
+        total -= len(summary[start]) + 2
+        start += 1
+    return summary[start:]
+
+
+def build_research_topic(
+    messages: Sequence[AnyMessage],
+    previous: Mapping[str, Any],
+    window: int = 0,
+    compaction: str = "summary",
+    summary_max_chars: int = 2000,
+) -> Tuple[str, Dict[str, Any]]:
+    """Build the research topic of a conversation, rendering only its new messages.
+
+    The transcript lines rendered by earlier runs of the thread are carried in
+    state (`topic_lines`, `topic_summary`, `topic_message_count` and
+    `topic_last_message_id`), so each run renders just the messages added
+    since. The history is rendered again from scratch when earlier messages
+    were edited or removed.
+
+    Messages beyond the `window` most recent ones are compacted: with
+    "summary" compaction the questions the user asked in them are kept in a
+    short list of earlier questions, at most `summary_max_chars` long, and with
+    "drop" compaction they are left out.
+
+    Args:
+        messages: The messages of the thread.
+        previous: The state of the thread, carrying the topic built by its last run.
+        window: The number of most recent messages rendered verbatim; 0 keeps all of them.
+        compaction: How messages beyond the window are kept, "summary" or "drop".
+        summary_max_chars: The maximum length of the summary of compacted messages.
+
+    Returns:
+        The research topic, and the state update carrying the rendered history.
+    """
+    if compaction not in ("summary", "drop"):
+        raise ValueError(f"Unknown topic compaction: {compaction}")
+    lines: List[str] = list(previous.get("topic_lines") or [])
+    summary: List[str] = list(previous.get("topic_summary") or [])
+    count = previous.get("topic_message_count") or 0
+    last_id = previous.get("topic_last_message_id")
+    if count > len(messages) or (count and messages[count - 1].id != last_id):
+        lines, summary, count = [], [], 0
+
+    lines.extend(render_message(message) for message in messages[count:])
+    if window > 0 and len(lines) > window:
+        compacted, lines = lines[:-window], lines[-window:]
+        if compaction == "summary":
+            summary.extend(filter(None, map(_summarize, compacted)))
+            summary = _fit_summary(summary, summary_max_chars)
+
+    update = {
+        "topic_lines": lines,
+        "topic_summary": summary,
+        "topic_message_count": len(messages),
+        "topic_last_message_id": messages[-1].id if messages else None,
+    }
+    if len(messages) == 1:
+        # A single question is the topic itself, as in `get_research_topic`.
+        return messages[-1].content, update
+    topic = "".join(lines)
+    if summary:
+        topic = "Earlier questions: " + "; ".join(summary) + "\n" + topic
+    return topic, update
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agent.answer_cache import AnswerCache, get_answer_cache, hashed_embedding
+from agent.clients import set_client_registry
+from agent.fakes import fake_client_registry
+from agent.metrics import run_traces
+
+TODAY = "October 18, 2026"
+SOURCES = [{"label": "a", "short_url": "https://s/a", "value": "https://a"}]
+
+
+def test_identical_and_similar_topics_hit():
+    cache = AnswerCache(hashed_embedding)
+    cache.put("Who won the 2026 Tour de France?", "Answer.", SOURCES, TODAY)
+    hit, outcome = cache.lookup("who won the 2026 tour de france", TODAY, 0.8, 1)
+    assert outcome == "hit" and hit.answer == "Answer." and hit.similarity == 1.0
+    similar, outcome = cache.lookup(
+        "Who was the winner of the 2026 Tour de France?", TODAY, 0.5, 1
+    )
+    assert outcome == "hit" and similar.similarity < 1.0
+
+
+def test_topics_with_other_numbers_miss():
+    cache = AnswerCache(hashed_embedding)
+    cache.put("Who won the 2026 Tour de France?", "Answer.", SOURCES, TODAY)
+    assert cache.lookup("Who won the 2025 Tour de France?", TODAY, 0.1, 1) == (
+        None,
+        "miss",
+    )
+
+
+def test_stale_answers_are_evicted():
+    cache = AnswerCache(hashed_embedding)
+    cache.put("Solar panel prices", "Answer.", SOURCES, "October 10, 2026")
+    assert cache.lookup("Solar panel prices", TODAY, 0.8, 7) == (None, "stale")
+    assert len(cache) == 0
+
+
+def test_least_recently_used_answer_is_replaced():
+    cache = AnswerCache(hashed_embedding, max_entries=2)
+    cache.put("first topic", "1", [], TODAY)
+    cache.put("second topic", "2", [], TODAY)
+    cache.lookup("first topic", TODAY, 0.9, 1)
+    cache.put("third topic", "3", [], TODAY)
+    assert cache.lookup("second topic", TODAY, 0.9, 1)[0] is None
+    assert cache.lookup("first topic", TODAY, 0.9, 1)[0].answer == "1"
+
+
+def test_caches_are_separate_per_answer_model_and_effort():
+    base = get_answer_cache("", "gemini-2.5-pro", 10, (3, 2))
+    assert get_answer_cache("", "gemini-2.5-pro", 10, (3, 2)) is base
+    assert get_answer_cache("", "gemini-2.5-flash", 10, (3, 2)) is not base
+    assert get_answer_cache("", "gemini-2.5-pro", 10, (1, 1)) is not base
+
+
+@pytest.fixture
+def fake_clients():
+    previous = set_client_registry(fake_client_registry())
+    yield
+    set_client_registry(previous)
+
+
+def run_graph(question: str, thread_id: str, configurable=None, **state):
+    from agent.graph import graph
+
+    return asyncio.run(
+        graph.ainvoke(
+            {"messages": [HumanMessage(question)], "max_research_loops": 1, **state},
+            {
+                "configurable": {
+                    "thread_id": thread_id,
+                    "answer_cache_enabled": True,
+                    "search_cache_ttl_seconds": 0,
+                    **(configurable or {}),
+                }
+            },
+        )
+    )
+
+
+def test_cache_hits_need_the_same_answer_model_and_finish_the_trace(fake_clients):
+    question = "What limits perovskite solar cell lifetimes in 2026?"
+    run_graph(question, "answer-cache-1", reasoning_model="gemini-2.5-pro")
+    other_model = run_graph(
+        question, "answer-cache-2", reasoning_model="gemini-2.5-flash"
+    )
+    assert not other_model["answer_cache_hit"]
+    hit = run_graph(question, "answer-cache-3", reasoning_model="gemini-2.5-pro")
+    assert hit["answer_cache_hit"]
+    summary = run_traces.get("answer-cache-3")
+    assert summary is not None and summary["finished"]
+    assert [span["node"] for span in summary["spans"]] == ["lookup_answer"]
+
+
+def test_answers_of_runs_with_a_deadline_are_not_cached(fake_clients):
+    question = "How fast are sodium-ion battery costs falling in 2026?"
+    trimmed = run_graph(question, "answer-deadline-1", {"deadline_ms": 3000})
+    assert not trimmed["answer_cache_hit"]
+    unhurried = run_graph(question, "answer-deadline-2")
+    assert not unhurried["answer_cache_hit"]
+    assert run_graph(question, "answer-deadline-3")["answer_cache_hit"]
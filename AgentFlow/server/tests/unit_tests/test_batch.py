@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from starlette.testclient import TestClient
+
+from agent.app import MAX_BATCH_CONCURRENCY, app
+from agent.batch import QuestionBatch, parse_questions
+
+
+def test_paraphrased_queries_are_shared():
+    batch = QuestionBatch()
+    assert batch.share(["perovskite solar cell lifetime studies"], []) == [
+        "perovskite solar cell lifetime studies"
+    ]
+    shared = batch.share(
+        ["Perovskite solar cell lifetime studies", "perovskite tandem cells"], []
+    )
+    assert shared == [
+        "perovskite solar cell lifetime studies",
+        "perovskite tandem cells",
+    ]
+
+
+def test_queries_with_different_numbers_are_not_shared():
+    batch = QuestionBatch()
+    batch.share(["iPhone 15 sales figures"], [])
+    assert batch.share(["iPhone 16 sales figures"], []) == ["iPhone 16 sales figures"]
+    batch.share(["US GDP growth Q1 2024"], [])
+    assert batch.share(["US GDP growth Q2 2024"], []) == ["US GDP growth Q2 2024"]
+
+
+def test_researched_queries_are_left_out():
+    batch = QuestionBatch()
+    assert batch.share(
+        ["solar cell costs", "wind turbine costs"], ["wind turbine costs"]
+    ) == ["solar cell costs"]
+
+
+def test_concurrent_fetches_share_one_call():
+    batch = QuestionBatch()
+    calls: list = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "response"
+
+    async def run():
+        return await asyncio.gather(
+            *(batch.get_or_fetch("key", fetch) for _ in range(4))
+        )
+
+    assert asyncio.run(run()) == ["response"] * 4
+    assert len(calls) == 1
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    batch = QuestionBatch()
+    calls: list = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "response"
+
+    async def run():
+        leader = asyncio.create_task(batch.get_or_fetch("key", fetch))
+        await asyncio.sleep(0.01)
+        followers = [
+            asyncio.create_task(batch.get_or_fetch("key", fetch)) for _ in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    # One follower took the fetch over, the others shared its result.
+    assert asyncio.run(run()) == ["response"] * 3
+    assert len(calls) == 2
+
+
+def test_parse_questions():
+    lines = [
+        '"What is RAG?"',
+        "",
+        '{"id": "q2", "question": "Who won?", "max_research_loops": 1}',
+    ]
+    assert parse_questions(lines) == [
+        {"id": 1, "question": "What is RAG?"},
+        {"id": "q2", "question": "Who won?", "max_research_loops": 1},
+    ]
+    with pytest.raises(ValueError, match="Line 1 is not valid JSON"):
+        parse_questions(["{"])
+    with pytest.raises(ValueError, match="Line 2 has no question"):
+        parse_questions(['"ok"', '{"question": " "}'])
+
+
+def test_batch_endpoint_bounds_concurrency():
+    client = TestClient(app)
+    for concurrency in (0, MAX_BATCH_CONCURRENCY + 1):
+        response = client.post(
+            f"/batch?concurrency={concurrency}", content='"What is RAG?"'
+        )
+        assert response.status_code == 422
+
+
+def test_batch_endpoint_rejects_malformed_questions():
+    response = TestClient(app).post("/batch", content="{")
+    assert response.status_code == 400
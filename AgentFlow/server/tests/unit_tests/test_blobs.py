@@ -0,0 +1,60 @@
+import pytest
+
+from agent.blobs import (
+    BlobStore,
+    FilesystemBlobStore,
+    SQLiteBlobStore,
+    is_blob_ref,
+    load_sources,
+    load_texts,
+    offload_sources,
+    offload_texts,
+)
+
+SOURCES = [
+    {"label": "apnews", "short_url": "https://s/0-0", "value": "https://apnews.com/a"},
+    {
+        "label": "reuters",
+        "short_url": "https://s/0-1",
+        "value": "https://reuters.com/b",
+    },
+]
+
+
+def test_backends_must_implement_reads_and_writes():
+    class WriteOnlyStore(BlobStore):
+        def _write_many(self, blobs):
+            return len(blobs)
+
+    with pytest.raises(TypeError):
+        WriteOnlyStore()
+
+
+@pytest.mark.parametrize("backend", ["filesystem", "sqlite"])
+def test_payloads_round_trip_through_a_fresh_store(tmp_path, backend):
+    def open_store():
+        if backend == "filesystem":
+            return FilesystemBlobStore(str(tmp_path / "blobs"))
+        return SQLiteBlobStore(str(tmp_path / "blobs.sqlite3"))
+
+    texts = ["Result one [apnews](https://s/0-0).", "Result two."]
+    refs = offload_texts(open_store(), texts + texts[:1])
+    assert all(is_blob_ref(ref) for ref in refs)
+    assert refs[0] == refs[2]
+    sources = offload_sources(open_store(), SOURCES)
+    assert sources == [
+        {"blob": sources[0]["blob"], "count": 2, "labels": ["apnews", "reuters"]}
+    ]
+
+    # A fresh store has an empty LRU and reads from the backend.
+    store = open_store()
+    assert load_texts(store, refs + ["inline"]) == texts + texts[:1] + ["inline"]
+    assert load_sources(store, sources) == SOURCES
+    with pytest.raises(KeyError):
+        store.get_many(["blob:sha256:" + "0" * 64])
+
+
+def test_references_need_a_store():
+    assert offload_texts(None, ["inline"]) == ["inline"]
+    with pytest.raises(ValueError):
+        load_texts(None, ["blob:sha256:" + "0" * 64])
@@ -0,0 +1,69 @@
+import pytest
+
+from agent.cascade import heuristic_reflection, parse_cascade_tiers, triage_confidence
+from agent.tools_and_schemas import TriageReflection
+
+TOPIC = "perovskite solar cell lifetimes"
+
+
+def result(text: str, *sites: str) -> str:
+    return text + "".join(f" [{site}](https://s/{site})" for site in sites)
+
+
+def test_parse_cascade_tiers():
+    assert parse_cascade_tiers(" heuristic, model ") == ["heuristic", "model"]
+    assert parse_cascade_tiers("") == []
+    with pytest.raises(ValueError):
+        parse_cascade_tiers("oracle")
+
+
+def test_partial_coverage_is_insufficient_without_confidence():
+    results = [
+        result("Perovskite solar cells degrade in humid air.", "a", "b", "c", "d")
+    ]
+    reflection, confidence = heuristic_reflection(TOPIC, results)
+    assert not reflection.is_sufficient
+    assert confidence == 0.0
+
+
+def test_few_sites_are_insufficient_without_confidence():
+    results = [result("Perovskite solar cell lifetimes now reach years.", "a", "b")]
+    reflection, confidence = heuristic_reflection(TOPIC, results)
+    assert not reflection.is_sufficient
+    assert confidence == 0.0
+
+
+def test_topic_touched_by_one_result_gets_low_confidence():
+    results = [
+        result("Perovskite solar cell lifetimes now reach years.", "a", "b", "c"),
+        result("Silicon modules dominate the market.", "d", "e", "f"),
+        result("Module prices fell again.", "g"),
+    ]
+    reflection, confidence = heuristic_reflection(TOPIC, results)
+    assert reflection.is_sufficient
+    assert confidence < 0.5
+
+
+def test_broad_research_from_many_sites_gets_high_confidence():
+    results = [
+        result(
+            f"Perovskite solar cell lifetimes, study {index}.",
+            f"site{2 * index}",
+            f"site{2 * index + 1}",
+        )
+        for index in range(4)
+    ]
+    reflection, confidence = heuristic_reflection(TOPIC, results)
+    assert reflection.is_sufficient
+    assert confidence == 1.0
+
+
+def test_triage_confidence_rejects_inconsistent_reflections():
+    stuck = TriageReflection(
+        is_sufficient=False, knowledge_gap="gap", follow_up_queries=[], confidence=0.99
+    )
+    assert triage_confidence(stuck) == 0.0
+    done = TriageReflection(
+        is_sufficient=True, knowledge_gap="", follow_up_queries=[], confidence=1.7
+    )
+    assert triage_confidence(done) == 1.0
@@ -0,0 +1,127 @@
+from google.genai import types
+
+from agent.citations import get_citations, insert_citation_markers
+from agent.fakes import make_grounded_response
+from agent.utils import resolve_urls
+
+
+def citation(start: int, end: int, *labels: str) -> dict:
+    return {
+        "start_index": start,
+        "end_index": end,
+        "segments": [
+            {"label": label, "short_url": f"https://s/{label}"} for label in labels
+        ],
+    }
+
+
+def byte_offset(text: str, substring: str) -> int:
+    """Return the UTF-8 byte offset right after `substring` in `text`."""
+    return len(text[: text.index(substring) + len(substring)].encode("utf-8"))
+
+
+def test_markers_are_inserted_after_their_segment():
+    text = "Solar is cheap. Wind is cheaper."
+    result = insert_citation_markers(
+        text, [citation(0, 15, "a"), citation(16, 32, "b")]
+    )
+    assert (
+        result == "Solar is cheap. [a](https://s/a) Wind is cheaper. [b](https://s/b)"
+    )
+
+
+def test_offsets_are_utf8_bytes_not_characters():
+    text = "Café prices rose. Ünïcode costs 5€. Done."
+    end_first = byte_offset(text, "rose.")
+    end_second = byte_offset(text, "5€.")
+    # Character offsets would land earlier than the byte offsets here.
+    assert end_first != text.index("rose.") + len("rose.")
+    result = insert_citation_markers(
+        text, [citation(0, end_first, "a"), citation(end_first + 1, end_second, "b")]
+    )
+    assert result == (
+        "Café prices rose. [a](https://s/a) Ünïcode costs 5€. [b](https://s/b) Done."
+    )
+
+
+def test_offsets_inside_a_character_move_to_its_end():
+    text = "Price: 5€ today"
+    inside_euro = len("Price: 5".encode("utf-8")) + 1
+    result = insert_citation_markers(text, [citation(0, inside_euro, "a")])
+    assert result == "Price: 5€ [a](https://s/a) today"
+
+
+def test_emoji_and_cjk_text_round_trips():
+    text = "风能 🌬️ grows. 太阳能 ☀️ grows faster."
+    end = byte_offset(text, "grows.")
+    result = insert_citation_markers(text, [citation(0, end, "a")])
+    assert result == "风能 🌬️ grows. [a](https://s/a) 太阳能 ☀️ grows faster."
+
+
+def test_markers_sharing_an_end_keep_start_order_and_all_labels():
+    text = "One sentence."
+    result = insert_citation_markers(
+        text, [citation(5, 13, "late"), citation(0, 13, "early", "also")]
+    )
+    assert result == (
+        "One sentence. [early](https://s/early) [also](https://s/also) [late](https://s/late)"
+    )
+
+
+def test_out_of_range_offsets_are_clamped():
+    assert (
+        insert_citation_markers("Short.", [citation(0, 99, "a")])
+        == "Short. [a](https://s/a)"
+    )
+    assert insert_citation_markers("Short.", []) == "Short."
+
+
+def test_get_citations_resolves_chunks_to_short_urls():
+    response = make_grounded_response("solar", num_sources=2)
+    chunks = response.candidates[0].grounding_metadata.grounding_chunks
+    resolved = resolve_urls(chunks, 7)
+    citations = get_citations(response, resolved)
+    assert [c["segments"][0]["label"] for c in citations] == ["source0", "source1"]
+    assert citations[1]["segments"][0]["short_url"].endswith("/id/7-1")
+    text = insert_citation_markers(response.text, citations)
+    assert text.count("[source0](") == 1 and text.count("[source1](") == 1
+
+
+def test_get_citations_skips_unusable_chunks_and_supports():
+    response = types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(text="Text.")]),
+                grounding_metadata=types.GroundingMetadata(
+                    grounding_chunks=[
+                        types.GroundingChunk(
+                            web=types.GroundingChunkWeb(
+                                uri="https://a", title="untitled"
+                            )
+                        ),
+                        types.GroundingChunk(
+                            web=types.GroundingChunkWeb(uri="https://b", title="b.org")
+                        ),
+                    ],
+                    grounding_supports=[
+                        types.GroundingSupport(
+                            segment=types.Segment(end_index=5),
+                            grounding_chunk_indices=[0, 1, 9],
+                        ),
+                        types.GroundingSupport(segment=types.Segment(start_index=0)),
+                    ],
+                ),
+            )
+        ]
+    )
+    citations = get_citations(response, {"https://b": "https://s/b"})
+    assert citations == [
+        {
+            "start_index": 0,
+            "end_index": 5,
+            "segments": [
+                {"label": "b", "short_url": "https://s/b", "value": "https://b"}
+            ],
+        }
+    ]
+    assert get_citations(None, {}) == []
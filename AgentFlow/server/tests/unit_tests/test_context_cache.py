@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+from agent.context_cache import (
+    ContextCacheManager,
+    GeminiContextCacheBackend,
+    LocalContextCacheBackend,
+)
+
+PREFIX = "Static instructions. " * 400
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def manager(backend, clock=None, **kwargs) -> ContextCacheManager:
+    return ContextCacheManager(
+        backend,
+        ttl_seconds=600,
+        min_tokens=100,
+        refresh_margin_seconds=60,
+        clock=clock or Clock(),
+        **kwargs,
+    )
+
+
+def test_prefix_is_cached_once_and_reused():
+    backend = LocalContextCacheBackend()
+    cache = manager(backend)
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.prompt("model", PREFIX, "question") for _ in range(5))
+        )
+
+    prompts = asyncio.run(run())
+    assert backend.created == 1
+    assert {prompt.cached_content for prompt in prompts} == {prompts[0].cached_content}
+    assert prompts[0].text == "question"
+    assert backend.lookup(prompts[0].cached_content) == PREFIX
+
+
+def test_small_prefixes_are_sent_whole():
+    backend = LocalContextCacheBackend()
+    prompt = asyncio.run(manager(backend).prompt("model", "Short prefix. ", "question"))
+    assert prompt.cached_content is None
+    assert prompt.text == "Short prefix. question"
+    assert backend.created == 0
+
+
+def test_refresh_leaves_the_old_cache_to_expire():
+    backend = LocalContextCacheBackend()
+    clock = Clock()
+    cache = manager(backend, clock)
+    old = asyncio.run(cache.get("model", PREFIX))
+    clock.now += 600 - 30
+    new = asyncio.run(cache.get("model", PREFIX))
+    assert new.name != old.name
+    # Calls given the old name before the refresh may still be queued.
+    assert backend.lookup(old.name) == PREFIX
+    assert backend.deleted == 0
+
+
+def test_failed_creation_is_not_retried_until_the_backoff_passes():
+    class FailingBackend(LocalContextCacheBackend):
+        async def create(self, model, prefix, ttl_seconds, tools):
+            self.created += 1
+            raise RuntimeError("quota exceeded")
+
+    backend = FailingBackend()
+    clock = Clock()
+    cache = manager(backend, clock, retry_after_seconds=300)
+    assert asyncio.run(cache.get("model", PREFIX)) is None
+    assert asyncio.run(cache.get("model", PREFIX)) is None
+    assert backend.created == 1
+    clock.now += 301
+    asyncio.run(cache.get("model", PREFIX))
+    assert backend.created == 2
+
+
+def test_gemini_backend_skips_prefixes_below_the_model_minimum():
+    class SmallPrefixBackend(LocalContextCacheBackend):
+        min_tokens = GeminiContextCacheBackend.min_tokens
+
+    assert GeminiContextCacheBackend().min_tokens("gemini-2.5-flash") == 1024
+    assert GeminiContextCacheBackend().min_tokens("gemini-2.5-pro") == 4096
+    assert GeminiContextCacheBackend().min_tokens("gemini-3-ultra") == 4096
+
+    backend = SmallPrefixBackend()
+    cache = manager(backend)
+    prefix = "Static instructions. " * 300
+    assert asyncio.run(cache.get("gemini-2.5-flash", prefix)) is not None
+    assert asyncio.run(cache.get("gemini-2.5-pro", prefix)) is None
+    assert backend.created == 1
+
+
+def test_creations_in_flight_are_shared_per_event_loop():
+    class SlowBackend(LocalContextCacheBackend):
+        async def create(self, model, prefix, ttl_seconds, tools):
+            await asyncio.sleep(0.1)
+            return await super().create(model, prefix, ttl_seconds, tools)
+
+    backend = SlowBackend()
+    cache = manager(backend)
+    results = []
+    other_loop = threading.Thread(
+        target=lambda: results.append(asyncio.run(cache.get("model", PREFIX)))
+    )
+    other_loop.start()
+    time.sleep(0.03)
+    # Waiting on the other loop's creation would fail with a loop mismatch.
+    results.append(asyncio.run(cache.get("model", PREFIX)))
+    other_loop.join()
+    assert all(entry is not None for entry in results)
+    assert backend.created == 2
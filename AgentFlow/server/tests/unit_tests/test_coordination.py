@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from agent.coordination import RedisCoordinator
+
+fakeredis = pytest.importorskip(
+    "fakeredis", reason="fakeredis[lua] is needed for Redis scripts"
+)
+from fakeredis import FakeServer  # noqa: E402
+from fakeredis.aioredis import FakeRedis  # noqa: E402
+from redis.exceptions import ConnectionError  # noqa: E402
+
+
+def coordinator(server: FakeServer) -> RedisCoordinator:
+    return RedisCoordinator(FakeRedis(server=server))
+
+
+def counting_fetch(calls: list, delay: float = 0.05):
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return "result"
+
+    return fetch
+
+
+def get_or_fetch(replica: RedisCoordinator, fetch):
+    return replica.get_or_fetch(
+        "key", fetch, str, bytes.decode, ttl_seconds=60, lock_seconds=5
+    )
+
+
+def test_replicas_share_one_search():
+    server = FakeServer()
+    calls: list = []
+
+    async def run():
+        replicas = [coordinator(server) for _ in range(3)]
+        fetch = counting_fetch(calls)
+        results = await asyncio.gather(
+            *(get_or_fetch(replica, fetch) for replica in replicas)
+        )
+        results.append(await get_or_fetch(replicas[0], fetch))
+        return results
+
+    assert asyncio.run(run()) == ["result"] * 4
+    assert len(calls) == 1
+
+
+def test_failed_store_keeps_the_search_result():
+    class FailingSet(FakeRedis):
+        async def set(self, name, value, *args, **kwargs):
+            if name.endswith(":result:key"):
+                raise ConnectionError("connection lost")
+            return await super().set(name, value, *args, **kwargs)
+
+    server = FakeServer()
+    calls: list = []
+
+    async def run():
+        replica = RedisCoordinator(FailingSet(server=server))
+        result = await get_or_fetch(replica, counting_fetch(calls))
+        # The lock was released, so the next lookup does not wait for it.
+        locked = await replica.client.exists("agentflow:lock:key")
+        return result, locked
+
+    assert asyncio.run(run()) == ("result", 0)
+
+
+def test_unreachable_redis_searches_locally():
+    calls: list = []
+    server = FakeServer()
+    server.connected = False
+
+    async def run():
+        return await get_or_fetch(coordinator(server), counting_fetch(calls, delay=0))
+
+    assert asyncio.run(run()) == "result"
+    assert len(calls) == 1
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from agent.configuration import Configuration
+from agent.deadline import (
+    LatencyEstimate,
+    LatencyEstimates,
+    affordable_queries,
+    choose_answer_model,
+    deadline_at,
+    latency_estimates,
+    remaining_seconds,
+    search_seconds,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_estimates():
+    latency_estimates.reset()
+    yield
+    latency_estimates.reset()
+
+
+def observe(model: str, call: str, seconds: float, times: int = 3) -> None:
+    for _ in range(times):
+        latency_estimates.observe(model, call, seconds)
+
+
+def test_latency_estimate_adds_deviations_to_the_mean():
+    estimate = LatencyEstimate()
+    for seconds in (1.0, 1.0, 1.0):
+        estimate.add(seconds)
+    assert estimate.mean == pytest.approx(1.0)
+    assert estimate.value(2.0) > estimate.mean
+    estimate.add(5.0)
+    assert estimate.mean == pytest.approx(1.5)
+
+
+def test_prior_is_used_until_enough_samples():
+    estimates = LatencyEstimates(min_samples=3)
+    estimates.observe("model", "search", 10.0)
+    assert estimates.estimate("model", "search") == 2.0
+    assert estimates.mean("model", "search") == 10.0
+    estimates.observe("model", "search", 10.0)
+    estimates.observe("model", "search", 10.0)
+    assert estimates.estimate("model", "search") > 10.0
+
+
+def test_deadline_bookkeeping():
+    assert deadline_at(0) is None
+    assert remaining_seconds({}) is None
+    deadline = deadline_at(5000)
+    assert 4.9 < remaining_seconds({"deadline_at": deadline}) <= 5.0
+    assert remaining_seconds({"deadline_at": time.time() - 1}) < 0
+
+
+def test_search_seconds_counts_waves_of_branches():
+    configurable = Configuration(max_concurrent_research=4)
+    observe(configurable.query_generator_model, "search", 1.0)
+    wave = latency_estimates.estimate(configurable.query_generator_model, "search")
+    assert search_seconds(configurable, 4) == pytest.approx(wave)
+    assert search_seconds(configurable, 5) == pytest.approx(2 * wave)
+
+
+def test_affordable_queries_drop_whole_waves():
+    configurable = Configuration(max_concurrent_research=2)
+    observe(configurable.query_generator_model, "search", 1.0)
+    wave = latency_estimates.estimate(configurable.query_generator_model, "search")
+    assert affordable_queries(configurable, wave * 10, 5) == 5
+    assert affordable_queries(configurable, wave * 1.5, 5) == 2
+    assert affordable_queries(configurable, wave * 0.5, 5) == 0
+
+
+def test_fast_answer_model_only_when_the_configured_one_does_not_fit():
+    configurable = Configuration(deadline_answer_model="fast")
+    observe("slow", "answer", 10.0)
+    observe("fast", "answer", 1.0)
+    assert choose_answer_model(configurable, "slow", None) == "slow"
+    assert choose_answer_model(configurable, "slow", 60.0) == "slow"
+    assert choose_answer_model(configurable, "slow", 5.0) == "fast"
+    # A fast model that is not faster is no use.
+    observe("fast", "answer", 30.0, times=30)
+    assert choose_answer_model(configurable, "slow", 5.0) == "slow"
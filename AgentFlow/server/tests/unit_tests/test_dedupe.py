@@ -0,0 +1,61 @@
+import pytest
+
+from agent.dedupe import dedupe_queries, estimate_similarity, shingles, topic_numbers
+
+
+def test_shingles_ignore_stopwords_and_word_order():
+    assert shingles("the price of solar panels") == shingles("solar panels price")
+
+
+def test_identical_queries_are_fully_similar():
+    assert estimate_similarity("solar panel prices", "solar panel prices") == 1.0
+
+
+def test_paraphrases_are_dropped():
+    kept, dropped = dedupe_queries(
+        ["solar panel prices", "prices of solar panels", "wind turbine maintenance"]
+    )
+    assert kept == ["solar panel prices", "wind turbine maintenance"]
+    assert dropped[0]["query"] == "prices of solar panels"
+    assert dropped[0]["duplicate_of"] == "solar panel prices"
+
+
+def test_already_researched_queries_are_dropped():
+    kept, dropped = dedupe_queries(["prices of solar panels"], ["solar panel prices"])
+    assert kept == []
+    assert dropped[0]["duplicate_of"] == "solar panel prices"
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    [
+        (
+            "Apple total revenue growth fiscal year 2024",
+            "Apple total revenue growth fiscal year 2023",
+        ),
+        ("Python 3.12 release notes", "Python 3.13 release notes"),
+        ("US GDP growth Q1 2024", "US GDP growth Q2 2024"),
+        ("iPhone 15 sales figures", "iPhone 16 sales figures"),
+    ],
+)
+def test_queries_with_different_numbers_are_kept(left, right):
+    assert topic_numbers(left) != topic_numbers(right)
+    assert estimate_similarity(left, right) >= 0.7
+    kept, dropped = dedupe_queries([left, right])
+    assert kept == [left, right]
+    assert dropped == []
+
+
+def test_threshold_zero_disables_dedupe():
+    queries = ["solar panel prices", "solar panel prices"]
+    assert dedupe_queries(queries, threshold=0) == (queries, [])
+
+
+def test_embeddings_catch_paraphrases_minhash_misses():
+    vectors = {"cheap flights": [1.0, 0.0], "low cost airfare": [1.0, 0.0]}
+    kept, dropped = dedupe_queries(
+        ["cheap flights", "low cost airfare"],
+        embed=lambda texts: [vectors[text] for text in texts],
+    )
+    assert kept == ["cheap flights"]
+    assert dropped[0]["similarity"] == 1.0
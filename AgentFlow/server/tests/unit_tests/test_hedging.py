@@ -0,0 +1,139 @@
+import asyncio
+import random
+
+import pytest
+
+from agent.hedging import Hedger, P2Quantile
+from agent.scheduler import ModelScheduler
+
+
+@pytest.mark.parametrize("p", [0.5, 0.9, 0.99])
+def test_p2_quantile_tracks_the_true_quantile(p):
+    rng = random.Random(0)
+    values = [rng.expovariate(1.0) for _ in range(20000)]
+    estimate = P2Quantile(p)
+    for value in values:
+        estimate.add(value)
+    exact = sorted(values)[int(p * len(values))]
+    assert estimate.value() == pytest.approx(exact, rel=0.05)
+
+
+def test_p2_quantile_with_few_samples():
+    estimate = P2Quantile(0.9)
+    assert estimate.value() is None
+    for value in (3.0, 1.0, 2.0):
+        estimate.add(value)
+    assert estimate.value() == 3.0
+    with pytest.raises(ValueError):
+        P2Quantile(1.0)
+
+
+def warmed_hedger(latency: float = 0.01, samples: int = 20) -> Hedger:
+    hedger = Hedger(min_samples=samples)
+    for _ in range(samples):
+        hedger._model("model", 0.9).latency.add(latency)
+    return hedger
+
+
+def test_slow_calls_are_hedged_and_the_faster_copy_wins():
+    hedger = warmed_hedger()
+    delays = iter([1.0, 0.01])
+    calls = []
+
+    async def fn():
+        delay = next(delays)
+        calls.append(delay)
+        await asyncio.sleep(delay)
+        return delay
+
+    result = asyncio.run(hedger.call("model", fn, budget_percent=100))
+    assert result == 0.01
+    assert calls == [1.0, 0.01]
+
+
+def test_no_hedge_without_budget_or_while_learning():
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    assert asyncio.run(warmed_hedger().call("model", fn, budget_percent=0)) == "done"
+    assert asyncio.run(Hedger().call("model", fn, budget_percent=100)) == "done"
+    assert len(calls) == 2
+
+
+def test_hedges_spend_credits():
+    hedger = warmed_hedger()
+
+    async def fn():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        # 50% budget: the first call earns half a credit, the second one a full one.
+        for _ in range(2):
+            await hedger.call("model", fn, budget_percent=50)
+
+    asyncio.run(run())
+    assert hedger._model("model", 0.9).credits == pytest.approx(0.0)
+
+
+def test_a_failed_copy_falls_back_to_the_other():
+    hedger = warmed_hedger()
+    outcomes = iter(["slow-failure", "success"])
+
+    async def fn():
+        outcome = next(outcomes)
+        if outcome == "slow-failure":
+            await asyncio.sleep(0.05)
+            raise RuntimeError("upstream error")
+        await asyncio.sleep(0.1)
+        return outcome
+
+    assert asyncio.run(hedger.call("model", fn, budget_percent=100)) == "success"
+
+
+def test_cancelled_slow_copies_are_observed_as_a_lower_bound():
+    hedger = warmed_hedger()
+    stats = hedger._model("model", 0.9)
+    delays = iter([0.2, 0.01])
+
+    async def fn():
+        await asyncio.sleep(next(delays))
+        return "done"
+
+    asyncio.run(hedger.call("model", fn, budget_percent=100))
+    # The hedge and the cancelled primary are both observed.
+    assert stats.latency.count == 22
+
+
+def test_hedges_take_their_own_scheduler_slot():
+    hedger = warmed_hedger()
+    scheduler = ModelScheduler()
+    delays = iter([0.1, 0.01])
+    running = []
+    peak = 0
+
+    async def fn():
+        nonlocal peak
+        delay = next(delays)
+        running.append(delay)
+        peak = max(peak, len(running))
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            running.remove(delay)
+        return delay
+
+    result = asyncio.run(
+        hedger.call(
+            "model",
+            lambda: scheduler.call("model", fn, max_concurrency=1),
+            budget_percent=100,
+        )
+    )
+    # The hedge waits for the slot held by the primary, which finishes first.
+    assert result == 0.1
+    assert peak == 1
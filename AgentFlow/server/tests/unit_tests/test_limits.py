@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agent.clients import set_client_registry
+from agent.fakes import fake_client_registry
+from agent.limits import RunConcurrencyLimiter, get_run_key
+from agent.metrics import run_traces
+
+
+def test_run_key_prefers_the_run_id_then_the_thread_id_then_the_state():
+    config = {"configurable": {"thread_id": "thread"}, "metadata": {"run_id": "run"}}
+    assert get_run_key(config, {"run_key": "state"}) == "run"
+    assert (
+        get_run_key({"configurable": {"thread_id": "thread"}}, {"run_key": "state"})
+        == "thread"
+    )
+    assert get_run_key({}, {"run_key": "state"}) == "state"
+    assert get_run_key(None) == "default"
+
+
+def test_semaphores_are_separate_per_event_loop():
+    limiter = RunConcurrencyLimiter()
+    peaks = []
+
+    async def run():
+        in_flight = peak = 0
+
+        async def branch():
+            nonlocal in_flight, peak
+            async with limiter.limit("thread", 1):
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.05)
+                in_flight -= 1
+
+        await asyncio.gather(*(branch() for _ in range(3)))
+        peaks.append(peak)
+
+    other_loop = threading.Thread(target=lambda: asyncio.run(run()))
+    other_loop.start()
+    time.sleep(0.02)
+    # A semaphore bound to the other loop would fail here.
+    asyncio.run(run())
+    other_loop.join()
+    assert peaks == [1, 1]
+
+
+@pytest.fixture
+def fake_clients():
+    previous = set_client_registry(fake_client_registry())
+    yield
+    set_client_registry(previous)
+
+
+def test_runs_without_run_or_thread_ids_get_their_own_key(fake_clients):
+    from agent.graph import graph
+
+    async def run():
+        return await asyncio.gather(
+            *(
+                graph.ainvoke(
+                    {"messages": [HumanMessage(question)], "max_research_loops": 1},
+                    {"configurable": {"search_cache_ttl_seconds": 0}},
+                )
+                for question in ("Who builds tidal turbines?", "Who builds heat pumps?")
+            )
+        )
+
+    states = asyncio.run(run())
+    keys = {state["run_key"] for state in states}
+    assert len(keys) == 2 and "default" not in keys
+    for key in keys:
+        summary = run_traces.get(key)
+        assert summary is not None and summary["finished"]
+        assert summary["spans"][0]["node"] == "lookup_answer"
@@ -0,0 +1,91 @@
+import asyncio
+
+from agent.quorum import (
+    ParkedSearches,
+    merge_updates,
+    quorum_size,
+    quorum_wait,
+    task_results,
+)
+
+
+def test_quorum_size_rounds_up_and_needs_at_least_one():
+    assert quorum_size(5, 0.6) == 3
+    assert quorum_size(5, 0.01) == 1
+    assert quorum_size(5, 1.5) == 5
+    assert quorum_size(0, 0.5) == 0
+
+
+def delayed(value, delay: float, branch_id: int) -> asyncio.Task:
+    async def run():
+        await asyncio.sleep(delay)
+        return value
+
+    task = asyncio.ensure_future(run())
+    task.branch_id = branch_id
+    return task
+
+
+def test_quorum_wait_returns_once_the_quorum_is_done():
+    async def run():
+        tasks = {
+            delayed(index, delay, index)
+            for index, delay in enumerate((0.01, 0.02, 1.0))
+        }
+        done, pending = await quorum_wait(tasks, 2)
+        for task in pending:
+            task.cancel()
+        return sorted(task.result() for task in done), len(pending)
+
+    assert asyncio.run(run()) == ([0, 1], 1)
+
+
+def test_quorum_wait_stops_at_the_deadline_with_one_result():
+    async def run():
+        tasks = {delayed(0, 0.01, 0), delayed(1, 1.0, 1), delayed(2, 1.0, 2)}
+        done, pending = await quorum_wait(tasks, 3, deadline_seconds=0.05)
+        for task in pending:
+            task.cancel()
+        return len(done), len(pending)
+
+    assert asyncio.run(run()) == (1, 2)
+
+
+def test_quorum_wait_waits_past_the_deadline_for_a_first_result():
+    async def run():
+        tasks = {delayed(0, 0.1, 0)}
+        done, _ = await quorum_wait(tasks, 1, deadline_seconds=0.01)
+        return len(done)
+
+    assert asyncio.run(run()) == 1
+
+
+def test_task_results_are_ordered_by_branch_and_skip_cancelled():
+    async def run():
+        tasks = {delayed("b", 0, 2), delayed("a", 0, 1), delayed("c", 1.0, 3)}
+        cancelled = next(task for task in tasks if task.branch_id == 3)
+        cancelled.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return task_results(tasks)
+
+    assert asyncio.run(run()) == ["a", "b"]
+
+
+def test_parked_searches_are_cancelled_per_run_and_evicted():
+    async def run():
+        parked = ParkedSearches(max_runs=1)
+        first, second = delayed(1, 1.0, 0), delayed(2, 1.0, 0)
+        parked.park("run-1", {first})
+        parked.park("run-2", {second})
+        await asyncio.sleep(0)
+        assert first.cancelled()
+        assert parked.cancel("run-2") == 1
+        await asyncio.sleep(0)
+        return second.cancelled(), parked.take("run-2")
+
+    assert asyncio.run(run()) == (True, set())
+
+
+def test_merge_updates_concatenates_lists():
+    merged = merge_updates([{"a": [1], "b": [2]}, {"a": [3]}])
+    assert merged == {"a": [1, 3], "b": [2]}
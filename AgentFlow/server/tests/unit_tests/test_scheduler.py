@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from agent.scheduler import ModelScheduler, TokenBucket, parse_rate_limits
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_parse_rate_limits_overrides_defaults():
+    limits = parse_rate_limits("gemini-2.5-pro=0, custom-model=60")
+    assert limits["gemini-2.5-pro"] == 0
+    assert limits["custom-model"] == 60
+    assert limits["gemini-2.0-flash"] == 2000
+
+
+def test_token_bucket_reports_the_wait_for_the_next_token():
+    clock = Clock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+    assert bucket.reserve() == 0 and bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.reserve() == 0
+
+
+def test_interactive_lane_overtakes_batch_lane():
+    scheduler = ModelScheduler()
+    order = []
+
+    async def call(lane: str, index: int):
+        async with scheduler.slot("model", lane=lane, max_concurrency=1):
+            order.append(lane)
+            await asyncio.sleep(0)
+
+    async def run():
+        await asyncio.gather(
+            *(call("batch", index) for index in range(5)),
+            *(call("interactive", index) for index in range(5)),
+        )
+
+    asyncio.run(run())
+    # The first batch call took the free slot; interactive calls then get
+    # four of every five dispatches.
+    assert order[:6].count("interactive") >= 4
+
+
+def test_timers_of_a_closed_loop_do_not_block_the_next_one():
+    scheduler = ModelScheduler()
+
+    async def leave_a_timer_pending():
+        async with scheduler.slot("model", requests_per_minute=60):
+            pass
+        # The bucket is empty: this call waits for a refill timer, then the loop closes.
+        with pytest.raises(asyncio.TimeoutError):
+            async with asyncio.timeout(0.05):
+                async with scheduler.slot("model", requests_per_minute=60):
+                    pass
+
+    async def call_on_a_new_loop():
+        async with asyncio.timeout(2):
+            async with scheduler.slot("model", requests_per_minute=60):
+                return True
+
+    asyncio.run(leave_a_timer_pending())
+    assert asyncio.run(call_on_a_new_loop())
@@ -0,0 +1,115 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from agent.fakes import make_grounded_response
+from agent.search_cache import SearchCache, cache_key
+
+
+def counting_fetch(calls: list, delay: float = 0.01, prompt: str = "query"):
+    async def fetch():
+        calls.append(prompt)
+        await asyncio.sleep(delay)
+        return make_grounded_response(prompt)
+
+    return fetch
+
+
+def test_cache_key_normalizes_queries():
+    assert cache_key("  Solar  Panels? ", "model", "2026-10-18") == cache_key(
+        "solar panels", "model", "2026-10-18"
+    )
+    assert cache_key("solar panels", "model", "2026-10-18") != cache_key(
+        "solar panels", "model", "2026-10-19"
+    )
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = SearchCache(":memory:")
+    calls: list = []
+
+    async def run():
+        fetch = counting_fetch(calls)
+        return await asyncio.gather(
+            *(cache.get_or_fetch("key", fetch) for _ in range(5))
+        )
+
+    responses = asyncio.run(run())
+    assert len(calls) == 1
+    assert {response.text for response in responses} == {responses[0].text}
+    assert cache.get("key").text == responses[0].text
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    cache = SearchCache(":memory:")
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("search failed")
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.get_or_fetch("key", failing) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get("key") is None
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    cache = SearchCache(":memory:")
+    calls: list = []
+
+    async def run():
+        fetch = counting_fetch(calls, delay=0.05)
+        leader = asyncio.create_task(cache.get_or_fetch("key", fetch))
+        await asyncio.sleep(0.01)
+        followers = [
+            asyncio.create_task(cache.get_or_fetch("key", fetch)) for _ in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    responses = asyncio.run(run())
+    # One follower took the fetch over, the others shared its result.
+    assert len(calls) == 2
+    assert len(responses) == 3
+    assert cache.get("key") is not None
+
+
+def test_expired_entries_are_refetched():
+    cache = SearchCache(":memory:", ttl_seconds=0)
+    calls: list = []
+
+    async def run():
+        await cache.get_or_fetch("key", counting_fetch(calls, delay=0))
+        await asyncio.sleep(0.01)
+        await cache.get_or_fetch("key", counting_fetch(calls, delay=0))
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_failed_store_keeps_the_search_result():
+    class LockedCache(SearchCache):
+        def put(self, key, response):
+            raise sqlite3.OperationalError("database is locked")
+
+    cache = LockedCache(":memory:")
+    calls: list = []
+
+    async def run():
+        fetch = counting_fetch(calls, delay=0.02)
+        return await asyncio.gather(
+            *(cache.get_or_fetch("key", fetch) for _ in range(3))
+        )
+
+    responses = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(response.text == responses[0].text for response in responses)
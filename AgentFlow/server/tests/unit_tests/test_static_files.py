@@ -0,0 +1,122 @@
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from agent.static_files import (
+    IMMUTABLE,
+    REVALIDATE,
+    PrecompressedStaticFiles,
+    accepted_codings,
+)
+
+INDEX = "<!doctype html><title>AgentFlow</title>" + "<p>research</p>" * 100
+BUNDLE = "console.log('agentflow');\n" * 100
+
+
+@pytest.fixture
+def build(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_text(INDEX)
+    (tmp_path / "assets" / "index-Bx3kP9aQ.js").write_text(BUNDLE)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + bytes(range(256)) * 8)
+    return tmp_path
+
+
+def client(build, **kwargs) -> TestClient:
+    static = PrecompressedStaticFiles(directory=build, **kwargs)
+    return TestClient(Starlette(routes=[Mount("/app", app=static)]))
+
+
+def test_accepted_codings():
+    assert accepted_codings("gzip, br;q=0.5, deflate;q=0") == {
+        "gzip": 1.0,
+        "br": 0.5,
+        "deflate": 0.0,
+    }
+    assert accepted_codings("GZIP;q=oops, ") == {"gzip": 0.0}
+
+
+def test_prefers_brotli_and_falls_back_to_gzip(build):
+    pytest.importorskip("brotli")
+    app = client(build)
+    response = app.get(
+        "/app/assets/index-Bx3kP9aQ.js", headers={"accept-encoding": "gzip, br"}
+    )
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == BUNDLE
+    response = app.get(
+        "/app/assets/index-Bx3kP9aQ.js", headers={"accept-encoding": "gzip, br;q=0"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_serves_identity_without_an_accepted_coding(build):
+    response = client(build).get("/app/", headers={"accept-encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == INDEX
+    assert response.headers["content-type"].startswith("text/html")
+
+
+def test_gzip_variant_is_decodable(build):
+    app = client(build)
+    response = app.get("/app/index.html", headers={"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    raw = (
+        PrecompressedStaticFiles(directory=build)
+        ._routes["index.html"]
+        .encodings["gzip"]
+    )
+    assert gzip.decompress(raw).decode() == INDEX
+
+
+def test_etags_differ_per_coding_and_answer_304(build):
+    app = client(build)
+    gzipped = app.get("/app/index.html", headers={"accept-encoding": "gzip"})
+    identity = app.get("/app/index.html", headers={"accept-encoding": "identity"})
+    assert gzipped.headers["etag"] != identity.headers["etag"]
+    assert not gzipped.headers["etag"].startswith("W/")
+
+    response = app.get(
+        "/app/index.html",
+        headers={"accept-encoding": "gzip", "if-none-match": gzipped.headers["etag"]},
+    )
+    assert response.status_code == 304
+    response = app.get(
+        "/app/index.html",
+        headers={
+            "accept-encoding": "identity",
+            "if-none-match": gzipped.headers["etag"],
+        },
+    )
+    assert response.status_code == 200
+
+
+def test_cache_control(build):
+    app = client(build)
+    assert (
+        app.get("/app/assets/index-Bx3kP9aQ.js").headers["cache-control"] == IMMUTABLE
+    )
+    assert app.get("/app/index.html").headers["cache-control"] == REVALIDATE
+
+
+def test_binary_files_are_not_compressed(build):
+    response = client(build).get(
+        "/app/logo.png", headers={"accept-encoding": "gzip, br"}
+    )
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+
+
+def test_large_files_are_streamed_from_disk(build):
+    static = PrecompressedStaticFiles(directory=build, max_memory_bytes=1024)
+    assert static._routes["logo.png"].body is None
+    response = client(build, max_memory_bytes=1024).get("/app/logo.png")
+    assert response.content == (build / "logo.png").read_bytes()
+
+
+def test_missing_files_fall_back_to_starlette(build):
+    assert client(build, html=False).get("/app/missing.js").status_code == 404